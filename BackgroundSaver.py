@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class BackgroundSaver:
+    """
+    Saves the library on a worker thread, so the caller never waits for
+    the file to be written.
+
+    save_now() asks for a save and returns at once. With autosave, the
+    worker also watches the service's version and saves once the library
+    has been quiet for delay seconds, or max_delay seconds after the first
+    unsaved change if edits keep coming, so a burst of edits costs one
+    save. Libraries whose version is not tracked are only saved on request.
+
+    Each save captures the library first (CDService.capture_save), cheaply
+    and under the repository's write lock when it is shared, then writes
+    the capture on the worker while the library stays usable, and only
+    takes the lock again to record the outcome.
+    """
+
+    def __init__(self, service, filepath: str, delay: float = 2.0, max_delay: float = 30.0,
+                 autosave: bool = True, poll: float = 0.5):
+        self._service = service
+        self.filepath = filepath
+        self.delay = delay
+        self.max_delay = max_delay
+        self.autosave = autosave
+        self._poll = poll
+        self._cond = threading.Condition()
+        self._requested = False
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        # Version written by the last successful save, and when changes were seen
+        self._savedVersion = service.get_version()
+        self._seenVersion = self._savedVersion
+        self._firstChange: Optional[float] = None
+        self._lastChange: Optional[float] = None
+        self._status: Dict = {"state": "idle", "saves": 0, "last_saved": None, "last_seconds": None,
+                              "last_error": None}
+
+    def start(self) -> "BackgroundSaver":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cd-background-saver", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, flush: bool = True):
+        """Stops the worker, first saving any unsaved changes when flush is set."""
+        if self._thread is None:
+            return
+        dirty = self._dirty(self._service.get_version())
+        with self._cond:
+            self._stopping = True
+            self._requested = self._requested or (flush and dirty)
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+
+    def save_now(self):
+        """Requests a save; it runs on the worker as soon as any save in progress ends."""
+        with self._cond:
+            self._requested = True
+            self._cond.notify()
+
+    def mark_saved(self):
+        """Treats the current library as saved, e.g. just after loading it from the file."""
+        version = self._service.get_version()
+        with self._cond:
+            self._savedVersion = self._seenVersion = version
+            self._firstChange = self._lastChange = None
+
+    def status(self) -> Dict:
+        """
+        state ("idle", "pending" for unsaved changes, "saving" or "failed"),
+        saves (count), last_saved (epoch seconds), last_seconds (duration of
+        the last save) and last_error.
+        """
+        # The version is read outside _cond: a shared repository may make us wait
+        version = self._service.get_version()
+        with self._cond:
+            status = dict(self._status)
+            if status["state"] == "idle" and self._dirty(version):
+                status["state"] = "pending"
+            return status
+
+    def _dirty(self, version: Optional[int]) -> bool:
+        return version is not None and version != self._savedVersion
+
+    def _due(self, version: Optional[int], now: float) -> bool:
+        """Notes a version change and says whether the debounce has run out."""
+        if version is None or version == self._savedVersion:
+            self._firstChange = self._lastChange = None
+            return False
+        if version != self._seenVersion:
+            self._seenVersion = version
+            self._lastChange = now
+            if self._firstChange is None:
+                self._firstChange = now
+        return (now - self._lastChange >= self.delay) or (now - self._firstChange >= self.max_delay)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not (self._requested or self._stopping):
+                    self._cond.wait(self._poll)
+            # Read before capturing: a change made in between is saved again later
+            version = self._service.get_version()
+            with self._cond:
+                if self._stopping and not self._requested:
+                    return
+                if not (self._requested or (self.autosave and self._due(version, time.monotonic()))):
+                    continue
+                self._requested = False
+                self._status["state"] = "saving"
+            self._save(version)
+
+    def _save(self, version: Optional[int]):
+        start = time.perf_counter()
+        try:
+            saved = self._service.capture_save(self.filepath)()
+            error = None if saved else f"Could not save {self.filepath}"
+        except Exception as e:
+            logger.exception("Background save of %s failed", self.filepath)
+            saved, error = False, str(e)
+        seconds = time.perf_counter() - start
+        with self._cond:
+            # Changes made during the save start a new debounce either way
+            self._seenVersion = version
+            self._firstChange = self._lastChange = None
+            if saved:
+                self._savedVersion = version
+                self._status.update(state="idle", saves=self._status["saves"] + 1, last_saved=time.time(),
+                                    last_seconds=seconds, last_error=None)
+                logger.info("Saved %s in %.3f s", self.filepath, seconds)
+            else:
+                # Autosave retries once another delay has passed
+                self._firstChange = self._lastChange = time.monotonic()
+                self._status.update(state="failed", last_seconds=seconds, last_error=error)
@@ -1,7 +1,14 @@
+import sys
+
 class CD:
     """
     Represents the core data object (Model) for a single CD.
+    Uses __slots__ instead of a per-instance __dict__ to keep large
+    libraries small in memory.
     """
+    __slots__ = ("_id", "_name", "_size", "_encryption_speed", "_occupied_space",
+                 "_session_count", "_session_type", "_is_open")
+
     def __init__(self, id: int, name: str, size: float, encryption_speed: int,
                  occupied_space: float, session_count: int, session_type: str, **kwargs):
         self._id = id
@@ -11,8 +18,8 @@ class CD:
         self._occupied_space = occupied_space
         self._session_count = session_count
         
-        # Sanitize session_type
-        self._session_type = str(session_type).strip()
+        # Sanitize session_type; intern it since only a handful of values repeat
+        self._session_type = sys.intern(str(session_type).strip())
         
         # A CD is considered open if it is NOT finalized
         self._is_open = (self._session_type.lower() != 'finalized')
@@ -54,6 +61,10 @@ class CD:
                 self._session_type = "Data"
             self._is_open = True
 
+    def set_occupied_space(self, occupied_space: float):
+        """Updates how much of the disc is used."""
+        self._occupied_space = occupied_space
+
     def to_dict(self):
         return {
             "id": self._id,
@@ -0,0 +1,69 @@
+"""
+Chooses the repository backend from environment variables:
+    CD_BACKEND   memory (default) | columnar | sqlite
+    CD_LIBRARY   library file (default cd_library.json, cd_library.db for sqlite)
+    CD_JOURNAL   1 (default) / 0: journal changes with the memory backend,
+                 which folds the journal into the library file when it is
+                 closed; the other backends refuse a library whose journal
+                 still holds changes
+    CD_SNAPSHOT  1 / 0 (default): also write a binary .cdb snapshot next to
+                 the JSON library with the memory backend
+    CD_INSTRUMENT 1 / 0 (default): record call counts and latencies of the
+                 service and repository (see CDInstrumentation)
+    CD_AUTOSAVE  seconds without changes before the app saves in the
+                 background (default 2); 0 saves only on request
+    CD_SHARD_SIZE IDs per shard file when the memory backend saves to a
+                 *.manifest.json library (default 100000)
+    CD_CODEC     none | gzip | bz2 | lzma: compression of the memory
+                 backend's saves (default: from the library's extension,
+                 .gz / .bz2 / .xz, else none); loads detect it
+"""
+
+import os
+from typing import Dict, Mapping, Optional
+
+from ICDRepository import ICDRepository
+from LibraryStream import CODECS
+
+BACKENDS = ("memory", "columnar", "sqlite")
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() not in ("0", "false", "no", "")
+
+def load_config(environ: Optional[Mapping[str, str]] = None) -> Dict:
+    environ = os.environ if environ is None else environ
+    backend = environ.get("CD_BACKEND", "memory").strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown CD_BACKEND '{backend}', expected one of {', '.join(BACKENDS)}")
+    codec = environ.get("CD_CODEC", "").strip().lower() or None
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"Unknown CD_CODEC '{codec}', expected one of {', '.join(CODECS)}")
+    default_library = "cd_library.db" if backend == "sqlite" else "cd_library.json"
+    return {
+        "backend": backend,
+        "library": environ.get("CD_LIBRARY", default_library),
+        "journal": _flag(environ.get("CD_JOURNAL", "1")),
+        "snapshot": _flag(environ.get("CD_SNAPSHOT", "0")),
+        "instrument": _flag(environ.get("CD_INSTRUMENT", "0")),
+        "autosave": float(environ.get("CD_AUTOSAVE", "2")),
+        "shard_size": int(environ.get("CD_SHARD_SIZE", "100000")),
+        "codec": codec,
+    }
+
+def create_repository(config: Dict) -> ICDRepository:
+    # Backends are imported on demand so numpy is only needed for "columnar"
+    backend = config["backend"]
+    if backend != "memory":
+        from CDJournal import reject_pending_journal
+        from ShardedLibrary import reject_manifest
+        reject_manifest(config["library"])
+        reject_pending_journal(config["library"])
+    if backend == "columnar":
+        from ColumnarCDRepository import ColumnarCDRepository
+        return ColumnarCDRepository()
+    if backend == "sqlite":
+        from SQLiteCDRepository import SQLiteCDRepository
+        return SQLiteCDRepository(config["library"])
+    from CDRepository import CDRepository
+    return CDRepository(journaled=config["journal"], snapshot=config.get("snapshot", False),
+                        shard_size=config.get("shard_size", 100000), codec=config.get("codec"))
@@ -1,8 +1,14 @@
+from typing import TYPE_CHECKING
+
 from CDService import CDService
-from CDView import CDView
+
+if TYPE_CHECKING:
+    # Only for annotations: the console view is optional, so the controller
+    # imports without it
+    from CDView import CDView
 
 class CDController:   
-    def __init__(self, cd_service: CDService, cd_view: CDView):
+    def __init__(self, cd_service: CDService, cd_view: "CDView"):
         self._service = cd_service
         self._view = cd_view
 
@@ -0,0 +1,89 @@
+"""
+Declarative filters and projections over CD fields, in a form storage
+backends can translate (into SQL, NumPy masks, ...) instead of calling
+Python code for every CD.
+
+A condition is a (field, op, value) tuple, for example
+    ("free_space", ">", 200), ("session_type", "in", ["Data", "Audio"]),
+    ("name", "contains", "jazz")
+and a filter is a sequence of conditions that must all hold.
+"""
+
+import operator
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from CD import CD
+
+Condition = Tuple[str, str, Any]
+
+# Field -> value of a CD. free_space and is_open are derived.
+FIELDS: Dict[str, Callable[[CD], Any]] = {
+    "id": lambda cd: cd.id,
+    "name": lambda cd: cd.name,
+    "size": lambda cd: cd.size,
+    "encryption_speed": lambda cd: cd.encryption_speed,
+    "occupied_space": lambda cd: cd.occupied_space,
+    "session_count": lambda cd: cd.session_count,
+    "session_type": lambda cd: cd.session_type,
+    "free_space": lambda cd: cd.getFreeSpace,
+    "is_open": lambda cd: cd.getOpenSession,
+}
+
+# op -> test(field value, condition value). "contains" ignores case.
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+    "contains": lambda value, part: str(part).lower() in str(value).lower(),
+}
+
+def validate(where: Sequence[Condition], fields: Optional[Sequence[str]] = None):
+    """Raises ValueError for an unknown field or operator."""
+    for field, op, _ in where:
+        if field not in FIELDS:
+            raise ValueError(f"Unknown CD field '{field}'")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator '{op}'")
+    for field in fields or ():
+        if field not in FIELDS:
+            raise ValueError(f"Unknown CD field '{field}'")
+
+def matches(cd: CD, where: Sequence[Condition]) -> bool:
+    for field, op, value in where:
+        if not OPERATORS[op](FIELDS[field](cd), value):
+            return False
+    return True
+
+def compile_filter(where: Sequence[Condition]) -> Callable[[CD], bool]:
+    """A predicate for where, resolving fields and operators once."""
+    tests = [(FIELDS[field], OPERATORS[op], value) for field, op, value in where]
+    return lambda cd: all(test(get(cd), value) for get, test, value in tests)
+
+def project(cds: Iterable[CD], fields: Optional[Sequence[str]]) -> list:
+    """The CDs themselves, or dicts holding only fields when fields is given."""
+    if fields is None:
+        return list(cds)
+    getters = [(field, FIELDS[field]) for field in fields]
+    return [{field: get(cd) for field, get in getters} for cd in cds]
+
+def chunked(cds: Iterable[CD], chunk_size: int, where: Sequence[Condition] = (),
+            fields: Optional[Sequence[str]] = None) -> Iterator[list]:
+    """
+    Reads cds chunk_size at a time, yielding the matching ones of each
+    chunk (projected to fields) when there are any.
+    """
+    keep = compile_filter(where) if where else None
+    cds = iter(cds)
+    while True:
+        chunk = list(islice(cds, chunk_size))
+        if not chunk:
+            return
+        if keep is not None:
+            chunk = [cd for cd in chunk if keep(cd)]
+        if chunk:
+            yield project(chunk, fields)
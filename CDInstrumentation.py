@@ -0,0 +1,216 @@
+"""
+Opt-in call instrumentation for repositories and services.
+
+    repository = instrument(CDRepository(), "repository")
+    service = instrument(CDService(repository), "service")
+    ...
+    METRICS.snapshot()["repository.getSorted"]["p95_ms"]
+    METRICS.export_csv("instrumentation_report.csv")
+
+Every public method call on an instrumented object records its latency
+into a log-scale histogram (fixed memory, ~9% resolution), whether it
+raised, how many items it returned (the length of a returned list, tuple,
+set or dict, or the number of values a returned generator yielded) and how
+many stored items it scanned. Repositories report scans by calling
+scanned() wherever they pass over the whole library (reads answered from
+an index scan nothing; SQLite does its scanning out of sight). Objects
+that are not instrumented pay nothing, and scanned() costs one attribute
+lookup outside an instrumented call.
+"""
+
+import math
+import threading
+import time
+from collections import Counter
+from types import GeneratorType
+from typing import Dict, Iterator, Optional
+
+# Histogram buckets per doubling of latency
+BUCKETS_PER_OCTAVE = 8
+
+class CallStats:
+    """Counters and a latency histogram for one method."""
+
+    __slots__ = ("calls", "errors", "items", "scanned", "total_seconds", "max_seconds", "_buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.items = 0
+        self.scanned = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._buckets: Counter = Counter()
+
+    def record(self, seconds: float, items: int, error: bool, scanned: int = 0):
+        self.calls += 1
+        self.errors += error
+        self.items += items
+        self.scanned += scanned
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        # Bucket b holds latencies up to 2 ** (b / BUCKETS_PER_OCTAVE) microseconds
+        micros = max(seconds * 1e6, 1.0)
+        self._buckets[math.ceil(math.log2(micros) * BUCKETS_PER_OCTAVE)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Latency in seconds below which a fraction q of the calls fell (upper bucket bound)."""
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                return min(2 ** (bucket / BUCKETS_PER_OCTAVE) / 1e6, self.max_seconds)
+        return self.max_seconds
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "items": self.items,
+            "scanned": self.scanned,
+            "total_ms": self.total_seconds * 1e3,
+            "p50_ms": self.percentile(0.50) * 1e3,
+            "p95_ms": self.percentile(0.95) * 1e3,
+            "p99_ms": self.percentile(0.99) * 1e3,
+            "max_ms": self.max_seconds * 1e3,
+        }
+
+class Metrics:
+    """Thread-safe registry of CallStats, keyed "<object name>.<method>"."""
+
+    def __init__(self):
+        self._stats: Dict[str, CallStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float, items: int = 0, error: bool = False, scanned: int = 0):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = CallStats()
+            stats.record(seconds, items, error, scanned)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current figures per method (see CallStats.to_dict), sorted by key."""
+        with self._lock:
+            return {key: self._stats[key].to_dict() for key in sorted(self._stats)}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def export_csv(self, output_file: str = "instrumentation_report.csv"):
+        """Writes the snapshot as CSV, one row per method, like metrics_report.csv."""
+        import csv
+        with open(output_file, mode='w', newline='', encoding='utf-8') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['Method', 'Calls', 'Errors', 'Items (Returned)', 'Items (Scanned)', 'Total (ms)',
+                             'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'Max (ms)'])
+            for key, stats in self.snapshot().items():
+                writer.writerow([key, stats['calls'], stats['errors'], stats['items'], stats['scanned']] +
+                                [f"{stats[field]:.3f}" for field in
+                                 ('total_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')])
+
+# Registry used when instrument() is not given one
+METRICS = Metrics()
+
+# Items scanned so far by the instrumented call running on each thread;
+# unset (None) while no instrumented call is running
+_current = threading.local()
+
+def scanned(count: int):
+    """Reports a pass over count stored items to the instrumented call running on this thread, if any."""
+    total = getattr(_current, "scanned", None)
+    if total is not None:
+        _current.scanned = total + count
+
+def _startScan() -> Optional[int]:
+    """Starts counting scans for a call; returns the count of the call it runs inside."""
+    outer = getattr(_current, "scanned", None)
+    _current.scanned = 0
+    return outer
+
+def _endScan(outer: Optional[int]) -> int:
+    """Items scanned since _startScan, which also count toward the outer call."""
+    inner = _current.scanned
+    _current.scanned = None if outer is None else outer + inner
+    return inner
+
+def _count(result) -> int:
+    if isinstance(result, (list, tuple, set, frozenset, dict)):
+        return len(result)
+    return 0
+
+class Instrumented:
+    """
+    Proxy recording every public method call on the wrapped object. Other
+    attributes are passed through. Generators are timed until exhausted.
+    """
+
+    def __init__(self, target, name: str, metrics: Metrics):
+        self._target = target
+        self._name = name
+        self._metrics = metrics
+        self._wrapped: Dict[str, object] = {}
+
+    @property
+    def target(self):
+        return self._target
+
+    def __getattr__(self, attr: str):
+        wrapped = self._wrapped.get(attr)
+        if wrapped is not None:
+            return wrapped
+        value = getattr(self._target, attr)
+        if attr.startswith("_") or not callable(value):
+            return value
+        wrapped = self._wrapped[attr] = self._wrap(f"{self._name}.{attr}", value)
+        return wrapped
+
+    def _wrap(self, key: str, method):
+        metrics = self._metrics
+
+        def call(*args, **kwargs):
+            outer = _startScan()
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                metrics.record(key, time.perf_counter() - start, error=True, scanned=_endScan(outer))
+                raise
+            if isinstance(result, GeneratorType):
+                _endScan(outer)
+                return self._timeGenerator(key, result, start)
+            metrics.record(key, time.perf_counter() - start, _count(result), scanned=_endScan(outer))
+            return result
+
+        call.__name__ = method.__name__
+        call.__doc__ = method.__doc__
+        return call
+
+    def _timeGenerator(self, key: str, generator, start: float) -> Iterator:
+        # The generator runs (and scans) only while it is resumed
+        items = scanned = 0
+        error = False
+        try:
+            while True:
+                outer = _startScan()
+                try:
+                    value = next(generator)
+                except StopIteration:
+                    break
+                finally:
+                    scanned += _endScan(outer)
+                items += 1
+                yield value
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._metrics.record(key, time.perf_counter() - start, items, error, scanned)
+
+def instrument(target, name: Optional[str] = None, metrics: Optional[Metrics] = None) -> Instrumented:
+    """Wraps target so its method calls are recorded in metrics (METRICS by default)."""
+    return Instrumented(target, name or type(target).__name__, metrics if metrics is not None else METRICS)
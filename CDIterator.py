@@ -1,18 +1,61 @@
-from typing import List, Optional
+from typing import Iterator, Optional, Sequence
 
 from CD import CD
+from CDFilter import Condition, chunked, validate
 
 class CDIterator:
-    def __init__(self, cd_list: List[CD]):
-        self._cd_list = cd_list
+    """
+    Streams CDs from a list or any repository, a chunk at a time.
+
+    Over a repository, chunks come from its iterChunks, so filters (where,
+    see CDFilter) and projections (fields) run in the storage backend and
+    only one chunk is in memory at once, however large the library. With
+    fields, items are dicts of just those fields instead of CDs.
+
+    Use it as a Python iterator, or call chunks() to work a chunk at a
+    time. hasNext() / next() remain for existing callers.
+    """
+
+    def __init__(self, source, where: Sequence[Condition] = (), fields: Optional[Sequence[str]] = None,
+                 chunk_size: int = 10000):
+        validate(where, fields)
+        iter_chunks = getattr(source, "iterChunks", None)
+        if iter_chunks is not None:
+            self._chunks = iter_chunks(chunk_size, where, fields)
+        else:
+            self._chunks = chunked(source, chunk_size, where, fields)
+        self._chunk: list = []
         self._index = 0
 
+    def _fill(self) -> bool:
+        """Moves to the next non-empty chunk if the current one is used up; False at the end."""
+        while self._index >= len(self._chunk):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self._chunk, self._index = chunk, 0
+        return True
+
+    def __iter__(self) -> "CDIterator":
+        return self
+
+    def __next__(self):
+        if not self._fill():
+            raise StopIteration
+        item = self._chunk[self._index]
+        self._index += 1
+        return item
+
+    def chunks(self) -> Iterator[list]:
+        """The remaining items, a chunk at a time."""
+        if self._fill():
+            rest = self._chunk[self._index:]
+            self._chunk, self._index = [], 0
+            yield rest
+        yield from self._chunks
+
     def hasNext(self) -> bool:
-        return self._index < len(self._cd_list)
+        return self._fill()
 
     def next(self) -> Optional[CD]:
-        if self.hasNext():
-            cd = self._cd_list[self._index]
-            self._index += 1
-            return cd
-        return None
\ No newline at end of file
+        return next(self, None)
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+from typing import Dict, Iterator
+
+def has_pending(snapshot_path: str) -> bool:
+    """True if a journal next to snapshot_path holds changes not yet written into it."""
+    journal = snapshot_path + ".journal"
+    return any(os.path.exists(path) and os.path.getsize(path) > 0 for path in (journal, journal + ".1"))
+
+def reject_pending_journal(filepath: str):
+    """Raises ValueError for a library with pending journaled changes, which only the memory backend replays."""
+    if has_pending(filepath):
+        raise ValueError(f"{filepath} has journaled changes not yet written into it; open it once with the "
+                         "memory backend (CD_BACKEND=memory), which folds them in when it closes")
+
+class CDJournal:
+    """
+    Append-only change log kept next to a library snapshot file.
+
+    Every line is one JSON operation, for example
+        {"op": "add", "cd": {...}, "nextId": 5}
+        {"op": "delete", "id": 3}
+        {"op": "finalize", "id": 3, "value": true}
+        {"op": "occupy", "id": 3, "value": 250.0}
+    Loading the snapshot and replaying the log gives the current library.
+
+    Compaction rotates the log to "<journal>.1" and writes a new snapshot;
+    once the snapshot has been replaced the rotated log is removed. Both
+    logs are replayed on load, so a crash at any point only means replaying
+    some operations twice, which the operations tolerate.
+    """
+
+    def __init__(self, snapshot_path: str):
+        self.snapshot_path = snapshot_path
+        self.path = snapshot_path + ".journal"
+        self.rotated_path = self.path + ".1"
+        self.pending = 0        # operations not yet folded into the snapshot
+        self._lock = threading.Lock()
+        self._file = self._open()
+
+    def _open(self):
+        f = open(self.path, 'a', encoding='utf-8')
+        if f.tell() > 0:
+            with open(self.path, 'rb') as check:
+                check.seek(-1, os.SEEK_END)
+                if check.read(1) != b"\n":
+                    # Start on a fresh line after a write cut short by a crash
+                    f.write("\n")
+        return f
+
+    def covers(self, filepath: str) -> bool:
+        return os.path.abspath(filepath) == os.path.abspath(self.snapshot_path)
+
+    def read(self) -> Iterator[Dict]:
+        """Yields the logged operations, oldest first."""
+        self.pending = 0
+        for path in (self.rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A write cut short by a crash
+                        continue
+                    self.pending += 1
+                    yield op
+
+    def append(self, op: Dict):
+        with self._lock:
+            self._file.write(json.dumps(op) + "\n")
+            self.pending += 1
+
+    def flush(self):
+        """Makes the logged operations durable."""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def rotate(self):
+        """Starts a fresh log; the current one waits in rotated_path for compaction."""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            if os.path.exists(self.rotated_path):
+                # An earlier compaction did not finish: keep its operations too
+                with open(self.rotated_path, 'a', encoding='utf-8') as rotated, \
+                        open(self.path, 'r', encoding='utf-8') as current:
+                    rotated.write(current.read())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.rotated_path)
+            self._file = self._open()
+            self.pending = 0
+
+    def discard_rotated(self):
+        """Called once a snapshot containing the rotated operations is in place."""
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
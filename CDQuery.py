@@ -0,0 +1,119 @@
+"""
+Composable CD queries: filters on any field (see CDFilter), one ordering,
+offset and limit, e.g.
+
+    CDQuery().where("is_open", "==", True).where("free_space", ">", 200) \
+             .order_by("encryption_speed", descending=True).limit(50)
+
+Queries are immutable and hashable, so they can key view caches. A
+repository's planQuery picks how to run one (see ICDRepository.planQuery).
+"""
+
+import heapq
+from itertools import islice
+from typing import Any, Callable, Iterable, Optional, Sequence, Tuple
+
+from CD import CD
+from CDFilter import FIELDS, Condition, compile_filter, project, validate
+
+# Fields ordered by their text; every other field is numeric (or bool)
+TEXT_FIELDS = ("name", "session_type")
+
+class _Descending:
+    """Wraps a value so it sorts in reverse; for text fields, which cannot be negated."""
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other) -> bool:
+        return self.value == other.value
+
+def order_key(field: str, descending: bool = False) -> Callable[[CD], Tuple]:
+    """Sort key for field in either direction; ties are always broken by ascending ID."""
+    get = FIELDS[field]
+    if not descending:
+        return lambda cd: (get(cd), cd.id)
+    if field in TEXT_FIELDS:
+        return lambda cd: (_Descending(get(cd)), cd.id)
+    return lambda cd: (-get(cd), cd.id)
+
+class CDQuery:
+    __slots__ = ("conditions", "order", "descending", "offset", "count", "fields")
+
+    def __init__(self, conditions: Sequence[Condition] = (), order: Optional[str] = None,
+                 descending: bool = False, offset: int = 0, count: Optional[int] = None,
+                 fields: Optional[Sequence[str]] = None):
+        # "in" options become tuples so the query stays hashable
+        self.conditions: Tuple[Condition, ...] = tuple(
+            (field, op, tuple(value) if op == "in" else value) for field, op, value in conditions)
+        self.order = order
+        self.descending = descending
+        self.offset = offset
+        self.count = count
+        self.fields = None if fields is None else tuple(fields)
+        validate(self.conditions, self.fields)
+        if order is not None and order not in FIELDS:
+            raise ValueError(f"Unknown CD field '{order}'")
+        if offset < 0 or (count is not None and count < 0):
+            raise ValueError("offset and limit must not be negative")
+
+    def _with(self, **changes) -> "CDQuery":
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return CDQuery(**values)
+
+    def where(self, field: str, op: str, value: Any) -> "CDQuery":
+        """Adds a condition; all conditions must hold."""
+        return self._with(conditions=self.conditions + ((field, op, value),))
+
+    def order_by(self, field: str, descending: bool = False) -> "CDQuery":
+        return self._with(order=field, descending=descending)
+
+    def skip(self, offset: int) -> "CDQuery":
+        return self._with(offset=offset)
+
+    def limit(self, count: Optional[int]) -> "CDQuery":
+        return self._with(count=count)
+
+    def select(self, *fields: str) -> "CDQuery":
+        """Returns dicts of just these fields instead of CDs."""
+        return self._with(fields=fields or None)
+
+    @property
+    def stop(self) -> Optional[int]:
+        """Position just past the last result, or None without a limit."""
+        return None if self.count is None else self.offset + self.count
+
+    def key(self) -> Tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CDQuery) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def __repr__(self) -> str:
+        return f"CDQuery{self.key()!r}"
+
+def execute(query: CDQuery, cds: Iterable[CD], where: Optional[Sequence[Condition]] = None,
+            ordered: bool = False) -> list:
+    """
+    Runs query over candidate cds in one pass: keeps those matching where
+    (default: all of the query's conditions), orders them unless ordered
+    says they already arrive in query order, then pages and projects.
+    With a limit only the best offset + limit CDs are kept while ordering,
+    and already ordered input is read no further than the page.
+    """
+    where = query.conditions if where is None else where
+    if where:
+        keep = compile_filter(where)
+        cds = (cd for cd in cds if keep(cd))
+    if query.order is not None and not ordered:
+        key = order_key(query.order, query.descending)
+        cds = sorted(cds, key=key) if query.stop is None else heapq.nsmallest(query.stop, cds, key=key)
+    return project(islice(cds, query.offset, query.stop), query.fields)
@@ -1,92 +1,787 @@
-from typing import List, Optional
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import logging
+import math
 import os
-import json
+import threading
 
 from CD import CD
-from ICDRepository import ICDRepository
+from CDInstrumentation import scanned
+from CDJournal import CDJournal
+from CDQuery import CDQuery, execute
+from ICDRepository import ICDRepository, SORT_KEYS
+from CDSnapshot import SnapshotReader, is_snapshot, snapshot_path_for, write_snapshot
+from LibraryStream import codec_for_path, is_json_lines, open_library, open_text_writer, write_json, write_json_lines
+from NameIndex import NameIndex
+from ShardedLibrary import (DEFAULT_SHARD_SIZE, group_by_shard, is_manifest, parse_shards, read_manifest,
+                            shard_files, shard_ids, shard_of, write_shards)
+from SortedIndex import SortedIndex
+
+logger = logging.getLogger(__name__)
+
+# Assumed fraction of CDs passing a condition the planner cannot measure
+SELECTIVITY = 1 / 3
 
 class CDRepository(ICDRepository):
 
-    def __init__(self):
-        self._cdList: List[CD] = []
+    def __init__(self, journaled: bool = False, compact_every: int = 1000, snapshot: bool = False,
+                 shard_size: int = DEFAULT_SHARD_SIZE, codec: Optional[str] = None):
+        """
+        With journaled=True, changes are appended to "<library>.journal" as
+        they happen. uploadData on the loaded library only flushes that log,
+        and once compact_every changes pile up it folds them into a fresh
+        snapshot on a background thread.
+
+        With snapshot=True, every JSON save also writes a binary snapshot
+        next to it (cd_library.json -> cd_library.cdb), which loadData then
+        prefers because it needs no JSON parsing.
+
+        Saving to a manifest path (*.manifest.json) writes a sharded library
+        of shard_size IDs per file (see ShardedLibrary). Its shards are
+        parsed in parallel on load, and a save rewrites only the shards
+        whose CDs changed since the library was last loaded or saved there.
+
+        codec compresses JSON saves (see LibraryStream.CODECS); by default
+        the file name picks it (.gz, .bz2, .xz), else none. Loading detects
+        the codec from the file itself.
+
+        Loading a snapshot only maps it: find_by_id, count, pages in ID
+        order and status edits read single records from it, and the rest is
+        decoded the first time a read needs every CD (see _lazy).
+        """
+        # id -> CD in insertion order: the library itself
+        self._byId: Dict[int, CD] = {}
+        # _byId's CDs as the list getAll returns. A delete drops it (None)
+        # rather than shift the list, and getAll builds it again, in the
+        # same insertion order
+        self._cdList: Optional[List[CD]] = []
         self._nextId: int = 1 
+        # field -> (sort key, id) pairs, one persistent ordering per SORT_KEYS entry
+        self._sorted: Dict[str, SortedIndex] = {field: SortedIndex() for field in SORT_KEYS}
+        # (free space, id) pairs for range and top-k queries on free space
+        self._byFreeSpace = SortedIndex()
+        # Dashboard aggregates for getSummary, kept with the indexes:
+        # running totals, session type counts and (occupied, id) pairs for top-k
+        self._totalSize = 0.0
+        self._totalOccupied = 0.0
+        self._typeCounts: Counter = Counter()
+        self._byOccupied = SortedIndex()
+        # Set while a streaming load fills the library; the ordered indexes are
+        # rebuilt in one pass the next time they are needed
+        self._indexesStale = False
+        # Trigram index for search_by_name; rebuilt on the first search after a load
+        self._names = NameIndex()
+        self._namesStale = False
+        self._journaled = journaled
+        self._compactEvery = compact_every
+        self._snapshot = snapshot
+        self._journal: Optional[CDJournal] = None
+        # Bumped on every change; see get_version
+        self._version = 0
+        self._compactor: Optional[threading.Thread] = None
+        # Bookkeeping of the compaction run by _compactor, applied once it
+        # has finished (see _finishCompaction)
+        self._compactFinish: Optional[Callable[[], None]] = None
+        self._shardSize = shard_size
+        if codec is not None:
+            codec_for_path("", codec)  # raises ValueError for an unknown codec
+        self._codec = codec
+        # Manifest the shard files on disk match, but for the _dirtyShards
+        self._shardedPath: Optional[str] = None
+        self._dirtyShards: Set[int] = set()
+        # Snapshot loaded but not yet decoded. While it is set, _byId only
+        # holds the CDs read from it so far (with any edits made to them);
+        # adding or deleting decodes the rest first
+        self._lazy: Optional[SnapshotReader] = None
+        # Held to decode from _lazy and to rebuild the indexes, which readers
+        # sharing the repository may do at once after a lazy load
+        self._lazyLock = threading.RLock()
 
     def get_next_id(self) -> int:
         return self._nextId
 
+    def get_version(self) -> int:
+        return self._version
+
+    def count(self) -> int:
+        lazy = self._lazy
+        return len(lazy) if lazy is not None else len(self._byId)
+
     def add(self, cd: CD) -> bool:
-        print(f"Repository: Adding CD with ID {cd.id}...")
-        self._cdList.append(cd)
+        logger.debug("Adding CD with ID %s", cd.id)
+        self._materialize()
+        if cd.id in self._byId:
+            logger.error("A CD with ID %s already exists", cd.id)
+            return False
+        self._byId[cd.id] = cd
+        if self._cdList is not None:
+            self._cdList.append(cd)
+        self._insertIndexes(cd)
+        if not self._namesStale:
+            self._names.add(cd.id, cd.name)
         self._nextId += 1
+        self._log({"op": "add", "cd": cd.to_dict(), "nextId": self._nextId})
         return True
 
+    def reserve_ids(self, count: int) -> int:
+        first = self._nextId
+        self._nextId += count
+        return first
+
+    def add_batch(self, cds: Iterable[CD]) -> List[bool]:
+        """
+        Adds many CDs in one pass, returning one flag per CD (False for an ID
+        already in use). The ordered indexes are updated once for the batch,
+        or rebuilt lazily when the batch is large. Unlike add, the next ID
+        only moves past the largest ID added; take IDs from reserve_ids.
+        """
+        self._materialize()
+        results: List[bool] = []
+        added: List[CD] = []
+        for cd in cds:
+            if cd.id in self._byId:
+                results.append(False)
+                continue
+            self._byId[cd.id] = cd
+            if self._cdList is not None:
+                self._cdList.append(cd)
+            added.append(cd)
+            results.append(True)
+        if not added:
+            return results
+
+        logger.debug("Added a batch of %d CDs", len(added))
+        self._nextId = max(self._nextId, max(cd.id for cd in added) + 1)
+        if len(added) > len(self._byId) // 4:
+            # Cheaper to rebuild than to insert one by one
+            self._indexesStale = True
+            self._namesStale = True
+        else:
+            for cd in added:
+                self._insertIndexes(cd)
+                if not self._namesStale:
+                    self._names.add(cd.id, cd.name)
+        for cd in added:
+            self._log({"op": "add", "cd": cd.to_dict(), "nextId": self._nextId})
+        return results
+
     def delete(self, cd_id: int) -> bool:
-        print(f"Repository: Deleting CD with ID {cd_id}...")
-        cd_to_delete = self.deleteCD(cd_id)
-        if cd_to_delete:
-            self._cdList.remove(cd_to_delete)
-            return True
-        return False
+        logger.debug("Deleting CD with ID %s", cd_id)
+        self._materialize()
+        cd = self._byId.pop(cd_id, None)
+        if cd is None:
+            return False
+        self._removeIndexes(cd)
+        if not self._namesStale:
+            self._names.remove(cd_id)
+        # O(1): getAll rebuilds the list, still in insertion order
+        self._cdList = None
+        self._log({"op": "delete", "id": cd_id})
+        return True
 
     def deleteCD(self, cd_id: int) -> Optional[CD]:
-        for cd in self._cdList:
-            if cd.id == cd_id:
-                return cd
-        return None
+        return self.find_by_id(cd_id)
+
+    def find_by_id(self, cd_id: int) -> Optional[CD]:
+        if self._lazy is None:
+            return self._byId.get(cd_id)
+        with self._lazyLock:
+            if self._lazy is None:  # decoded meanwhile
+                return self._byId.get(cd_id)
+            cd = self._byId.get(cd_id)
+            if cd is None:
+                cd = self._lazy.find(cd_id)
+                if cd is not None:
+                    # Kept, so edits to it outlive this call
+                    self._byId[cd_id] = cd
+            return cd
+
+    def set_finalized(self, cd_id: int, is_finalized: bool) -> bool:
+        cd = self.find_by_id(cd_id)
+        if cd is None:
+            return False
+        old_type = cd.session_type
+        cd.set_finalized(is_finalized)
+        if not self._indexesStale and cd.session_type != old_type:
+            self._countType(old_type, -1)
+            self._countType(cd.session_type, 1)
+        self._log({"op": "finalize", "id": cd_id, "value": is_finalized})
+        return True
+
+    def set_occupied_space(self, cd_id: int, occupied_space: float) -> bool:
+        cd = self.find_by_id(cd_id)
+        if cd is None or not 0 <= occupied_space <= cd.size:
+            return False
+        if not self._indexesStale:
+            self._removeSpace(cd)
+            cd.set_occupied_space(occupied_space)
+            self._insertSpace(cd)
+        else:
+            cd.set_occupied_space(occupied_space)
+        self._log({"op": "occupy", "id": cd_id, "value": occupied_space})
+        return True
 
     def getAll(self) -> List[CD]:
         """Corresponds to +getAll(): List<CD>"""
+        self._materialize()
+        if self._cdList is None:
+            self._cdList = list(self._byId.values())
         return self._cdList
 
+    def prepareReads(self):
+        # A lazily loaded snapshot stays lazy: the first read needing every
+        # CD decodes it, under _lazyLock
+        if self._lazy is None:
+            self._ensureIndexes()
+            self._ensureNames()
+
+    def _materialize(self):
+        """Decodes the rest of a lazily loaded snapshot into _byId, in ID order."""
+        if self._lazy is None:
+            return
+        with self._lazyLock:
+            reader = self._lazy
+            if reader is None:
+                return
+            read = self._byId
+            byId: Dict[int, CD] = {}
+            for record in reader:
+                cd_id = record["id"]
+                byId[cd_id] = read.get(cd_id) or CD(**record)
+            scanned(len(byId))
+            # _byId first: a reader seeing _lazy unset must find every CD
+            self._byId = byId
+            self._cdList = None
+            self._lazy = None
+            reader.close()
+            logger.debug("Decoded the %d CDs of %s", len(byId), reader.filepath)
+
+    def _ensureNames(self):
+        if not self._namesStale:
+            return
+        with self._lazyLock:
+            if self._namesStale:
+                self._materialize()
+                self._names.rebuild((cd.id, cd.name) for cd in self._byId.values())
+                self._namesStale = False
+
+    def search_by_name(self, query: str, limit: Optional[int] = None) -> List[CD]:
+        self._ensureNames()
+        return [self._byId[cd_id] for cd_id in self._names.search(query, limit)]
+
+    def getSorted(self, field: str, limit: Optional[int] = None, offset: int = 0) -> List[CD]:
+        """Reads a page of the persistent ordering for field without sorting."""
+        stop = None if limit is None else offset + limit
+        if field == "id" and self._lazy is not None:
+            with self._lazyLock:
+                lazy = self._lazy
+                if lazy is not None:
+                    # The snapshot is in ID order: read the page's records by position
+                    return [self.find_by_id(lazy.id_at(index)) for index in range(len(lazy))[offset:stop]]
+        self._ensureIndexes()
+        return [self._byId[key[-1]] for key in self._sorted[field].islice(offset, stop)]
+
     def getFreeSpace(self, min_space: float) -> List[CD]:
-        print(f"Repository: Getting CDs with free space > {min_space}...")
-        result = [cd for cd in self._cdList if cd.getFreeSpace > min_space]
-        return result
+        logger.debug("Getting CDs with free space > %s", min_space)
+        self._ensureIndexes()
+        # (min_space, inf) sorts after every pair whose free space equals min_space
+        low = (min_space, float("inf"))
+        return [self._byId[cd_id] for _, cd_id in self._byFreeSpace.irange(low)]
+
+    def getFreeSpaceBetween(self, min_space: float, max_space: float) -> List[CD]:
+        self._ensureIndexes()
+        # Exclusive below, as getFreeSpace; inclusive above
+        low, high = (min_space, float("inf")), (max_space, float("inf"))
+        return [self._byId[cd_id] for _, cd_id in self._byFreeSpace.irange(low, high)]
+
+    def getMostFreeSpace(self, k: int) -> List[CD]:
+        self._ensureIndexes()
+        return [self._byId[cd_id] for _, cd_id in self._byFreeSpace.islice(0, k, reverse=True)]
+
+    def planQuery(self, query: CDQuery) -> Tuple[str, Callable[[], list]]:
+        """
+        Picks the cheapest of: ID lookups, a range of the free or occupied
+        space index, walking the index that already has the query's order
+        (stopping once the page is full), or one scan of the list. Range
+        sizes are counted exactly from the indexes; other conditions are
+        assumed to keep SELECTIVITY of the CDs.
+        """
+        self._ensureIndexes()
+        n = len(self._byId)
+        ids = None
+        ranges: Dict[str, list] = {}
+        for field, op, value in query.conditions:
+            if field == "id" and op in ("==", "in"):
+                options = {value} if op == "==" else set(value)
+                ids = options if ids is None else ids & options
+            elif field in ("free_space", "occupied_space") and op in ("==", "<", "<=", ">", ">="):
+                low, high = ranges.setdefault(field, [None, None])
+                # (value, -inf) sorts before every (value, id) pair and (value, inf) after
+                if op in (">", ">=", "=="):
+                    bound = (value, float("inf") if op == ">" else float("-inf"))
+                    ranges[field][0] = bound if low is None else max(low, bound)
+                if op in ("<", "<=", "=="):
+                    bound = (value, float("-inf") if op == "<" else float("inf"))
+                    ranges[field][1] = bound if high is None else min(high, bound)
+        if ids is not None:
+            def lookup():
+                # In ID order, so offset and limit page like the other plans and backends
+                cds = (self._byId[cd_id] for cd_id in sorted(ids) if cd_id in self._byId)
+                return execute(query, cds, ordered=(query.order, query.descending) == ("id", False))
+            return "lookup by id", lookup
+
+        space_indexes = {"free_space": self._byFreeSpace, "occupied_space": self._byOccupied}
+        sizes = {}
+        for field, (low, high) in ranges.items():
+            index = space_indexes[field]
+            start = 0 if low is None else index.rank(low)
+            stop = n if high is None else index.rank(high)
+            sizes[field] = max(stop - start, 0)
+        # Estimated matches: measured ranges times the assumed selectivity of the rest
+        matches = n
+        for size in sizes.values():
+            matches *= size / n if n else 0
+        matches *= SELECTIVITY ** sum(1 for field, _, _ in query.conditions if field not in ranges)
+        matches = max(matches, 1)
+
+        # Orderings the indexes already hold, read front to back
+        order_indexes = {("id", False): self._sorted["id"], ("name", False): self._sorted["name"],
+                        ("size", True): self._sorted["size"],
+                        ("encryption_speed", True): self._sorted["encryption_speed"],
+                        ("free_space", False): self._byFreeSpace, ("occupied_space", False): self._byOccupied}
+        ordered = order_indexes.get((query.order, query.descending))
+        sort_cost = 0 if query.order is None else matches * math.log2(matches + 1)
+
+        def scan():
+            scanned(n)
+            return execute(query, self._byId.values())
+        plans = [(n + sort_cost, "scan", scan)]
+        for field, size in sizes.items():
+            low, high = ranges[field]
+            in_order = query.order == field and not query.descending
+            cost = size if in_order or query.order is None else size + sort_cost
+            if in_order and query.stop is not None:
+                cost = min(cost, query.stop * size / matches)
+
+            def walk_range(index=space_indexes[field], low=low, high=high, in_order=in_order):
+                cds = (self._byId[key[-1]] for key in index.irange(low, high))
+                return execute(query, cds, ordered=in_order or query.order is None)
+            plans.append((cost, f"index range on {field} ({size:,} CDs)", walk_range))
+        if ordered is not None:
+            cost = n if query.stop is None else min(n, query.stop * n / matches)
+
+            def walk_order():
+                return execute(query, (self._byId[key[-1]] for key in ordered), ordered=True)
+            plans.append((cost, f"index order on {query.order}", walk_order))
+        _, description, run = min(plans, key=lambda plan: plan[0])
+        return description, run
+
+    def getSummary(self, top_k: int = 5) -> Dict:
+        """Reads the live aggregates: O(1) for the totals, O(k) for the top_k fullest CDs."""
+        self._ensureIndexes()
+        return {
+            "total_cds": len(self._byId),
+            "total_size": self._totalSize,
+            "total_occupied": self._totalOccupied,
+            "session_types": dict(self._typeCounts),
+            "top_occupied": [self._byId[cd_id] for _, cd_id in self._byOccupied.islice(0, top_k, reverse=True)],
+        }
 
     def getOpenSessions(self) -> List[CD]:
-        print("Repository: Getting CDs with open sessions...")
-        result = [cd for cd in self._cdList if cd.getOpenSession]
+        logger.debug("Getting CDs with open sessions")
+        self._materialize()
+        scanned(len(self._byId))
+        result = [cd for cd in self._byId.values() if cd.getOpenSession]
         return result
 
     def loadData(self, filepath: str) -> bool:
-        print(f"Repository: Attempting to load data from {filepath}...")
+        try:
+            for _ in self.iterLoad(filepath):
+                pass
+            return True
+        except (IOError, ValueError, TypeError) as e:
+            logger.error("Failed to load data from %s: %s", filepath, e)
+            return False
+
+    def iterLoad(self, filepath: str, chunk_size: int = 10000) -> Iterator[Tuple[int, int, int]]:
+        """
+        Streams a JSON or JSON Lines library into the repository, chunk_size
+        CDs at a time. Yields (cds_loaded, bytes_read, total_bytes) after each
+        chunk, so callers can report progress and query the CDs loaded so far.
+        Raises IOError / ValueError / TypeError on unreadable files.
+
+        If the load fails, or the caller stops iterating early, the library
+        loaded before is put back, so a partial library never looks loaded
+        (and cannot be saved over the file).
+        """
+        previous = (self._cdList, self._byId, self._nextId,
+                    self._shardSize, self._shardedPath, self._dirtyShards, self._lazy)
+        try:
+            yield from self._iterLoad(filepath, chunk_size)
+        except BaseException:
+            if self._lazy is not None and self._lazy is not previous[-1]:
+                self._lazy.close()
+            (self._cdList, self._byId, self._nextId,
+             self._shardSize, self._shardedPath, self._dirtyShards, self._lazy) = previous
+            self._indexesStale = True
+            self._namesStale = True
+            self._version += 1
+            raise
+        if previous[-1] is not None and previous[-1] is not self._lazy:
+            previous[-1].close()
+
+    def _iterLoad(self, filepath: str, chunk_size: int) -> Iterator[Tuple[int, int, int]]:
+        logger.info("Loading data from %s", filepath)
+        # A running compaction is about to swap in a new snapshot and drop the
+        # rotated journal; reading before it finishes would lose that journal
+        self._finishCompaction(wait=True)
         
-        if not os.path.exists(filepath):
-            print("Info: No save file found. Starting with an empty library.")
-            return True 
+        if os.path.exists(filepath) and is_manifest(filepath):
+            yield from self._iterLoadShards(filepath)
+        elif os.path.exists(filepath):
+            reader = open_library(filepath)
+            if isinstance(reader, SnapshotReader):
+                self._loadLazily(reader)
+                yield len(reader), reader.total_bytes, reader.total_bytes
+            else:
+                yield from self._iterLoadReader(reader, chunk_size)
+            self._shardedPath = None
+            logger.info("Loaded %d CDs", self.count())
+        else:
+            logger.info("No save file found, starting with an empty library")
+
+        if self._journaled:
+            self._openJournal(filepath)
+
+    def _loadLazily(self, reader: SnapshotReader):
+        """Keeps the snapshot mapped instead of decoding it; see _lazy."""
+        self._cdList = None
+        self._byId = {}
+        self._lazy = reader
+        self._indexesStale = True
+        self._namesStale = True
+        self._version += 1
+        self._nextId = reader.next_id
 
+    def _iterLoadReader(self, reader, chunk_size: int) -> Iterator[Tuple[int, int, int]]:
+        self._cdList = []
+        self._byId = {}
+        self._lazy = None
+        self._indexesStale = True
+        self._namesStale = True
         try:
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-            
-            self._cdList = []
-            loaded_cds = data.get("cds", [])
-            for cd_data in loaded_cds:
-                self._cdList.append(CD(**cd_data))
-            
-            self._nextId = data.get("nextId", len(self._cdList) + 1)
-            print(f"Successfully loaded {len(self._cdList)} CDs.")
-            return True
-        except (IOError, json.JSONDecodeError, TypeError) as e:
-            print(f"Error: Failed to load data from {filepath}. Error: {e}")
+            for chunk in reader.chunks(chunk_size):
+                for cd_data in chunk:
+                    cd = CD(**cd_data)
+                    if cd.id in self._byId:
+                        logger.warning("Skipping duplicate CD with ID %s", cd.id)
+                        continue
+                    self._byId[cd.id] = cd
+                    self._cdList.append(cd)
+                # Queries between chunks may have rebuilt the indexes
+                self._indexesStale = True
+                self._namesStale = True
+                self._version += 1
+                yield len(self._byId), reader.bytes_read, reader.total_bytes
+        finally:
+            reader.close()
+        self._nextId = reader.next_id if reader.next_id is not None else len(self._byId) + 1
+
+    def _iterLoadShards(self, filepath: str) -> Iterator[Tuple[int, int, int]]:
+        """iterLoad for a sharded library; yields once per shard, as the worker processes finish them."""
+        manifest = read_manifest(filepath)
+        paths = shard_files(filepath, manifest)
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        bytes_read = 0
+        self._cdList = []
+        self._byId = {}
+        self._lazy = None
+        for path, records in parse_shards(paths):
+            for record in records:
+                cd = CD(*record)
+                if cd.id in self._byId:
+                    logger.warning("Skipping duplicate CD with ID %s", cd.id)
+                    continue
+                self._byId[cd.id] = cd
+                self._cdList.append(cd)
+            bytes_read += os.path.getsize(path)
+            self._indexesStale = True
+            self._namesStale = True
+            self._version += 1
+            yield len(self._byId), bytes_read, total_bytes
+
+        self._nextId = manifest["nextId"]
+        # Later saves keep the library's layout
+        self._shardSize = manifest["shardSize"]
+        self._shardedPath = os.path.abspath(filepath)
+        self._dirtyShards = set()
+        logger.info("Loaded %d CDs from %d shards", len(self._byId), len(paths))
+
+    # --- Journal ---
+    def _log(self, op: Dict):
+        # Every change is logged, so this is also where the version moves
+        # and where the shard holding the CD is marked for the next save
+        self._version += 1
+        self._dirtyShards.add(shard_of(op["cd"]["id"] if op["op"] == "add" else op["id"], self._shardSize))
+        if self._journal is not None:
+            self._journal.append(op)
+
+    def _openJournal(self, filepath: str):
+        """Replays the journal kept for filepath and logs further changes to it."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        journal = CDJournal(filepath)
+        replayed = 0
+        for op in journal.read():
+            self._applyOp(op)
+            replayed += 1
+        if replayed:
+            logger.info("Replayed %d journaled changes", replayed)
+        self._journal = journal
+
+    def _applyOp(self, op: Dict):
+        # Operations may be replayed twice after an interrupted compaction,
+        # so each one only sets state rather than depending on it
+        kind = op["op"]
+        if kind == "add":
+            cd = CD(**op["cd"])
+            next_id = self._nextId
+            if self.find_by_id(cd.id) is not None:
+                self.delete(cd.id)
+            self.add(cd)
+            self._nextId = max(next_id, op["nextId"])
+        elif kind == "delete":
+            self.delete(op["id"])
+        elif kind == "finalize":
+            self.set_finalized(op["id"], op["value"])
+        elif kind == "occupy":
+            self.set_occupied_space(op["id"], op["value"])
+
+    def compact(self, wait: bool = False) -> bool:
+        """
+        Folds the journal into a new snapshot of the loaded library, written
+        on a background thread and swapped in atomically. Returns False when
+        there is no journal or a compaction is already running.
+        """
+        self._finishCompaction(wait=False)
+        if self._journal is None or self._compactor is not None:
             return False
+        journal = self._journal
+        journal.rotate()
+        # Capture now; the CDs are serialised on the worker thread
+        write, finish = self._captureLibrary(journal.snapshot_path)
+        saved = [False]
+
+        def run():
+            try:
+                write()
+                journal.discard_rotated()
+                saved[0] = True
+            except IOError as e:
+                # The rotated journal is kept and replayed on the next load
+                logger.error("Failed to compact %s: %s", journal.snapshot_path, e)
+
+        self._compactFinish = lambda: finish(saved[0])
+        self._compactor = threading.Thread(target=run, name="cd-journal-compactor", daemon=True)
+        self._compactor.start()
+        if wait:
+            self._finishCompaction(wait=True)
+        return True
+
+    def _finishCompaction(self, wait: bool):
+        """
+        Applies the bookkeeping of a finished compaction on the calling
+        thread, which holds the repository (the compactor never touches
+        it). With wait, first waits for a running one.
+        """
+        compactor = self._compactor
+        if compactor is None or (compactor.is_alive() and not wait):
+            return
+        compactor.join()
+        finish, self._compactor, self._compactFinish = self._compactFinish, None, None
+        finish()
+
+    def _insertIndexes(self, cd: CD):
+        if self._indexesStale:
+            return  # picked up by the next rebuild
+        for field, index in self._sorted.items():
+            index.insert(SORT_KEYS[field](cd))
+        self._totalSize += cd.size
+        self._countType(cd.session_type, 1)
+        self._insertSpace(cd)
+
+    def _removeIndexes(self, cd: CD):
+        if self._indexesStale:
+            return
+        for field, index in self._sorted.items():
+            index.remove(SORT_KEYS[field](cd))
+        self._totalSize -= cd.size
+        self._countType(cd.session_type, -1)
+        self._removeSpace(cd)
+
+    # Only these depend on occupied space, so set_occupied_space touches nothing else
+    def _insertSpace(self, cd: CD):
+        self._byFreeSpace.insert((cd.getFreeSpace, cd.id))
+        self._byOccupied.insert((cd.occupied_space, cd.id))
+        self._totalOccupied += cd.occupied_space
+
+    def _removeSpace(self, cd: CD):
+        self._byFreeSpace.remove((cd.getFreeSpace, cd.id))
+        self._byOccupied.remove((cd.occupied_space, cd.id))
+        self._totalOccupied -= cd.occupied_space
+
+    def _countType(self, session_type: str, delta: int):
+        count = self._typeCounts[session_type] + delta
+        if count:
+            self._typeCounts[session_type] = count
+        else:
+            del self._typeCounts[session_type]
+
+    def _ensureIndexes(self):
+        """Rebuilds the ordered indexes and aggregates from _byId if a load left them stale."""
+        if not self._indexesStale:
+            return
+        with self._lazyLock:
+            if not self._indexesStale:  # rebuilt by another reader meanwhile
+                return
+            self._materialize()
+            cds = self._byId.values()
+            for field, index in self._sorted.items():
+                index.rebuild(SORT_KEYS[field](cd) for cd in cds)
+            self._byFreeSpace.rebuild((cd.getFreeSpace, cd.id) for cd in cds)
+            self._byOccupied.rebuild((cd.occupied_space, cd.id) for cd in cds)
+            self._totalSize = math.fsum(cd.size for cd in cds)
+            self._totalOccupied = math.fsum(cd.occupied_space for cd in cds)
+            self._typeCounts = Counter(cd.session_type for cd in cds)
+            self._indexesStale = False
+
+    def close(self):
+        """
+        Waits for a running compaction, folds any changes still only in the
+        journal into the library (so the file is complete for readers that
+        do not replay journals), and closes the journal and a lazily loaded
+        snapshot.
+        """
+        self._finishCompaction(wait=True)
+        if self._journal is not None and self._journal.pending:
+            try:
+                self.compact(wait=True)
+            except OSError as e:
+                # The journal stays; the next load replays it
+                logger.error("Failed to compact %s: %s", self._journal.snapshot_path, e)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._lazy is not None:
+            self._lazy.close()
 
     def uploadData(self, filepath: str) -> bool:
-        # save to a JSON file
-        print(f"Repository: Saving data to {filepath}...")
+        if self._journal is not None and self._journal.covers(filepath):
+            # Everything is already in the journal; just make it durable
+            logger.debug("Flushing journal for %s", filepath)
+            try:
+                self._journal.flush()
+                if self._journal.pending >= self._compactEvery:
+                    self.compact()
+                return True
+            except IOError as e:
+                logger.error("Failed to save data to %s: %s", filepath, e)
+                return False
+
+        # save to a JSON file (or JSON Lines for .jsonl paths)
+        logger.info("Saving data to %s", filepath)
+        write, finish = self._captureLibrary(filepath)
         try:
-            data_to_save = [cd.to_dict() for cd in self._cdList]
-            
-            payload = {
-                "cds": data_to_save,
-                "nextId": self._nextId
-            }
-
-            with open(filepath, 'w') as f:
-                json.dump(payload, f, indent=4)
-            
-            print(f"Successfully saved {len(self._cdList)} CDs.")
-            return True
+            write()
         except IOError as e:
-            print(f"Error: Failed to save data to {filepath}. Error: {e}")
+            logger.error("Failed to save data to %s: %s", filepath, e)
+            finish(False)
             return False
+        finish(True)
+        logger.info("Saved %d CDs", len(self._byId))
+        return True
+
+    def captureSave(self, filepath: str) -> Optional[Callable[[], Tuple[bool, Optional[Callable[[], None]]]]]:
+        """
+        Copies the list (or the changed shards), as compaction does, so the
+        write needs nothing else from the repository. Its finish step notes
+        which shards the manifest's files now match. A journaled save needs
+        no capture: it only flushes the journal.
+        """
+        if self._journal is not None and self._journal.covers(filepath):
+            return None
+        write_library, finish = self._captureLibrary(filepath)
+        count = len(self._byId)
+
+        def write() -> Tuple[bool, Optional[Callable[[], None]]]:
+            try:
+                write_library()
+                logger.info("Saved %d CDs", count)
+                return True, lambda: finish(True)
+            except IOError as e:
+                logger.error("Failed to save data to %s: %s", filepath, e)
+                return False, lambda: finish(False)
+        return write
+
+    def _captureLibrary(self, filepath: str) -> Tuple[Callable[[], None], Callable[[bool], None]]:
+        """
+        Takes what saving filepath needs and returns the writer, which
+        raises IOError on failure and touches nothing in the repository,
+        and finish(saved), which updates the shard bookkeeping afterwards
+        and must run where the repository may be changed (under the write
+        lock when it is shared). A sharded library written here before
+        only needs its changed shards, collected by ID so the cost follows
+        the shard size rather than the library size.
+        """
+        # Also unmaps a lazily loaded snapshot, which the write may replace
+        self._materialize()
+        # Shards a failed compaction still has to write go with this save
+        self._finishCompaction(wait=False)
+        next_id = self._nextId
+        if not is_manifest(filepath):
+            cds = list(self._byId.values())
+            return lambda: self._writeLibrary(filepath, cds, next_id), lambda saved: None
+
+        path, size = os.path.abspath(filepath), self._shardSize
+        dirty, self._dirtyShards = self._dirtyShards, set()
+        complete = self._shardedPath != path or not os.path.exists(path)
+        if complete:
+            shards = group_by_shard(self._byId.values(), size)
+        else:
+            shards = {}
+            for index in dirty:
+                first, last = shard_ids(index, size)
+                shards[index] = [self._byId[cd_id] for cd_id in range(first, last + 1) if cd_id in self._byId]
+
+        codec = self._codec or "none"
+
+        def write():
+            try:
+                write_shards(path, shards, next_id, size, complete=complete, codec=codec)
+            except (IOError, ValueError) as e:
+                raise IOError(e) from e
+            logger.debug("Wrote %d of the shards of %s", len(shards), path)
+
+        def finish(saved: bool):
+            if saved:
+                self._shardedPath = path
+            else:
+                # Written again by the next save
+                self._dirtyShards |= dirty
+        return write, finish
+
+    def _writeLibrary(self, filepath: str, cds: List[CD], next_id: int):
+        """Writes a temporary file and renames it over filepath, so a crash never leaves half a library."""
+        if filepath.lower().endswith(".cdb") or is_snapshot(filepath):
+            write_snapshot(filepath, cds, next_id)
+            return
+
+        tmp_path = filepath + ".tmp"
+        with open_text_writer(tmp_path, codec_for_path(filepath, self._codec)) as f:
+            write = write_json_lines if is_json_lines(filepath) else write_json
+            write(f, (cd.to_dict() for cd in cds), next_id)
+        os.replace(tmp_path, filepath)
+        if self._snapshot:
+            # Written after the JSON file so it is never older than it
+            write_snapshot(snapshot_path_for(filepath), cds, next_id)
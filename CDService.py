@@ -1,50 +1,214 @@
-from typing import List, Optional
-from xmlrpc.client import boolean
+from contextlib import nullcontext
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import csv
 
 from CD import CD
-from ICDRepository import ICDRepository
+from CDConfig import create_repository, load_config
+from CDFilter import FIELDS, Condition
+from CDIterator import CDIterator
+from CDQuery import CDQuery
+from ICDRepository import ICDRepository, SORT_KEYS
+
+# Fields a record passed to add_many must have, in CD constructor order
+RECORD_FIELDS = ("name", "size", "encryption_speed", "occupied_space", "session_count", "session_type")
 
 class CDService:
     def __init__(self, repository: ICDRepository):
         self._repository = repository
 
+    @classmethod
+    def from_config(cls, config: Optional[Dict] = None) -> "CDService":
+        """
+        Builds a service on the backend chosen by config (see CDConfig).
+        With config["shared"] the repository is wrapped for use by several
+        threads at once.
+        """
+        config = config if config is not None else load_config()
+        repository = create_repository(config)
+        if config.get("shared"):
+            # One repository used by many threads (see SharedRepository)
+            from SharedRepository import LockedRepository
+            repository = LockedRepository(repository)
+        if not config.get("instrument"):
+            return cls(repository)
+        from CDInstrumentation import instrument
+        return instrument(cls(instrument(repository, "repository")), "service")
+
     def add(self, name: str, size: float, encryption_speed: int,
             occupied_space: float, session_count: int, session_type: str) -> bool:
-        new_id = self._repository.get_next_id()
-        new_cd = CD(new_id, name, size, encryption_speed, occupied_space, session_count, session_type)
-        return self._repository.add(new_cd)
+        # Another session must not take the same ID in between
+        with self._writing():
+            new_id = self._repository.get_next_id()
+            new_cd = CD(new_id, name, size, encryption_speed, occupied_space, session_count, session_type)
+            return self._repository.add(new_cd)
+
+    def _writing(self):
+        """Holds a shared repository's write lock across several calls; a no-op otherwise."""
+        writing = getattr(self._repository, "writing", None)
+        return writing() if writing is not None else nullcontext()
+
+    def add_many(self, records: Iterable[Dict], batch_size: int = 10000) -> List[Optional[int]]:
+        """
+        Adds a CD per record (a dict with the add() arguments; any "id" is
+        ignored). Records are consumed batch_size at a time, so a generator
+        can stream a large import. Each batch reserves one ID range and is
+        handed to the repository in one call.
+
+        Returns, per record, the new CD's ID, or None when the record was
+        rejected: a missing field, occupied_space outside 0..size, or a
+        failed insert.
+        """
+        results: List[Optional[int]] = []
+        records = iter(records)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                return results
+            fields: List[Optional[Tuple]] = []
+            for record in batch:
+                try:
+                    values = tuple(record[field] for field in RECORD_FIELDS)
+                    valid = 0 <= values[3] <= values[1]
+                except (KeyError, TypeError):
+                    valid = False
+                fields.append(values if valid else None)
+
+            next_id = self._repository.reserve_ids(sum(values is not None for values in fields))
+            cds = []
+            for values in fields:
+                if values is not None:
+                    cds.append(CD(next_id, *values))
+                    next_id += 1
+            added = iter(self._repository.add_batch(cds))
+            cds = iter(cds)
+            for values in fields:
+                if values is None:
+                    results.append(None)
+                else:
+                    cd = next(cds)
+                    results.append(cd.id if next(added) else None)
 
     def update_status(self, cd_id: int, is_finalized: bool) -> bool:
         """Updates the finalization status of a CD."""
-        cd = self.find_by_id(cd_id)
-        if cd:
-            cd.set_finalized(is_finalized)
-            return True
-        return False
+        return self._repository.set_finalized(cd_id, is_finalized)
 
-    def sortByName(self) -> List[CD]:
-        return sorted(self._repository.getAll(), key=lambda cd: cd.name)
+    def update_statuses(self, changes: Dict[int, bool]) -> Dict[int, bool]:
+        """Updates the finalization status of several CDs in one call (cd_id -> is_finalized)."""
+        if not changes:
+            return {}
+        return self._repository.set_finalized_batch(changes)
 
-    def sortBySpeed(self) -> List[CD]:
-        return sorted(self._repository.getAll(), key=lambda cd: cd.encryption_speed, reverse=True)
+    def update_occupied_space(self, cd_id: int, occupied_space: float) -> bool:
+        """Updates how much of a CD is used; fails if it exceeds the disc size."""
+        return self._repository.set_occupied_space(cd_id, occupied_space)
 
-    def sortBySize(self) -> List[CD]:
-        return sorted(self._repository.getAll(), key=lambda cd: cd.size, reverse=True)
+    def sortByName(self, limit: Optional[int] = None, offset: int = 0) -> List[CD]:
+        return self._repository.getSorted("name", limit, offset)
 
-    def filterByFreeSpace(self, min_space: float) -> List[CD]:
+    def sortBySpeed(self, limit: Optional[int] = None, offset: int = 0) -> List[CD]:
+        return self._repository.getSorted("encryption_speed", limit, offset)
+
+    def sortBySize(self, limit: Optional[int] = None, offset: int = 0) -> List[CD]:
+        return self._repository.getSorted("size", limit, offset)
+
+    def filterByFreeSpace(self, min_space: float, max_space: Optional[float] = None,
+                          top: Optional[int] = None) -> List[CD]:
+        """
+        CDs with more than min_space MB free, least free first (by ID among
+        equals). min_space is always exclusive: with max_space, returns
+        min_space < free <= max_space. With top, returns at most that many
+        CDs, most free first.
+        """
+        if max_space is not None:
+            result = self._repository.getFreeSpaceBetween(min_space, max_space)
+            return result if top is None else result[::-1][:top]
+        if top is not None:
+            return [cd for cd in self._repository.getMostFreeSpace(top) if cd.getFreeSpace > min_space]
         return self._repository.getFreeSpace(min_space)
     
+    def get_next_id(self) -> int:
+        return self._repository.get_next_id()
+
+    def get_version(self) -> Optional[int]:
+        """The repository's change counter (None if it does not track changes)."""
+        return self._repository.get_version()
+
+    def search(self, query: str) -> List[CD]:
+        """CDs matching the Library search box: an ID, or part of a name (any case)."""
+        query = query.strip()
+        if query.isdigit():
+            cd = self._repository.find_by_id(int(query))
+            return [cd] if cd else []
+        return self._repository.search_by_name(query)
+
+    def search_by_name(self, query: str, limit: Optional[int] = None) -> List[CD]:
+        """CDs whose name contains query (any case), best match first, at most limit of them."""
+        return self._repository.search_by_name(query, limit)
+
+    def count_cds(self, search: Optional[str] = None) -> int:
+        """Number of CDs, or of CDs matching search."""
+        if search:
+            return len(self.search(search))
+        return self._repository.count()
+
+    def get_page(self, sort: str = "id", offset: int = 0, limit: int = 50,
+                 search: Optional[str] = None) -> List[CD]:
+        """
+        One page of the library in sort order (a SORT_KEYS field), optionally
+        only the CDs matching search. Without a search the repository reads
+        the page straight from its ordering, so the cost follows the page
+        size rather than the library size.
+        """
+        if search:
+            return sorted(self.search(search), key=SORT_KEYS[sort])[offset:offset + limit]
+        return self._repository.getSorted(sort, limit, offset)
+
+    def query(self, query: CDQuery) -> list:
+        """
+        Runs a CDQuery (filters on any field, ordering, offset, limit) in a
+        single pass along the access path the repository's planner picks.
+        """
+        return self._repository.runQuery(query)
+
+    def explain(self, query: CDQuery) -> str:
+        """The access path the repository would use for query."""
+        return self._repository.planQuery(query)[0]
+
+    def iter_cds(self, where: Sequence[Condition] = (), fields: Optional[Sequence[str]] = None,
+                 chunk_size: int = 10000) -> CDIterator:
+        """Streams the CDs matching where (see CDFilter), or dicts of fields, in bounded memory."""
+        return CDIterator(self._repository, where, fields, chunk_size)
+
+    def export_csv(self, filepath: str, where: Sequence[Condition] = (),
+                   fields: Optional[Sequence[str]] = None) -> int:
+        """
+        Writes the CDs matching where to a CSV file, one column per field
+        (all of FIELDS by default), a chunk at a time. Returns the number
+        of CDs written.
+        """
+        fields = tuple(fields or FIELDS)
+        written = 0
+        with open(filepath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for chunk in self.iter_cds(where, fields).chunks():
+                writer.writerows([record[field] for field in fields] for record in chunk)
+                written += len(chunk)
+        return written
+
     def get_all_cds(self) -> List[CD]:
         return self._repository.getAll()
 
     def get_open_sessions(self) -> List[CD]:
         return self._repository.getOpenSessions()
 
+    def get_summary(self, top_k: int = 5) -> Dict:
+        """Totals, session type counts and the top_k fullest CDs for the dashboard."""
+        return self._repository.getSummary(top_k)
+
     def find_by_id(self, cd_id: int) -> Optional[CD]:
-        for cd in self._repository.getAll():
-            if cd.id == cd_id:
-                return cd
-        return None
+        return self._repository.find_by_id(cd_id)
     
     def delete_cd(self, cd_id: int) -> bool:
         return self._repository.delete(cd_id)
@@ -52,5 +216,40 @@ class CDService:
     def save(self, filepath: str) -> bool:
         return self._repository.uploadData(filepath)
 
+    def capture_save(self, filepath: str) -> Callable[[], bool]:
+        """
+        Captures the library for saving to filepath and returns a function
+        that writes the capture, which may run on another thread while the
+        library keeps changing (see BackgroundSaver), and returns whether it
+        saved. Without a cheap capture in the repository the function
+        simply calls save().
+        """
+        write = self._repository.captureSave(filepath)
+        if write is None:
+            return lambda: self.save(filepath)
+
+        def save() -> bool:
+            saved, finish = write()
+            if finish is not None:
+                # Updates the repository, so not alongside its readers
+                with self._writing():
+                    finish()
+            return saved
+        return save
+
+    def prepare_reads(self):
+        """Finishes index work the repository deferred to the next read, e.g. the rebuild after a load."""
+        self._repository.prepareReads()
+
+    def close(self):
+        """Closes the repository, if it has anything to close (a journal, a database connection)."""
+        close = getattr(self._repository, "close", None)
+        if close is not None:
+            close()
+
     def load(self, filepath: str) -> bool:
-        return self._repository.loadData(filepath)
\ No newline at end of file
+        return self._repository.loadData(filepath)
+
+    def iter_load(self, filepath: str) -> Iterator[Tuple[int, int, int]]:
+        """Loads filepath, yielding (cds_loaded, bytes_read, total_bytes) progress."""
+        return self._repository.iterLoad(filepath)
\ No newline at end of file
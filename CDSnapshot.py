@@ -0,0 +1,161 @@
+"""
+Binary library snapshot, read through mmap.
+
+Records have a fixed size and are sorted by ID, so one can be read by
+position or found by ID without decoding the rest. The memory backend
+loads a snapshot that way: opening it costs O(1) and CDs are decoded as
+they are asked for (see CDRepository). The other backends read every
+record, but still skip JSON parsing and decode each session type once.
+
+Layout (little endian):
+    header   magic b"CDSN", version (u32), record count (u64), nextId (u64),
+             heap offset (u64)                                     32 bytes
+    records  one per CD, sorted by ID:
+             id (i64), size (f64), encryption_speed (i64),
+             occupied_space (f64), session_count (i64),
+             name offset (u64), name length (u32),
+             session_type offset (u64), session_type length (u32)  64 bytes
+    heap     UTF-8 names and session types; offsets are relative to the
+             heap and each distinct session type is stored once
+"""
+
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from CD import CD
+
+MAGIC = b"CDSN"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQQ")
+RECORD = struct.Struct("<qdqdqQIQI")
+SNAPSHOT_EXTENSIONS = (".cdb",)
+
+def is_snapshot(filepath: str) -> bool:
+    """True if filepath holds a binary snapshot (checked by its magic bytes)."""
+    try:
+        with open(filepath, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except IOError:
+        return False
+
+def snapshot_path_for(filepath: str) -> str:
+    """The snapshot kept next to a JSON library: cd_library.json -> cd_library.cdb."""
+    return os.path.splitext(filepath)[0] + SNAPSHOT_EXTENSIONS[0]
+
+def write_snapshot(filepath: str, cds: Iterable[CD], next_id: int):
+    """Writes cds to filepath atomically (temporary file, then rename)."""
+    ordered = sorted(cds, key=lambda cd: cd.id)
+    heap = bytearray()
+    type_offsets: Dict[str, int] = {}
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        heap_offset = HEADER.size + RECORD.size * len(ordered)
+        f.write(HEADER.pack(MAGIC, VERSION, len(ordered), next_id, heap_offset))
+        for cd in ordered:
+            name = cd.name.encode("utf-8")
+            name_offset = len(heap)
+            heap += name
+            session_type = cd.session_type.encode("utf-8")
+            type_offset = type_offsets.get(cd.session_type)
+            if type_offset is None:
+                type_offset = type_offsets[cd.session_type] = len(heap)
+                heap += session_type
+            f.write(RECORD.pack(cd.id, cd.size, cd.encryption_speed, cd.occupied_space, cd.session_count,
+                                name_offset, len(name), type_offset, len(session_type)))
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+class SnapshotReader:
+    """
+    Read-only view of a snapshot. Opening only maps the file and reads the
+    header; records are decoded when accessed, by position or by ID
+    (binary search over the ID-sorted records).
+
+    Also offers the LibraryReader interface (iteration over record dicts,
+    chunks(), next_id, bytes_read / total_bytes) so repositories can load a
+    snapshot through the same path as a JSON library.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        self.total_bytes = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self.next_id, self._heapOffset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{filepath} is not a version {VERSION} CD snapshot")
+        self.bytes_read = HEADER.size
+        self._types: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._heapOffset + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _sessionType(self, offset: int, length: int) -> str:
+        session_type = self._types.get(offset)
+        if session_type is None:
+            session_type = self._types[offset] = self._string(offset, length)
+        return session_type
+
+    def _fields(self, values) -> Dict:
+        cd_id, size, speed, occupied, sessions, name_off, name_len, type_off, type_len = values
+        return {
+            "id": cd_id, "name": self._string(name_off, name_len), "size": size,
+            "encryption_speed": speed, "occupied_space": occupied, "session_count": sessions,
+            "session_type": self._sessionType(type_off, type_len),
+        }
+
+    def id_at(self, index: int) -> int:
+        return struct.unpack_from("<q", self._mm, HEADER.size + index * RECORD.size)[0]
+
+    def __getitem__(self, index: int) -> CD:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return CD(**self._fields(RECORD.unpack_from(self._mm, HEADER.size + index * RECORD.size)))
+
+    def find(self, cd_id: int) -> Optional[CD]:
+        """Binary search by ID without decoding any other record."""
+        index = bisect_left(range(self._count), cd_id, key=self.id_at)
+        if index < self._count and self.id_at(index) == cd_id:
+            return self[index]
+        return None
+
+    def __iter__(self) -> Iterator[Dict]:
+        # unpack_from keeps no buffer exported, so close() works mid-iteration
+        for offset in range(HEADER.size, self._heapOffset, RECORD.size):
+            self.bytes_read += RECORD.size
+            yield self._fields(RECORD.unpack_from(self._mm, offset))
+        self.bytes_read = self.total_bytes
+
+    def chunks(self, size: int) -> Iterator[List[Dict]]:
+        chunk: List[Dict] = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
@@ -0,0 +1,513 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import logging
+import os
+import numpy as np
+
+from CD import CD
+from CDFilter import OPERATORS, Condition, validate
+from CDInstrumentation import scanned
+from CDJournal import reject_pending_journal
+from CDQuery import CDQuery
+from ICDRepository import ICDRepository
+from CDSnapshot import write_snapshot
+from NameIndex import NameIndex
+from ShardedLibrary import reject_manifest
+from LibraryStream import is_json_lines, open_library, write_json, write_json_lines
+
+logger = logging.getLogger(__name__)
+
+# Column name -> dtype. "name" and "session_type" hold codes into the
+# category lists, "alive" marks rows that have not been deleted.
+COLUMNS = {
+    "id": np.int64,
+    "size": np.float64,
+    "encryption_speed": np.int64,
+    "occupied_space": np.float64,
+    "session_count": np.int64,
+    "name": np.int32,
+    "session_type": np.int32,
+    "alive": np.bool_,
+}
+
+class ColumnarCDRepository(ICDRepository):
+    """
+    Stores the library as one contiguous NumPy array per CD field.
+
+    Names and session types are categorical: each distinct string is stored
+    once and rows hold its code. Rows are kept ordered by ID so lookups use
+    a binary search; deletes only clear the "alive" flag and the arrays are
+    compacted once enough rows are dead. Filters, sorts and totals run as
+    vectorized operations and CD objects are built only for the rows a
+    caller asks for. Those CDs are copies: change status through
+    set_finalized / set_occupied_space on the repository.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._cols: Dict[str, np.ndarray] = {
+            name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS.items()
+        }
+        self._n = 0          # rows in use, including dead ones
+        self._dead = 0
+        self._nextId = 1
+        self._names: List[str] = []
+        self._nameCodes: Dict[str, int] = {}
+        self._nameRanks: Optional[np.ndarray] = None
+        # Trigram index over name codes; names are append-only, so it only
+        # has to catch up with the codes added since the last search
+        self._nameIndex = NameIndex()
+        self._types: List[str] = []
+        self._typeCodes: Dict[str, int] = {}
+        self._typeIsOpen = np.empty(0, dtype=np.bool_)
+        self._version = 0    # bumped on every change; see get_version
+        # getSorted field -> (version, ordered rows), so paging through an
+        # unchanged library sorts it only once
+        self._orders: Dict[str, tuple] = {}
+        # (version, top_k, summary) from the last getSummary
+        self._summary: Optional[tuple] = None
+
+    # --- Column helpers ---
+    def _col(self, name: str) -> np.ndarray:
+        return self._cols[name][:self._n]
+
+    def _liveMask(self) -> np.ndarray:
+        return self._col("alive")
+
+    def _nameCode(self, name: str) -> int:
+        code = self._nameCodes.get(name)
+        if code is None:
+            code = self._nameCodes[name] = len(self._names)
+            self._names.append(name)
+            self._nameRanks = None
+        return code
+
+    def _typeCode(self, session_type: str) -> int:
+        session_type = str(session_type).strip()
+        code = self._typeCodes.get(session_type)
+        if code is None:
+            code = self._typeCodes[session_type] = len(self._types)
+            self._types.append(session_type)
+            self._typeIsOpen = np.append(self._typeIsOpen, session_type.lower() != "finalized")
+        return code
+
+    def _reserve(self, extra: int):
+        needed = self._n + extra
+        capacity = len(self._cols["id"])
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name, col in self._cols.items():
+            grown = np.empty(capacity, dtype=col.dtype)
+            grown[:self._n] = col[:self._n]
+            self._cols[name] = grown
+
+    def _row(self, cd_id: int) -> Optional[int]:
+        ids = self._col("id")
+        row = int(np.searchsorted(ids, cd_id))
+        if row < self._n and ids[row] == cd_id and self._cols["alive"][row]:
+            return row
+        return None
+
+    def _cd(self, row: int) -> CD:
+        cols = self._cols
+        return CD(int(cols["id"][row]), self._names[cols["name"][row]], float(cols["size"][row]),
+                  int(cols["encryption_speed"][row]), float(cols["occupied_space"][row]),
+                  int(cols["session_count"][row]), self._types[cols["session_type"][row]])
+
+    def _cds(self, rows) -> List[CD]:
+        return [self._cd(int(row)) for row in rows]
+
+    def _compact(self):
+        keep = self._liveMask().copy()
+        count = int(keep.sum())
+        for name, col in self._cols.items():
+            col[:count] = col[:self._n][keep]
+        self._n = count
+        self._dead = 0
+
+    def _freeSpace(self) -> np.ndarray:
+        return self._col("size") - self._col("occupied_space")
+
+    def _values(self, field: str) -> np.ndarray:
+        """Per-row values of a numeric or derived field (names and types stay codes)."""
+        if field == "free_space":
+            return self._freeSpace()
+        if field == "is_open":
+            return self._typeIsOpen[self._col("session_type")]
+        return self._col(field)
+
+    def _whereMask(self, where: Sequence[Condition]) -> np.ndarray:
+        """Live rows matching every condition, evaluated column by column."""
+        scanned(self._n)
+        mask = self._liveMask().copy()
+        for field, op, value in where:
+            test = OPERATORS[op]
+            if field in ("name", "session_type"):
+                # Test each distinct string once; rows pick up their code's result
+                categories = self._names if field == "name" else self._types
+                matching = np.fromiter((test(category, value) for category in categories),
+                                       dtype=np.bool_, count=len(categories))
+                mask &= matching[self._col(field)]
+            elif op == "in":
+                mask &= np.isin(self._values(field), list(value))
+            elif op == "contains":
+                mask &= np.array([test(item, value) for item in self._values(field).tolist()], dtype=np.bool_)
+            else:
+                mask &= test(self._values(field), value)
+        return mask
+
+    def _orderValues(self, field: str) -> np.ndarray:
+        """Per-row values that sort like field; names and types become their alphabetical rank."""
+        if field == "name":
+            return self._ensureNameRanks()[self._col("name")]
+        if field == "session_type":
+            return self._ranks(self._types)[self._col("session_type")]
+        return self._values(field)
+
+    def _ensureNameRanks(self) -> np.ndarray:
+        if self._nameRanks is None:
+            self._nameRanks = self._ranks(self._names)
+        return self._nameRanks
+
+    @staticmethod
+    def _ranks(categories: List[str]) -> np.ndarray:
+        ranks = np.empty(len(categories), dtype=np.int64)
+        ranks[np.argsort(np.array(categories, dtype=object), kind="stable")] = np.arange(len(categories))
+        return ranks
+
+    def _project(self, rows: np.ndarray, fields: Sequence[str]) -> List[Dict]:
+        """Dicts of fields for rows, gathering each column once."""
+        columns = []
+        for field in fields:
+            if field == "name":
+                columns.append([self._names[code] for code in self._col("name")[rows].tolist()])
+            elif field == "session_type":
+                columns.append([self._types[code] for code in self._col("session_type")[rows].tolist()])
+            else:
+                columns.append(self._values(field)[rows].tolist())
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+
+    # --- ICDRepository ---
+    def get_next_id(self) -> int:
+        return self._nextId
+
+    def get_version(self) -> int:
+        return self._version
+
+    def count(self) -> int:
+        return len(self)
+
+    def __len__(self) -> int:
+        return self._n - self._dead
+
+    def add(self, cd: CD) -> bool:
+        ids = self._col("id")
+        row = int(np.searchsorted(ids, cd.id))
+        if row < self._n and ids[row] == cd.id:
+            if self._cols["alive"][row]:
+                return False
+            # Reuse the tombstone left by a deleted CD with the same ID
+            self._dead -= 1
+        else:
+            self._reserve(1)
+            if row < self._n:
+                # Out-of-order ID: shift the tail to keep the ID column sorted
+                for col in self._cols.values():
+                    col[row + 1:self._n + 1] = col[row:self._n].copy()
+            self._n += 1
+
+        cols = self._cols
+        cols["id"][row] = cd.id
+        cols["size"][row] = cd.size
+        cols["encryption_speed"][row] = cd.encryption_speed
+        cols["occupied_space"][row] = cd.occupied_space
+        cols["session_count"][row] = cd.session_count
+        cols["name"][row] = self._nameCode(cd.name)
+        cols["session_type"][row] = self._typeCode(cd.session_type)
+        cols["alive"][row] = True
+        self._nextId += 1
+        self._version += 1
+        return True
+
+    def reserve_ids(self, count: int) -> int:
+        first = self._nextId
+        self._nextId += count
+        return first
+
+    def add_batch(self, cds: Iterable[CD]) -> List[bool]:
+        """
+        Adds CDs, returning one flag per CD. IDs ascending past the last row
+        (as reserve_ids hands out) are appended to the columns in one step;
+        anything else goes through add. The next ID only moves past the
+        largest ID added.
+        """
+        cds = list(cds)
+        if not cds:
+            return []
+        next_id = self._nextId
+        ids = np.fromiter((cd.id for cd in cds), dtype=np.int64, count=len(cds))
+        appendable = (self._n == 0 or ids[0] > self._cols["id"][self._n - 1]) and bool(np.all(ids[1:] > ids[:-1]))
+        if not appendable:
+            results = [self.add(cd) for cd in cds]
+        else:
+            start, count = self._n, len(cds)
+            self._reserve(count)
+            cols = self._cols
+            cols["id"][start:start + count] = ids
+            for field in ("size", "encryption_speed", "occupied_space", "session_count"):
+                cols[field][start:start + count] = [getattr(cd, field) for cd in cds]
+            cols["name"][start:start + count] = [self._nameCode(cd.name) for cd in cds]
+            cols["session_type"][start:start + count] = [self._typeCode(cd.session_type) for cd in cds]
+            cols["alive"][start:start + count] = True
+            self._n += count
+            results = [True] * count
+            self._version += 1
+        self._nextId = max(next_id, int(ids.max()) + 1)
+        return results
+
+    def delete(self, cd_id: int) -> bool:
+        row = self._row(cd_id)
+        if row is None:
+            return False
+        self._cols["alive"][row] = False
+        self._dead += 1
+        self._version += 1
+        if self._dead > max(1024, self._n // 4):
+            self._compact()
+        return True
+
+    def find_by_id(self, cd_id: int) -> Optional[CD]:
+        row = self._row(cd_id)
+        return None if row is None else self._cd(row)
+
+    def set_finalized(self, cd_id: int, is_finalized: bool) -> bool:
+        row = self._row(cd_id)
+        if row is None:
+            return False
+        # Same rules as CD.set_finalized
+        current = self._types[self._cols["session_type"][row]]
+        if is_finalized:
+            self._cols["session_type"][row] = self._typeCode("Finalized")
+        elif current.lower() == "finalized":
+            self._cols["session_type"][row] = self._typeCode("Data")
+        self._version += 1
+        return True
+
+    def set_occupied_space(self, cd_id: int, occupied_space: float) -> bool:
+        row = self._row(cd_id)
+        if row is None or not 0 <= occupied_space <= self._cols["size"][row]:
+            return False
+        self._cols["occupied_space"][row] = occupied_space
+        self._version += 1
+        return True
+
+    def getAll(self) -> List[CD]:
+        return self._cds(np.flatnonzero(self._liveMask()))
+
+    def iterChunks(self, chunk_size: int = 10000, where: Sequence[Condition] = (),
+                   fields: Optional[Sequence[str]] = None) -> Iterator[list]:
+        """Filters with one vectorized mask, then builds only a chunk of CDs (or dicts) at a time."""
+        validate(where, fields)
+        version = self._version
+        rows = np.flatnonzero(self._whereMask(where))
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            yield self._cds(chunk) if fields is None else self._project(chunk, fields)
+            if self._version != version:
+                raise RuntimeError("Library changed during iteration")
+
+    def planQuery(self, query: CDQuery) -> Tuple[str, Callable[[], list]]:
+        """Always one vectorized pass: a mask for the filter, a lexsort of the matches, then the page."""
+        def scan():
+            rows = np.flatnonzero(self._whereMask(query.conditions))
+            if query.order is not None:
+                primary = self._orderValues(query.order)[rows]
+                if primary.dtype == np.bool_:
+                    primary = primary.astype(np.int64)  # so it can be negated
+                rows = rows[np.lexsort((self._col("id")[rows], -primary if query.descending else primary))]
+            rows = rows[query.offset:query.stop]
+            return self._cds(rows) if query.fields is None else self._project(rows, query.fields)
+        return "columnar scan", scan
+
+    def getSorted(self, field: str, limit: Optional[int] = None, offset: int = 0) -> List[CD]:
+        stop = None if limit is None else offset + limit
+        return self._cds(self._sortedRows(field)[offset:stop])
+
+    def _sortedRows(self, field: str) -> np.ndarray:
+        cached = self._orders.get(field)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        scanned(self._n)
+        rows = np.flatnonzero(self._liveMask())
+        ids = self._col("id")[rows]
+        if field == "id":
+            # Rows are kept in ID order already
+            self._orders[field] = (self._version, rows)
+            return rows
+        if field == "name":
+            primary = self._orderValues("name")[rows]
+        elif field in ("size", "encryption_speed"):
+            primary = -self._col(field)[rows]
+        else:
+            raise KeyError(field)
+        rows = rows[np.lexsort((ids, primary))]
+        self._orders[field] = (self._version, rows)
+        return rows
+
+    def getFreeSpace(self, min_space: float) -> List[CD]:
+        scanned(self._n)
+        free = self._freeSpace()
+        rows = np.flatnonzero(self._liveMask() & (free > min_space))
+        return self._cds(rows[np.lexsort((self._col("id")[rows], free[rows]))])
+
+    def getFreeSpaceBetween(self, min_space: float, max_space: float) -> List[CD]:
+        scanned(self._n)
+        free = self._freeSpace()
+        rows = np.flatnonzero(self._liveMask() & (free > min_space) & (free <= max_space))
+        return self._cds(rows[np.lexsort((self._col("id")[rows], free[rows]))])
+
+    def getMostFreeSpace(self, k: int) -> List[CD]:
+        return self._cds(self._topRows(self._freeSpace(), k))
+
+    def prepareReads(self):
+        # Only the name index is updated in place; the other read caches
+        # are replaced whole, so concurrent readers at worst compute them twice
+        self._ensureNameIndex()
+
+    def _ensureNameIndex(self):
+        for code in range(len(self._nameIndex), len(self._names)):
+            self._nameIndex.add(code, self._names[code])
+
+    def search_by_name(self, query: str, limit: Optional[int] = None) -> List[CD]:
+        self._ensureNameIndex()
+        codes = self._nameIndex.search(query)
+        if not codes:
+            return []
+        # Rank of each matching name code; rows take their name's rank
+        ranks = np.full(len(self._names), len(codes), dtype=np.int64)
+        ranks[codes] = np.arange(len(codes))
+        scanned(self._n)
+        row_ranks = ranks[self._col("name")]
+        rows = np.flatnonzero(self._liveMask() & (row_ranks < len(codes)))
+        order = np.lexsort((self._col("id")[rows], row_ranks[rows]))
+        return self._cds(rows[order[:limit]])
+
+    def getOpenSessions(self) -> List[CD]:
+        scanned(self._n)
+        is_open = self._typeIsOpen[self._col("session_type")]
+        return self._cds(np.flatnonzero(self._liveMask() & is_open))
+
+    def _topRows(self, values: np.ndarray, k: int) -> np.ndarray:
+        """Live rows with the k largest values, largest first (ties: higher ID first)."""
+        scanned(self._n)
+        rows = np.flatnonzero(self._liveMask())
+        if k <= 0 or len(rows) == 0:
+            return rows[:0]
+        live_values = values[rows]
+        if k < len(rows):
+            # argpartition finds the k largest in O(n); only those get sorted.
+            # Include every row tied with the k-th value so ties resolve by ID.
+            kth = live_values[np.argpartition(-live_values, k - 1)[k - 1]]
+            candidates = np.flatnonzero(live_values >= kth)
+            rows, live_values = rows[candidates], live_values[candidates]
+        order = np.lexsort((-self._col("id")[rows], -live_values))
+        return rows[order[:k]]
+
+    def getSummary(self, top_k: int = 5) -> Dict:
+        """Vectorized totals, reused until the library changes."""
+        if self._summary is not None and self._summary[:2] == (self._version, top_k):
+            return self._summary[2]
+        scanned(self._n)
+        live = self._liveMask()
+        type_counts = np.bincount(self._col("session_type")[live], minlength=len(self._types))
+        occupied = self._col("occupied_space")
+        summary = {
+            "total_cds": len(self),
+            "total_size": float(self._col("size")[live].sum()),
+            "total_occupied": float(occupied[live].sum()),
+            "session_types": {self._types[code]: int(count) for code, count in enumerate(type_counts) if count},
+            "top_occupied": self._cds(self._topRows(occupied, top_k)),
+        }
+        self._summary = (self._version, top_k, summary)
+        return summary
+
+    def loadData(self, filepath: str, chunk_size: int = 100000) -> bool:
+        """
+        Parses filepath into a fresh repository and takes over its columns
+        only once the whole file has loaded, so a failed load leaves the
+        library as it was. Sharded libraries are not supported.
+        """
+        if not os.path.exists(filepath):
+            return True
+        loaded = ColumnarCDRepository()
+        try:
+            reject_manifest(filepath)
+            reject_pending_journal(filepath)
+            reader = open_library(filepath)
+            try:
+                loaded._fill(reader, chunk_size)
+            finally:
+                reader.close()
+        except (IOError, ValueError, TypeError, KeyError) as e:
+            logger.error("Failed to load data from %s: %s", filepath, e)
+            return False
+        version = self._version
+        vars(self).update(vars(loaded))
+        self._version = version + 1
+        return True
+
+    def _fill(self, reader, chunk_size: int):
+        """Fills the empty columns from a library reader, a chunk at a time, then sorts once by ID."""
+        cols = self._cols
+        for chunk in reader.chunks(chunk_size):
+            start, count = self._n, len(chunk)
+            self._reserve(count)
+            cols = self._cols
+            for field in ("id", "size", "encryption_speed", "occupied_space", "session_count"):
+                cols[field][start:start + count] = [cd_data[field] for cd_data in chunk]
+            cols["name"][start:start + count] = [self._nameCode(cd_data["name"]) for cd_data in chunk]
+            cols["session_type"][start:start + count] = [self._typeCode(cd_data["session_type"]) for cd_data in chunk]
+            cols["alive"][start:start + count] = True
+            self._n += count
+
+        count = self._n
+        order = np.argsort(cols["id"][:count], kind="stable")
+        for name, col in cols.items():
+            col[:count] = col[:count][order]
+        # Drop duplicate IDs, keeping the first occurrence
+        ids = cols["id"][:count]
+        duplicate = np.zeros(count, dtype=np.bool_)
+        duplicate[1:] = ids[1:] == ids[:-1]
+        if duplicate.any():
+            cols["alive"][:count] &= ~duplicate
+            self._dead = int(duplicate.sum())
+            self._compact()
+
+        self._nextId = reader.next_id if reader.next_id is not None else len(self) + 1
+
+    def captureSave(self, filepath: str) -> Optional[Callable[[], Tuple[bool, Optional[Callable[[], None]]]]]:
+        """Copies the live rows into a private repository (array copies, no CDs built) and saves that."""
+        live = self._liveMask()
+        capture = ColumnarCDRepository(capacity=0)
+        capture._cols = {name: self._col(name)[live] for name in COLUMNS}
+        capture._n = len(capture._cols["id"])
+        capture._nextId = self._nextId
+        capture._names = list(self._names)
+        capture._types = list(self._types)
+        capture._typeIsOpen = self._typeIsOpen.copy()
+        return lambda: (capture.uploadData(filepath), None)
+
+    def uploadData(self, filepath: str) -> bool:
+        try:
+            reject_manifest(filepath)
+            if filepath.lower().endswith(".cdb"):
+                write_snapshot(filepath, self.getAll(), self._nextId)
+                return True
+            # Build each CD only while it is being written
+            records = (self._cd(int(row)).to_dict() for row in np.flatnonzero(self._liveMask()))
+            write = write_json_lines if is_json_lines(filepath) else write_json
+            with open(filepath, 'w') as f:
+                write(f, records, self._nextId)
+            return True
+        except (IOError, ValueError) as e:
+            logger.error("Failed to save data to %s: %s", filepath, e)
+            return False
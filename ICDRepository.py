@@ -1,10 +1,27 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import heapq
 import json
+import logging
 import os
-import streamlit as st
 
 from CD import CD
+from CDFilter import Condition, chunked, validate
+from CDInstrumentation import scanned
+from CDQuery import CDQuery, execute
+from NameIndex import rank_matches
+
+logger = logging.getLogger(__name__)
+
+# Orderings offered by getSorted: field -> sort key. Size and speed list the
+# largest first, as the Reports page shows them; ties are broken by ID.
+SORT_KEYS = {
+    "id": lambda cd: (cd.id,),
+    "name": lambda cd: (cd.name, cd.id),
+    "size": lambda cd: (-cd.size, cd.id),
+    "encryption_speed": lambda cd: (-cd.encryption_speed, cd.id),
+}
 
 class ICDRepository(ABC):
     @abstractmethod
@@ -13,6 +30,7 @@ class ICDRepository(ABC):
     def delete(self, cd_id: int) -> bool: pass
     @abstractmethod
     def getAll(self) -> List[CD]: pass
+    # CDs with more than min_space MB free, least free first (ties by ID)
     @abstractmethod
     def getFreeSpace(self, min_space: float) -> List[CD]: pass
     @abstractmethod
@@ -20,44 +38,226 @@ class ICDRepository(ABC):
     @abstractmethod
     def get_next_id(self) -> int: pass
     @abstractmethod
+    def find_by_id(self, cd_id: int) -> Optional[CD]: pass
+    @abstractmethod
+    def set_finalized(self, cd_id: int, is_finalized: bool) -> bool: pass
+    @abstractmethod
     def loadData(self, filepath: str) -> bool: pass
     @abstractmethod
     def uploadData(self, filepath: str) -> bool: pass
 
+    def search_by_name(self, query: str, limit: Optional[int] = None) -> List[CD]:
+        """
+        CDs whose name contains query in any case, best match first: exact,
+        prefix, word start, anywhere (see NameIndex.match_rank), then shorter
+        names. This fallback scans getAll().
+        """
+        query = query.lower()
+        if not query:
+            return []
+        cds = {cd.id: cd for cd in self.getAll()}
+        scanned(len(cds))
+        return [cds[cd_id] for cd_id in rank_matches(((cd.id, cd.name.lower()) for cd in cds.values()), query, limit)]
+
+    def count(self) -> int:
+        """Number of CDs in the library."""
+        return len(self.getAll())
+
+    def get_version(self) -> Optional[int]:
+        """
+        A number that grows with every change to the library, so callers can
+        cache query results keyed by it. None (this fallback) means changes
+        are not tracked and results must not be cached.
+        """
+        return None
+
+    def captureSave(self, filepath: str) -> Optional[Callable[[], Tuple[bool, Optional[Callable[[], None]]]]]:
+        """
+        Captures what uploadData(filepath) would write and returns a
+        function writing that capture, which may run on another thread
+        while the library keeps changing. The function returns whether the
+        save succeeded and a finish step (or None) to call afterwards, back
+        under the write lock, for the repository's own bookkeeping. None
+        (this fallback) means there is no cheap capture: call uploadData
+        instead.
+        """
+        return None
+
+    def prepareReads(self):
+        """
+        Finishes any index work deferred to the next read, so that reads
+        made afterwards change nothing and may run concurrently (see
+        SharedRepository). Nothing is deferred in this fallback.
+        """
+
+    def reserve_ids(self, count: int) -> int:
+        """
+        Reserves count consecutive IDs for add_batch and returns the first.
+        This fallback reserves nothing: the fallback add_batch advances the
+        next ID once per CD, which hands out the same range.
+        """
+        return self.get_next_id()
+
+    def add_batch(self, cds: Iterable[CD]) -> List[bool]:
+        """
+        Adds CDs whose IDs came from reserve_ids, returning one success flag
+        per CD. This fallback calls add() for each; repositories override it
+        to update their indexes once per batch.
+        """
+        return [self.add(cd) for cd in cds]
+
+    def set_finalized_batch(self, changes: Dict[int, bool]) -> Dict[int, bool]:
+        """Applies set_finalized for each cd_id -> is_finalized pair; returns cd_id -> success."""
+        return {cd_id: self.set_finalized(cd_id, is_finalized) for cd_id, is_finalized in changes.items()}
+
+    def getSorted(self, field: str, limit: Optional[int] = None, offset: int = 0) -> List[CD]:
+        """Returns CDs ordered by one of SORT_KEYS, optionally paged.
+
+        This fallback sorts getAll(); repositories with indexes override it.
+        """
+        cds = self.getAll()
+        scanned(len(cds))
+        ordered = sorted(cds, key=SORT_KEYS[field])
+        stop = None if limit is None else offset + limit
+        return ordered[offset:stop]
+
+    def getFreeSpaceBetween(self, min_space: float, max_space: float) -> List[CD]:
+        """
+        Returns CDs with min_space < free space <= max_space, least free
+        first: like getFreeSpace, the lower bound is exclusive.
+        """
+        cds = self.getAll()
+        scanned(len(cds))
+        matches = [cd for cd in cds if min_space < cd.getFreeSpace <= max_space]
+        return sorted(matches, key=lambda cd: (cd.getFreeSpace, cd.id))
+
+    def getMostFreeSpace(self, k: int) -> List[CD]:
+        """Returns the k CDs with the most free space, most free first."""
+        cds = self.getAll()
+        scanned(len(cds))
+        return sorted(cds, key=lambda cd: (-cd.getFreeSpace, -cd.id))[:k]
+
+    def set_occupied_space(self, cd_id: int, occupied_space: float) -> bool:
+        cd = self.find_by_id(cd_id)
+        if cd is None or not 0 <= occupied_space <= cd.size:
+            return False
+        cd.set_occupied_space(occupied_space)
+        return True
+
+    def iterLoad(self, filepath: str, chunk_size: int = 10000) -> Iterator[Tuple[int, int, int]]:
+        """
+        Loads filepath, yielding (cds_loaded, bytes_read, total_bytes) as it
+        goes. This fallback loads in one step; streaming repositories yield
+        once per chunk. Raises IOError if the file cannot be loaded.
+        """
+        if not self.loadData(filepath):
+            raise IOError(f"Failed to load {filepath}")
+        size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+        yield self.getSummary(0)["total_cds"], size, size
+
+    def iterChunks(self, chunk_size: int = 10000, where: Sequence[Condition] = (),
+                   fields: Optional[Sequence[str]] = None) -> Iterator[list]:
+        """
+        Streams the CDs matching where (see CDFilter) in chunks of at most
+        chunk_size, as CDs or, with fields, as dicts of just those fields.
+        Only one chunk is held at a time. This fallback filters getAll() in
+        Python; backends push where and fields down to their storage.
+
+        Raises RuntimeError if the library changes between chunks, since
+        the rest of the iteration could then skip or repeat CDs.
+        """
+        validate(where, fields)
+        version = self.get_version()
+        cds = self.getAll()
+        scanned(len(cds))
+        for chunk in chunked(cds, chunk_size, where, fields):
+            yield chunk
+            if version is not None and self.get_version() != version:
+                raise RuntimeError("Library changed during iteration")
+
+    def planQuery(self, query: CDQuery) -> Tuple[str, Callable[[], list]]:
+        """
+        Chooses how to run query: returns a short description of the access
+        path and a function that runs it. This fallback scans iterChunks once
+        (so the filter is pushed down), keeping only the best offset + limit
+        CDs while ordering.
+        """
+        def scan():
+            cds = (cd for chunk in self.iterChunks(where=query.conditions) for cd in chunk)
+            return execute(query, cds, where=())
+        return "scan", scan
+
+    def runQuery(self, query: CDQuery) -> list:
+        """Results of query (see CDQuery): CDs, or dicts when it selects fields."""
+        return self.planQuery(query)[1]()
+
+    def getSummary(self, top_k: int = 5) -> Dict:
+        """
+        Dashboard figures: total_cds, total_size, total_occupied,
+        session_types (type -> count) and top_occupied (the top_k fullest CDs).
+        """
+        cds = self.getAll()
+        scanned(len(cds))
+        return {
+            "total_cds": len(cds),
+            "total_size": sum(cd.size for cd in cds),
+            "total_occupied": sum(cd.occupied_space for cd in cds),
+            "session_types": dict(Counter(cd.session_type for cd in cds)),
+            "top_occupied": heapq.nlargest(top_k, cds, key=lambda cd: (cd.occupied_space, cd.id)),
+        }
+
 class CDRepository(ICDRepository):
     def __init__(self):
-        self._cdList: List[CD] = []
+        # id -> CD in insertion order; _cdList is its list for getAll,
+        # dropped by delete and built again on the next read
+        self._byId: Dict[int, CD] = {}
+        self._cdList: Optional[List[CD]] = []
         self._nextId: int = 1
 
     def get_next_id(self) -> int:
         return self._nextId
 
     def add(self, cd: CD) -> bool:
-        self._cdList.append(cd)
+        if cd.id in self._byId:
+            return False
+        self._byId[cd.id] = cd
+        if self._cdList is not None:
+            self._cdList.append(cd)
         self._nextId += 1
         return True
 
     def delete(self, cd_id: int) -> bool:
-        cd_to_delete = self.deleteCD(cd_id)
-        if cd_to_delete:
-            self._cdList.remove(cd_to_delete)
-            return True
-        return False
+        if self._byId.pop(cd_id, None) is None:
+            return False
+        self._cdList = None
+        return True
 
     def deleteCD(self, cd_id: int) -> Optional[CD]:
-        for cd in self._cdList:
-            if cd.id == cd_id:
-                return cd
-        return None
+        return self._byId.get(cd_id)
+
+    def find_by_id(self, cd_id: int) -> Optional[CD]:
+        return self._byId.get(cd_id)
+
+    def set_finalized(self, cd_id: int, is_finalized: bool) -> bool:
+        cd = self._byId.get(cd_id)
+        if cd is None:
+            return False
+        cd.set_finalized(is_finalized)
+        return True
 
     def getAll(self) -> List[CD]:
+        if self._cdList is None:
+            self._cdList = list(self._byId.values())
         return self._cdList
 
     def getFreeSpace(self, min_space: float) -> List[CD]:
-        return [cd for cd in self._cdList if cd.getFreeSpace > min_space]
+        scanned(len(self._byId))
+        matches = [cd for cd in self._byId.values() if cd.getFreeSpace > min_space]
+        return sorted(matches, key=lambda cd: (cd.getFreeSpace, cd.id))
 
     def getOpenSessions(self) -> List[CD]:
-        return [cd for cd in self._cdList if cd.getOpenSession]
+        scanned(len(self._byId))
+        return [cd for cd in self._byId.values() if cd.getOpenSession]
 
     def loadData(self, filepath: str) -> bool:
         if not os.path.exists(filepath):
@@ -65,24 +265,26 @@ class CDRepository(ICDRepository):
         try:
             with open(filepath, 'r') as f:
                 data = json.load(f)
-            self._cdList = []
-            loaded_cds = data.get("cds", [])
-            for cd_data in loaded_cds:
-                self._cdList.append(CD(**cd_data))
+            byId: Dict[int, CD] = {}
+            for cd_data in data.get("cds", []):
+                cd = CD(**cd_data)
+                byId.setdefault(cd.id, cd)  # the first of duplicate IDs wins
+            self._byId = byId
+            self._cdList = list(byId.values())
             
             self._nextId = data.get("nextId", len(self._cdList) + 1)
             return True
         except Exception as e:
-            print(f"Error loading data: {e}")
+            logger.error("Error loading data: %s", e)
             return False
 
     def uploadData(self, filepath: str) -> bool:
         try:
-            data_to_save = [cd.to_dict() for cd in self._cdList]
+            data_to_save = [cd.to_dict() for cd in self._byId.values()]
             payload = {"cds": data_to_save, "nextId": self._nextId}
             with open(filepath, 'w') as f:
                 json.dump(payload, f, indent=4)
             return True
         except Exception as e:
-            print(f"Error saving data: {e}")
+            logger.error("Error saving data: %s", e)
             return False
@@ -1,33 +1,106 @@
+import atexit
+import threading
+import time
 import streamlit as st
-from typing import List, Optional
+from typing import Callable, Dict, Hashable, List, Optional
 import pandas as pd
+from BackgroundSaver import BackgroundSaver
 from CD import CD
-from CDRepository import CDRepository
+from CDConfig import load_config
+from CDQuery import CDQuery
 from CDService import CDService
+from ViewCache import VersionedCache
+
+# Frames kept across reruns, per browser session
+FRAME_CACHE_SIZE = 32
+# Library table: sort choices (label -> getSorted field) and page sizes
+LIBRARY_SORTS = {"ID": "id", "Name": "name", "Size": "size", "Speed": "encryption_speed"}
+PAGE_SIZES = [25, 50, 100, 250]
+# Reports query builder: order choices (label -> (field, descending))
+QUERY_ORDERS = {"Write Speed (fastest)": ("encryption_speed", True), "Free Space (most)": ("free_space", True),
+                "Size (largest)": ("size", True), "Name": ("name", False), "ID": ("id", False)}
+
+@st.cache_resource
+def shared_library() -> Dict:
+    """
+    The library shared by every browser session of this server process:
+    one service over one thread-safe repository (see SharedRepository),
+    loaded by the first session only, and the worker that saves it.
+    """
+    # The backend (memory, columnar or sqlite) and library file come from
+    # CD_BACKEND / CD_LIBRARY; see CDConfig
+    config = dict(load_config(), shared=True)
+    service = CDService.from_config(config)
+    saver = BackgroundSaver(service, config["library"], delay=config["autosave"] or 2.0,
+                            autosave=config["autosave"] > 0)
+    # load_error is set while the library file could not be read: nothing
+    # may then be saved over it until a reload succeeds
+    return {"config": config, "service": service, "saver": saver,
+            "load_lock": threading.Lock(), "loaded": False, "load_error": None}
+
+def load_shared_library(shared: Dict):
+    """Loads the shared library once; sessions arriving meanwhile wait for it."""
+    with shared["load_lock"]:
+        if shared["loaded"]:
+            return
+        library = shared["config"]["library"]
+        service = shared["service"]
+        # Streaming, so big libraries show progress and a preview of the
+        # first rows while the rest is read
+        progress = st.progress(0.0, text="Loading library...")
+        preview = st.empty()
+        previewed = False
+        try:
+            for loaded, bytes_read, total_bytes in service.iter_load(library):
+                fraction = bytes_read / total_bytes if total_bytes else 1.0
+                progress.progress(min(fraction, 1.0), text=f"Loading library... {loaded:,} CDs")
+                if not previewed and loaded and bytes_read < total_bytes:
+                    preview.dataframe(pd.DataFrame([cd.to_dict() for cd in service.get_all_cds()[:20]]), hide_index=True)
+                    previewed = True
+        except (IOError, ValueError, TypeError) as e:
+            # iter_load has put the previous (empty) library back
+            shared["load_error"] = f"Could not load {library}: {e}"
+        progress.empty()
+        preview.empty()
+        if shared["load_error"] is None:
+            start_saving(shared)
+        shared["loaded"] = True
+
+def start_saving(shared: Dict):
+    """Treats the library as saved and lets the background saver write later changes."""
+    shared["load_error"] = None
+    shared["saver"].mark_saved()
+    if shared["saver"].start() and not shared.get("stop_registered"):
+        atexit.register(stop_saving, shared)
+        shared["stop_registered"] = True
+
+def stop_saving(shared: Dict):
+    """When the server stops: writes out the last changes, then closes the repository (folding in its journal)."""
+    shared["saver"].stop()
+    shared["service"].close()
 
 def init_state():
-    """Initialize the Service and Repository in Streamlit Session State"""
+    """Attach this browser session to the shared service"""
     if 'service' not in st.session_state:
-        repo = CDRepository()
-        # Auto-load on startup
-        repo.loadData("cd_library.json")
-        st.session_state.service = CDService(repo)
+        shared = shared_library()
+        load_shared_library(shared)
+        st.session_state.shared = shared
+        st.session_state.library = shared["config"]["library"]
+        st.session_state.service = shared["service"]
+        st.session_state.saver = shared["saver"]
+        st.session_state.instrumented = shared["config"]["instrument"]
+        # Built frames stay per session; they are keyed by the shared version
+        st.session_state.frames = VersionedCache(FRAME_CACHE_SIZE)
 
-def display_interactive_cds(cd_list, key_suffix="default"):
+def cached(query: Hashable, build: Callable):
     """
-    Displays CDs in an editable table with a 'Finalized' toggle.
-    Updates the backend service automatically on change.
-    
-    Args:
-        cd_list: List of CD objects
-        key_suffix: Unique string to prevent duplicate widget ID errors
+    build(), cached until the library changes: keyed by query and the
+    repository version, so unchanged tables are not rebuilt on rerun.
     """
-    if not cd_list:
-        st.info("No CDs found matching criteria.")
-        return
+    return st.session_state.frames.get_or_build(query, st.session_state.service.get_version(), build)
 
-    service = st.session_state.service
 
+def cd_frame(cd_list: List[CD]) -> pd.DataFrame:
     # Prepare data for display
     data = []
     for cd in cd_list:
@@ -35,8 +108,25 @@ def display_interactive_cds(cd_list, key_suffix="default"):
         # Create a logical 'Finalized' field based on 'is_open'
         d['Finalized'] = not d['is_open'] 
         data.append(d)
+    return pd.DataFrame(data)
+
+
+def display_interactive_cds(query: Hashable, fetch: Callable[[], List[CD]], key_suffix="default"):
+    """
+    Displays CDs in an editable table with a 'Finalized' toggle.
+    Updates the backend service automatically on change.
     
-    df = pd.DataFrame(data)
+    Args:
+        query: Hashable description of the list, used as the cache key
+        fetch: Returns the list of CD objects; only called on a cache miss
+        key_suffix: Unique string to prevent duplicate widget ID errors
+    """
+    df = cached(query, lambda: cd_frame(fetch()))
+    if df.empty:
+        st.info("No CDs found matching criteria.")
+        return
+
+    service = st.session_state.service
 
     # Rename columns for friendly display
     # We map 'Finalized' to the editable checkbox
@@ -54,27 +144,72 @@ def display_interactive_cds(cd_list, key_suffix="default"):
 
     # Display the editor
     # We disable editing for all columns EXCEPT 'Finalized'
-    # We use f-string for the key to ensure uniqueness across tabs
+    # We use f-string for the key to ensure uniqueness across tabs; the
+    # generation changes after edits are applied, starting fresh editors
+    editor_key = f"cd_editor_{key_suffix}_{st.session_state.get('editor_generation', 0)}"
+    # The editor reports edits by row position in the frame it was showing,
+    # which is the one rendered by the previous run under this key: another
+    # session may have changed the library (and so df) since
+    rendered = st.session_state.setdefault("rendered_frames", {})
+    shown_df = rendered.get(editor_key)
+    rendered[editor_key] = df
     edited_df = st.data_editor(
         df,
         column_config=column_config,
         disabled=["id", "name", "size", "encryption_speed", "occupied_space", "free_space", "session_count", "session_type"],
         hide_index=True,
         use_container_width=True,
-        key=f"cd_editor_{key_suffix}" # Unique key fix
+        key=editor_key # Unique key fix
     )
 
     # --- Sync Changes Logic ---
-    # We iterate through the edited dataframe to sync changes back to the service
-    # This is a simple sync: it updates the objects based on the checkbox state
-    if not edited_df.empty:
-        for index, row in edited_df.iterrows():
-            cd_id = int(row['id'])
-            is_finalized = bool(row['Finalized'])
-            
-            # Call service to update the actual object
-            service.update_status(cd_id, is_finalized)
+    # Only rows whose checkbox differs from the library are sent, in one call
+    changes = finalized_changes(df, edited_df, st.session_state.get(editor_key), shown_df)
+    if changes:
+        service.update_statuses(changes)
+        # The edits are in the library now, and rows may move between or
+        # within tables, so drop every editor's positional edit state
+        st.session_state.editor_generation = st.session_state.get('editor_generation', 0) + 1
+        rendered.clear()
+        st.rerun()
+
+
+def finalized_changes(df: pd.DataFrame, edited_df: pd.DataFrame, editor_state: Optional[dict],
+                      shown_df: Optional[pd.DataFrame] = None) -> Dict[int, bool]:
+    """
+    cd_id -> Finalized for the rows the user toggled. The editor state lists
+    edited rows by position in shown_df, the frame the editor was showing
+    (df if None), so only those rows are checked; without it the two
+    frames are compared column-wise.
+    """
+    if isinstance(editor_state, dict) and "edited_rows" in editor_state:
+        if shown_df is not None:
+            df = shown_df
+        changes = {}
+        for position, edits in editor_state["edited_rows"].items():
+            position = int(position)
+            if "Finalized" in edits and position < len(df) and \
+                    bool(edits["Finalized"]) != bool(df["Finalized"].iat[position]):
+                changes[int(df["id"].iat[position])] = bool(edits["Finalized"])
+        return changes
+    if edited_df.empty:
+        return {}
+    changed = edited_df["Finalized"].to_numpy() != df["Finalized"].to_numpy()
+    return dict(zip(edited_df["id"].to_numpy()[changed].tolist(), edited_df["Finalized"].to_numpy()[changed].tolist()))
+
 
+def save_status_text(status: Dict) -> str:
+    """One line for the sidebar from BackgroundSaver.status()."""
+    if status["state"] == "saving":
+        return "💾 Saving..."
+    if status["state"] == "failed":
+        return f"⚠️ Save failed: {status['last_error']}"
+    if status["state"] == "pending":
+        return "✏️ Unsaved changes (saving shortly)" if st.session_state.saver.autosave else "✏️ Unsaved changes"
+    if status["last_saved"] is None:
+        return "💾 No changes since loading"
+    ago = time.time() - status["last_saved"]
+    return f"💾 Saved {ago:.0f} s ago in {status['last_seconds'] * 1000:.0f} ms"
 
 def main():
     st.set_page_config(page_title="My CD Library", page_icon="💿", layout="wide")
@@ -84,32 +219,48 @@ def main():
     # --- Sidebar Navigation ---
     st.sidebar.title("💿 CD Manager")
     page = st.sidebar.radio("Navigate", ["Library", "Add CD", "Reports", "Settings"])
+    load_error = st.session_state.shared["load_error"]
+    if load_error:
+        st.sidebar.error(f"{load_error}. Saving is off until the library is reloaded (Settings).")
+    else:
+        st.sidebar.caption(save_status_text(st.session_state.saver.status()))
 
     # --- Page: Library (Home) ---
     if page == "Library":
         st.title("My CD Collection")
         
         # Search Bar
-        col1, col2 = st.columns([3, 1])
+        col1, col2, col3 = st.columns([3, 1, 1])
         with col1:
-            search_query = st.text_input("Search by ID or Name", placeholder="Enter ID (e.g., 1) or Name...")
-        
-        # Logic to decide what to show
+            search_query = st.text_input("Search by ID or Name", placeholder="Enter ID (e.g., 1) or Name...").strip()
+        with col2:
+            sort_label = st.selectbox("Sort by", list(LIBRARY_SORTS))
+        with col3:
+            page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+        sort = LIBRARY_SORTS[sort_label]
+
+        # Only the visible page is fetched and sent to the browser
+        total = cached(("library_count", search_query), lambda: service.count_cds(search_query or None))
+        pages = max(1, -(-total // page_size))
+        # Clamp before the page widget is created (the library may have shrunk)
+        if st.session_state.get("library_page", 1) > pages:
+            st.session_state.library_page = pages
+        page_number = st.session_state.get("library_page", 1)
+        offset = (page_number - 1) * page_size
+
         if search_query:
-            if search_query.isdigit():
-                # Search by ID
-                result = service.find_by_id(int(search_query))
-                results = [result] if result else []
-            else:
-                # Search by Name (simple contains)
-                results = [cd for cd in service.get_all_cds() if search_query.lower() in cd.name.lower()]
-            
-            st.subheader(f"Search Results ({len(results)})")
-            display_interactive_cds(results, key_suffix="search")
+            st.subheader(f"Search Results ({total})")
         else:
-            # Show All
-            st.subheader("All Discs")
-            display_interactive_cds(service.get_all_cds(), key_suffix="library")
+            st.subheader(f"All Discs ({total})")
+        query = ("library_page", search_query, sort, offset, page_size)
+        display_interactive_cds(query, lambda: service.get_page(sort, offset, page_size, search_query or None),
+                                key_suffix="library")
+
+        col1, col2 = st.columns([1, 4])
+        with col1:
+            st.number_input("Page", min_value=1, max_value=pages, step=1, key="library_page")
+        with col2:
+            st.caption(f"Page {page_number} of {pages}")
 
         # Quick Delete Action
         st.divider()
@@ -155,15 +306,15 @@ def main():
     elif page == "Reports":
         st.title("📊 Dashboard")
         
-        all_cds = service.get_all_cds()
+        summary = cached(("summary", 5), lambda: service.get_summary(top_k=5))
         
-        if not all_cds:
+        if not summary["total_cds"]:
             st.info("No data available for dashboard.")
         else:
             # --- KPIs ---
-            total_cds = len(all_cds)
-            total_storage_mb = sum(cd.size for cd in all_cds)
-            total_occupied_mb = sum(cd.occupied_space for cd in all_cds)
+            total_cds = summary["total_cds"]
+            total_storage_mb = summary["total_size"]
+            total_occupied_mb = summary["total_occupied"]
             efficiency_pct = (total_occupied_mb / total_storage_mb * 100) if total_storage_mb > 0 else 0
             
             col1, col2, col3 = st.columns(3)
@@ -178,30 +329,25 @@ def main():
             
             with col_chart1:
                 st.subheader("💾 Space Utilization")
-                # Create a DataFrame for the chart
-                chart_data = pd.DataFrame([
-                    {"Name": cd.name, "Occupied": cd.occupied_space, "Free": cd.getFreeSpace}
-                    for cd in all_cds
-                ])
-                # We want a stacked bar chart-like view? 
-                # Let's simple show Top 5 Fullest CDs
-                top_5_full = sorted(all_cds, key=lambda x: x.occupied_space, reverse=True)[:5]
-                top_5_data = pd.DataFrame([
+                # Top 5 Fullest CDs
+                top_5_data = cached(("top_occupied_chart", 5), lambda: pd.DataFrame([
                     {"CD Name": cd.name, "Occupied (MB)": cd.occupied_space} 
-                    for cd in top_5_full
-                ])
-                st.bar_chart(top_5_data.set_index("CD Name"))
+                    for cd in summary["top_occupied"]
+                ]).set_index("CD Name"))
+                st.bar_chart(top_5_data)
                 st.caption("Top 5 CDs by Usage")
 
             with col_chart2:
                 st.subheader("💿 Session Types")
                 # Fix: Explicitly format data for bar_chart to avoid Index errors
-                types = [cd.session_type for cd in all_cds]
-                if types:
+                type_counts = summary["session_types"]
+                if type_counts:
                     # Create a simple DataFrame mapping Type -> Count
-                    counts = pd.Series(types).value_counts().reset_index()
-                    counts.columns = ["Type", "Count"]
-                    st.bar_chart(counts.set_index("Type"))
+                    counts = cached(("session_types_chart",), lambda: pd.DataFrame(
+                        sorted(type_counts.items(), key=lambda item: item[1], reverse=True),
+                        columns=["Type", "Count"],
+                    ).set_index("Type"))
+                    st.bar_chart(counts)
                 else:
                     st.text("No data")
                 st.caption("Distribution of Session Types")
@@ -211,49 +357,82 @@ def main():
             # --- Detailed Views (Existing Tabs) ---
             st.expander("Detailed Reports", expanded=False).write("Expand to see detailed lists.")
             
-            tab1, tab2, tab3, tab4, tab5 = st.tabs(["Sort Name", "Sort Size", "Sort Speed", "Free Space", "Open Sessions"])
+            tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Sort Name", "Sort Size", "Sort Speed", "Free Space",
+                                                          "Open Sessions", "Query"])
             
             with tab1:
                 st.caption("Sorted Alphabetically")
-                display_interactive_cds(service.sortByName(), key_suffix="sort_name")
+                display_interactive_cds(("sort_name",), service.sortByName, key_suffix="sort_name")
                 
             with tab2:
                 st.caption("Sorted by Total Size (Descending)")
-                display_interactive_cds(service.sortBySize(), key_suffix="sort_size")
+                display_interactive_cds(("sort_size",), service.sortBySize, key_suffix="sort_size")
                 
             with tab3:
                 st.caption("Sorted by Write Speed (Descending)")
-                display_interactive_cds(service.sortBySpeed(), key_suffix="sort_speed")
+                display_interactive_cds(("sort_speed",), service.sortBySpeed, key_suffix="sort_speed")
                 
             with tab4:
                 st.caption("Filter by available storage")
                 min_mb = st.slider("Minimum Free Space (MB)", 0, 1000, 100)
-                display_interactive_cds(service.filterByFreeSpace(min_mb), key_suffix="filter_space")
+                display_interactive_cds(("filter_space", min_mb), lambda: service.filterByFreeSpace(min_mb),
+                                        key_suffix="filter_space")
                 
             with tab5:
                 st.caption("Discs that are not finalized")
-                display_interactive_cds(service.get_open_sessions(), key_suffix="open_sessions")
+                display_interactive_cds(("open_sessions",), service.get_open_sessions, key_suffix="open_sessions")
+
+            with tab6:
+                st.caption("Combine filters, ordering and a limit; runs as one query")
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    open_only = st.checkbox("Open sessions only", value=True)
+                with col2:
+                    query_min_mb = st.number_input("Free Space above (MB)", min_value=0, value=200, step=50)
+                with col3:
+                    order_label = st.selectbox("Order by", list(QUERY_ORDERS))
+                with col4:
+                    query_limit = st.selectbox("Show", PAGE_SIZES, index=1)
+                order_field, descending = QUERY_ORDERS[order_label]
+                query = CDQuery().where("free_space", ">", query_min_mb) \
+                                 .order_by(order_field, descending).limit(query_limit)
+                if open_only:
+                    query = query.where("is_open", "==", True)
+                display_interactive_cds(("query", query), lambda: service.query(query), key_suffix="query")
+                st.caption(f"Access path: {service.explain(query)}")
 
     # --- Page: Settings (Save/Load) ---
     elif page == "Settings":
         st.title("Settings")
-        st.write("Data is saved to `cd_library.json`.")
+        library = st.session_state.library
+        st.write(f"Data is saved to `{library}`.")
         
         col1, col2 = st.columns(2)
         with col1:
-            if st.button("💾 Save to File", use_container_width=True):
-                if service.save("cd_library.json"):
-                    st.success("Library saved successfully!")
-                else:
-                    st.error("Could not save file.")
+            # Saving an unloaded library would overwrite the file with it
+            if st.button("💾 Save to File", use_container_width=True, disabled=load_error is not None):
+                # Written by the background saver; the sidebar shows when it is done
+                st.session_state.saver.save_now()
+                st.info("Saving in the background...")
                     
         with col2:
             if st.button("📂 Reload from File", use_container_width=True):
-                if service.load("cd_library.json"):
+                if service.load(library):
+                    start_saving(st.session_state.shared)
                     st.success("Library reloaded!")
                     st.rerun() # Refresh app
                 else:
                     st.error("Could not load file.")
 
+        if st.session_state.instrumented:
+            from CDInstrumentation import METRICS
+            st.subheader("Call Metrics")
+            stats = METRICS.snapshot()
+            if stats:
+                st.dataframe(pd.DataFrame.from_dict(stats, orient="index"), use_container_width=True)
+            if st.button("Export to CSV"):
+                METRICS.export_csv("instrumentation_report.csv")
+                st.success("Metrics written to instrumentation_report.csv")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,277 @@
+import bz2
+import codecs
+import gzip
+import io
+import json
+import lzma
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from CDSnapshot import SnapshotReader, is_snapshot, snapshot_path_for
+
+JSON_LINES_EXTENSIONS = (".jsonl", ".ndjson")
+_DECODER = json.JSONDecoder()
+
+# Compression for JSON and JSON Lines libraries. Readers recognise a codec
+# by the file's leading bytes, so the file name does not have to say.
+CODECS = ("none", "gzip", "bz2", "lzma")
+CODEC_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma"}
+_MAGIC = ((b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "lzma"))
+# gzip's default level 9 is several times slower than 6 for a few percent
+_GZIP_LEVEL = 6
+
+def is_json_lines(filepath: str) -> bool:
+    name = filepath.lower()
+    base, extension = os.path.splitext(name)
+    if extension in CODEC_EXTENSIONS:
+        name = base  # cd_library.jsonl.gz
+    return name.endswith(JSON_LINES_EXTENSIONS)
+
+def detect_codec(filepath: str) -> str:
+    with open(filepath, 'rb') as f:
+        head = f.read(6)
+    for magic, codec in _MAGIC:
+        if head.startswith(magic):
+            return codec
+    return "none"
+
+def codec_for_path(filepath: str, codec: Optional[str] = None) -> str:
+    """The codec to write filepath with: codec if given, else the one its extension names, else none."""
+    if codec is None:
+        return CODEC_EXTENSIONS.get(os.path.splitext(filepath)[1].lower(), "none")
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec '{codec}', expected one of {', '.join(CODECS)}")
+    return codec
+
+def _compressed(raw, codec: str, mode: str):
+    """Wraps the binary file raw so data passing through is (de)compressed; closing the wrapper leaves raw open."""
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode=mode, compresslevel=_GZIP_LEVEL)
+    if codec == "bz2":
+        return bz2.BZ2File(raw, mode)
+    if codec == "lzma":
+        return lzma.LZMAFile(raw, mode)
+    return raw
+
+@contextmanager
+def open_text_writer(filepath: str, codec: str = "none") -> Iterator[io.TextIOWrapper]:
+    """
+    Opens filepath for writing text through codec. Data is compressed as it
+    is written, and the file is fsynced when the block ends.
+    """
+    with open(filepath, 'wb') as raw:
+        stream = _compressed(raw, codec, 'wb')
+        text = io.TextIOWrapper(stream, encoding='utf-8')
+        try:
+            yield text
+            text.flush()
+        finally:
+            text.detach()
+        if stream is not raw:
+            stream.close()  # writes the codec's trailer
+        raw.flush()
+        os.fsync(raw.fileno())
+
+def open_library(filepath: str) -> Union["LibraryReader", "SnapshotReader"]:
+    """
+    Opens a reader for filepath, detecting the format. A binary snapshot
+    written next to a JSON library (cd_library.json -> cd_library.cdb) is
+    used instead when it is at least as new as the JSON file.
+    """
+    if is_snapshot(filepath):
+        return SnapshotReader(filepath)
+    sidecar = snapshot_path_for(filepath)
+    if sidecar != filepath and is_snapshot(sidecar) and \
+            os.path.getmtime(sidecar) >= os.path.getmtime(filepath):
+        return SnapshotReader(sidecar)
+    return LibraryReader(filepath)
+
+class LibraryReader:
+    """
+    Streams CD records (plain dicts) out of a library file without loading
+    the whole document.
+
+    Two layouts are understood:
+      * JSON: {"cds": [{...}, ...], "nextId": N}, the format uploadData writes.
+        The "cds" array is decoded one element at a time from a small buffer.
+      * JSON Lines (.jsonl / .ndjson): one CD object per line. A line holding
+        only {"nextId": N} carries the next ID.
+
+    Either may be compressed with one of CODECS; it is decompressed as it
+    is read.
+
+    next_id is filled in once the reader reaches it (for JSON it follows the
+    array). bytes_read / total_bytes can be used to report progress; both
+    count bytes of the file, compressed or not.
+    """
+
+    def __init__(self, filepath: str, read_size: int = 1 << 16):
+        self.filepath = filepath
+        self.read_size = read_size
+        self.total_bytes = os.path.getsize(filepath)
+        self.bytes_read = 0
+        self.next_id: Optional[int] = None
+        self.codec = detect_codec(filepath)
+
+    def __iter__(self) -> Iterator[Dict]:
+        if is_json_lines(self.filepath):
+            return self._iterJsonLines()
+        return self._iterJson()
+
+    def close(self):
+        pass  # files are only open while iterating
+
+    @contextmanager
+    def _open(self) -> Iterator[Tuple[io.BufferedReader, io.BufferedIOBase]]:
+        """The raw file (for progress) and the stream of decompressed bytes."""
+        with open(self.filepath, 'rb') as raw:
+            stream = _compressed(raw, self.codec, 'rb')
+            try:
+                yield raw, stream
+            except (EOFError, lzma.LZMAError) as e:
+                # Cut short or damaged; the callers' error for a bad library
+                raise ValueError(f"Corrupt {self.codec} data in {self.filepath}: {e}") from e
+            finally:
+                if stream is not raw:
+                    stream.close()
+
+    def chunks(self, size: int) -> Iterator[List[Dict]]:
+        """Groups the records into lists of at most size records."""
+        chunk: List[Dict] = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    # --- JSON Lines ---
+    def _iterJsonLines(self) -> Iterator[Dict]:
+        with self._open() as (raw, f):
+            for line in f:
+                self.bytes_read = raw.tell()
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if "id" not in record and "nextId" in record:
+                    self.next_id = record["nextId"]
+                    continue
+                yield record
+
+    # --- JSON ---
+    def _iterJson(self) -> Iterator[Dict]:
+        with self._open() as (raw, f):
+            self._raw = raw
+            self._file = f
+            self._decoder = codecs.getincrementaldecoder("utf-8")()
+            self._buf = ""
+            self._pos = 0
+            self._eof = False
+            try:
+                self._expect("{")
+                if self._peek() == "}":
+                    return
+                while True:
+                    key = self._value()
+                    self._expect(":")
+                    if key == "cds":
+                        yield from self._iterArray()
+                    else:
+                        value = self._value()
+                        if key == "nextId":
+                            self.next_id = value
+                    if not self._more("}"):
+                        return
+            finally:
+                self._file = self._raw = None
+
+    def _iterArray(self) -> Iterator[Dict]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            if not self._more("]"):
+                return
+
+    def _fill(self) -> bool:
+        """Reads another block into the buffer; False once the file is exhausted."""
+        if self._eof:
+            return False
+        data = self._file.read(self.read_size)
+        self.bytes_read = self._raw.tell()
+        if self._pos > len(self._buf) // 2:
+            # Drop what has been consumed so the buffer stays small
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf += self._decoder.decode(data, final=not data)
+        self._eof = not data
+        return True
+
+    def _peek(self) -> str:
+        """Skips whitespace and returns the next character without consuming it."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError(f"Unexpected end of {self.filepath}")
+
+    def _next(self) -> str:
+        char = self._peek()
+        self._pos += 1
+        return char
+
+    def _expect(self, char: str):
+        found = self._next()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}' in {self.filepath}")
+
+    def _more(self, close: str) -> bool:
+        """Consumes ',' (another item follows) or the closing bracket."""
+        char = self._next()
+        if char == close:
+            return False
+        if char != ",":
+            raise ValueError(f"Expected ',' or '{close}' but found '{char}' in {self.filepath}")
+        return True
+
+    def _value(self):
+        """Decodes one JSON value, reading more input until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buf, self._pos)
+                # A value touching the end of the buffer may be cut short (e.g. a number)
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+def write_json(f, records: Iterable[Dict], next_id: int):
+    """
+    Writes a JSON library one record at a time. The output is identical to
+    json.dump({"cds": [...], "nextId": next_id}, f, indent=4).
+    """
+    f.write('{\n    "cds": [')
+    first = True
+    for record in records:
+        body = json.dumps(record, indent=4).replace("\n", "\n        ")
+        f.write(("\n        " if first else ",\n        ") + body)
+        first = False
+    f.write('],\n' if first else '\n    ],\n')
+    f.write(f'    "nextId": {json.dumps(next_id)}\n}}')
+
+def write_json_lines(f, records: Iterable[Dict], next_id: int):
+    """Writes a JSON Lines library: the nextId line, then one CD per line."""
+    f.write(json.dumps({"nextId": next_id}) + "\n")
+    for record in records:
+        f.write(json.dumps(record) + "\n")
@@ -0,0 +1,111 @@
+import heapq
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+N = 3
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + N] for i in range(len(text) - N + 1)}
+
+def match_rank(name: str, query: str) -> Optional[int]:
+    """
+    How well a lower-cased name matches a lower-cased query: 0 exact,
+    1 prefix, 2 start of a later word, 3 anywhere else; None for no match.
+    """
+    pos = name.find(query)
+    if pos < 0:
+        return None
+    if pos == 0:
+        return 0 if len(name) == len(query) else 1
+    if " " + query in name:
+        return 2
+    return 3
+
+def rank_matches(candidates: Iterable[Tuple[int, str]], query: str, limit: Optional[int] = None) -> List[int]:
+    """Keys of the (key, lower-cased name) candidates containing query, best match first."""
+    ranked = []
+    for key, name in candidates:
+        rank = match_rank(name, query)
+        if rank is not None:
+            ranked.append((rank, len(name), key))
+    if limit is None:
+        ranked.sort()
+    else:
+        ranked = heapq.nsmallest(limit, ranked)
+    return [key for _, _, key in ranked]
+
+class NameIndex:
+    """
+    Inverted trigram index over names for substring and prefix search.
+
+    Each name is lower-cased once and split into its three-character
+    substrings; every trigram maps to the keys (CD IDs, or name codes) whose
+    name contains it. A query of three or more characters intersects the
+    posting lists of its trigrams, smallest first, and only the surviving
+    candidates are checked and ranked. Shorter queries scan the stored
+    lower-cased names.
+    """
+
+    def __init__(self, items: Iterable[Tuple[int, str]] = ()):
+        self._postings: Dict[str, Set[int]] = {}
+        self._names: Dict[int, str] = {}
+        self.rebuild(items)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def rebuild(self, items: Iterable[Tuple[int, str]]):
+        postings: Dict[str, Set[int]] = defaultdict(set)
+        names: Dict[int, str] = {}
+        for key, name in items:
+            name = names[key] = name.lower()
+            for i in range(len(name) - N + 1):
+                postings[name[i:i + N]].add(key)
+        self._postings = dict(postings)
+        self._names = names
+
+    def add(self, key: int, name: str):
+        if key in self._names:
+            self.remove(key)
+        name = name.lower()
+        self._names[key] = name
+        for gram in trigrams(name):
+            postings = self._postings.get(gram)
+            if postings is None:
+                self._postings[gram] = {key}
+            else:
+                postings.add(key)
+
+    def remove(self, key: int) -> bool:
+        name = self._names.pop(key, None)
+        if name is None:
+            return False
+        for gram in trigrams(name):
+            postings = self._postings[gram]
+            postings.discard(key)
+            if not postings:
+                del self._postings[gram]
+        return True
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[int]:
+        """Keys whose name contains query (any case), ranked by match_rank, then shorter names, then key."""
+        query = query.lower()
+        if not query:
+            return []
+        if len(query) < N:
+            return rank_matches(self._names.items(), query, limit)
+
+        postings = []
+        for gram in trigrams(query):
+            keys = self._postings.get(gram)
+            if not keys:
+                return []
+            postings.append(keys)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for keys in postings[1:]:
+            candidates &= keys
+            if not candidates:
+                return []
+        # Trigrams can all occur without the whole query occurring; check each candidate
+        return rank_matches(((key, self._names[key]) for key in candidates), query, limit)
@@ -0,0 +1,481 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import logging
+import os
+import sqlite3
+import threading
+
+from CD import CD
+from CDFilter import Condition, validate
+from CDJournal import reject_pending_journal
+from CDQuery import CDQuery
+from ICDRepository import ICDRepository
+from CDSnapshot import write_snapshot
+from LibraryStream import is_json_lines, open_library, write_json, write_json_lines
+from ShardedLibrary import reject_manifest
+
+logger = logging.getLogger(__name__)
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+# Seconds a connection waits for another's write transaction (e.g. an
+# import in iterLoad) before failing with "database is locked"
+BUSY_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cds (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    size REAL NOT NULL,
+    encryption_speed INTEGER NOT NULL,
+    occupied_space REAL NOT NULL,
+    session_count INTEGER NOT NULL,
+    session_type TEXT NOT NULL,
+    free_space REAL GENERATED ALWAYS AS (size - occupied_space) VIRTUAL,
+    is_open INTEGER GENERATED ALWAYS AS (lower(session_type) <> 'finalized') VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS idx_cds_name ON cds(name, id);
+CREATE INDEX IF NOT EXISTS idx_cds_size ON cds(size DESC, id);
+CREATE INDEX IF NOT EXISTS idx_cds_speed ON cds(encryption_speed DESC, id);
+CREATE INDEX IF NOT EXISTS idx_cds_free_space ON cds(free_space, id);
+CREATE INDEX IF NOT EXISTS idx_cds_occupied ON cds(occupied_space, id);
+CREATE INDEX IF NOT EXISTS idx_cds_session_type ON cds(session_type);
+CREATE INDEX IF NOT EXISTS idx_cds_is_open ON cds(is_open, id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+"""
+
+# Dashboard aggregates for getSummary, kept live by triggers so the Reports
+# page never scans the table; filled from cds when first created
+AGGREGATES_SCHEMA = """
+CREATE TABLE totals (id INTEGER PRIMARY KEY CHECK (id = 0), cds INTEGER NOT NULL,
+                     size REAL NOT NULL, occupied REAL NOT NULL);
+CREATE TABLE type_counts (session_type TEXT PRIMARY KEY, count INTEGER NOT NULL);
+INSERT INTO totals SELECT 0, COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(occupied_space), 0) FROM cds;
+INSERT INTO type_counts SELECT session_type, COUNT(*) FROM cds GROUP BY session_type;
+CREATE TRIGGER totals_insert AFTER INSERT ON cds BEGIN
+    UPDATE totals SET cds = cds + 1, size = size + new.size, occupied = occupied + new.occupied_space;
+    INSERT INTO type_counts VALUES (new.session_type, 1)
+        ON CONFLICT (session_type) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER totals_delete AFTER DELETE ON cds BEGIN
+    UPDATE totals SET cds = cds - 1, size = size - old.size, occupied = occupied - old.occupied_space;
+    UPDATE type_counts SET count = count - 1 WHERE session_type = old.session_type;
+    DELETE FROM type_counts WHERE session_type = old.session_type AND count = 0;
+END;
+CREATE TRIGGER totals_update AFTER UPDATE OF size, occupied_space, session_type ON cds BEGIN
+    UPDATE totals SET size = size - old.size + new.size,
+                      occupied = occupied - old.occupied_space + new.occupied_space;
+    UPDATE type_counts SET count = count - 1 WHERE session_type = old.session_type;
+    DELETE FROM type_counts WHERE session_type = old.session_type AND count = 0;
+    INSERT INTO type_counts VALUES (new.session_type, 1)
+        ON CONFLICT (session_type) DO UPDATE SET count = count + 1;
+END;
+"""
+
+# Trigram full-text index over names for search_by_name, kept in step with
+# cds by triggers. Needs SQLite's FTS5 extension; without it searches scan.
+NAME_INDEX_SCHEMA = """
+CREATE VIRTUAL TABLE cds_names USING fts5(name, content='cds', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER cds_names_insert AFTER INSERT ON cds BEGIN
+    INSERT INTO cds_names(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER cds_names_delete AFTER DELETE ON cds BEGIN
+    INSERT INTO cds_names(cds_names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER cds_names_update AFTER UPDATE OF name ON cds BEGIN
+    INSERT INTO cds_names(cds_names, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO cds_names(rowid, name) VALUES (new.id, new.name);
+END;
+INSERT INTO cds_names(cds_names) VALUES ('rebuild');
+"""
+
+# search_by_name ranking, as NameIndex.match_rank: exact, prefix, word start, anywhere
+NAME_RANK = ("CASE WHEN lower(name) = :query THEN 0 "
+             "WHEN lower(name) LIKE :prefix ESCAPE '\\' THEN 1 "
+             "WHEN lower(name) LIKE :word ESCAPE '\\' THEN 2 ELSE 3 END")
+
+CD_COLUMNS = "id, name, size, encryption_speed, occupied_space, session_count, session_type"
+
+# getSorted field -> ORDER BY clause, matching SORT_KEYS
+ORDER_BY = {
+    "id": "id",
+    "name": "name, id",
+    "size": "size DESC, id",
+    "encryption_speed": "encryption_speed DESC, id",
+}
+
+def where_sql(where: Sequence[Condition]) -> Tuple[str, List]:
+    """Translates CDFilter conditions into a WHERE clause and its parameters."""
+    clauses, params = [], []
+    for field, op, value in where:
+        # Field names are checked by CDFilter.validate and match the columns
+        if op == "in":
+            options = list(value)
+            clauses.append(f"{field} IN ({', '.join('?' * len(options))})" if options else "0")
+            params.extend(options)
+        elif op == "contains":
+            escaped = str(value).lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append(f"lower({field}) LIKE ? ESCAPE '\\'")
+            params.append("%" + escaped + "%")
+        else:
+            clauses.append(f"{field} {'=' if op == '==' else op} ?")
+            params.append(value)
+    return " AND ".join(clauses) or "1", params
+
+def records(fields: Sequence[str], rows: Iterable[Tuple]) -> List[Dict]:
+    """Projected rows as dicts; is_open is stored as 0 / 1."""
+    return [{field: bool(value) if field == "is_open" else value for field, value in zip(fields, row)}
+            for row in rows]
+
+def is_sqlite(filepath: str) -> bool:
+    return filepath.lower().endswith(SQLITE_EXTENSIONS)
+
+class SQLiteCDRepository(ICDRepository):
+    """
+    Stores the library in an embedded SQLite database.
+
+    Queries run against indexes on name, size, speed, free space (a
+    generated column), occupied space and session type, so nothing is
+    loaded up front and the library can be larger than memory. One
+    connection is reused for the repository's lifetime, guarded by a lock.
+    Writes are grouped: a transaction stays open until batch_size writes
+    have been made, uploadData / commit() is called, or a transaction()
+    block ends. Reads on the connection already see uncommitted writes.
+    CDs returned are copies: change them through set_finalized /
+    set_occupied_space.
+    """
+
+    def __init__(self, db_path: str = "cd_library.db", batch_size: int = 1000):
+        reject_manifest(db_path)
+        self.db_path = db_path
+        self._batchSize = batch_size
+        self._pendingWrites = 0
+        self._lock = threading.RLock()
+        self._version = 0    # bumped on every write; see get_version
+        # isolation_level=None: transactions are opened explicitly by _write
+        self._conn = sqlite3.connect(db_path, isolation_level=None, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'totals'").fetchone():
+            self._conn.executescript("BEGIN;" + AGGREGATES_SCHEMA + "COMMIT;")
+        self._nameIndex = self._createNameIndex()
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'nextId'").fetchone()
+        if row is None:
+            max_id = self._conn.execute("SELECT MAX(id) FROM cds").fetchone()[0]
+            self._nextId = (max_id or 0) + 1
+        else:
+            self._nextId = row[0]
+
+    # --- Helpers ---
+    def _createNameIndex(self) -> bool:
+        if self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cds_names'").fetchone():
+            return True
+        try:
+            self._conn.executescript(NAME_INDEX_SCHEMA)
+            return True
+        except sqlite3.OperationalError:
+            return False  # no FTS5 in this SQLite build
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[CD]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [CD(*row) for row in rows]
+
+    def _write(self, sql: str, params: Tuple = ()) -> int:
+        """Runs one write inside the open batch transaction; returns rows changed."""
+        with self._lock:
+            self._begin()
+            changed = self._conn.execute(sql, params).rowcount
+            self._version += 1
+            self._pendingWrites += 1
+            if self._pendingWrites >= self._batchSize:
+                self.commit()
+            return changed
+
+    def _begin(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def _saveNextId(self):
+        self._write("INSERT OR REPLACE INTO meta (key, value) VALUES ('nextId', ?)", (self._nextId,))
+
+    def commit(self):
+        with self._lock:
+            if self._conn.in_transaction:
+                self._conn.execute("COMMIT")
+            self._pendingWrites = 0
+
+    @contextmanager
+    def transaction(self):
+        """Groups the writes made inside the block into one committed transaction."""
+        with self._lock:
+            batch_size, self._batchSize = self._batchSize, float("inf")
+            try:
+                yield self
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                self._pendingWrites = 0
+                raise
+            finally:
+                self._batchSize = batch_size
+            self.commit()
+
+    def close(self):
+        with self._lock:
+            self.commit()
+            self._conn.close()
+
+    # --- ICDRepository ---
+    def get_next_id(self) -> int:
+        return self._nextId
+
+    def get_version(self) -> int:
+        return self._version
+
+    def add(self, cd: CD) -> bool:
+        changed = self._write(
+            f"INSERT OR IGNORE INTO cds ({CD_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (cd.id, cd.name, cd.size, cd.encryption_speed, cd.occupied_space, cd.session_count, cd.session_type))
+        if not changed:
+            return False
+        self._nextId += 1
+        self._saveNextId()
+        return True
+
+    def reserve_ids(self, count: int) -> int:
+        with self._lock:
+            first = self._nextId
+            self._nextId += count
+            self._saveNextId()
+            return first
+
+    def add_batch(self, cds: Iterable[CD]) -> List[bool]:
+        """Inserts CDs in one transaction, returning one flag per CD."""
+        results: List[bool] = []
+        with self.transaction():
+            self._begin()
+            for cd in cds:
+                inserted = self._conn.execute(
+                    f"INSERT OR IGNORE INTO cds ({CD_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (cd.id, cd.name, cd.size, cd.encryption_speed, cd.occupied_space,
+                     cd.session_count, cd.session_type)).rowcount > 0
+                results.append(inserted)
+                self._version += inserted
+                if inserted and cd.id >= self._nextId:
+                    self._nextId = cd.id + 1
+            self._saveNextId()
+        return results
+
+    def delete(self, cd_id: int) -> bool:
+        return self._write("DELETE FROM cds WHERE id = ?", (cd_id,)) > 0
+
+    def find_by_id(self, cd_id: int) -> Optional[CD]:
+        result = self._query(f"SELECT {CD_COLUMNS} FROM cds WHERE id = ?", (cd_id,))
+        return result[0] if result else None
+
+    def set_finalized(self, cd_id: int, is_finalized: bool) -> bool:
+        # Same rules as CD.set_finalized
+        return self._write(
+            "UPDATE cds SET session_type = CASE "
+            "WHEN ? THEN 'Finalized' "
+            "WHEN lower(session_type) = 'finalized' THEN 'Data' "
+            "ELSE session_type END WHERE id = ?",
+            (bool(is_finalized), cd_id)) > 0
+
+    def set_finalized_batch(self, changes: Dict[int, bool]) -> Dict[int, bool]:
+        with self.transaction():
+            return super().set_finalized_batch(changes)
+
+    def set_occupied_space(self, cd_id: int, occupied_space: float) -> bool:
+        if occupied_space < 0:
+            return False
+        return self._write("UPDATE cds SET occupied_space = ? WHERE id = ? AND ? <= size",
+                           (occupied_space, cd_id, occupied_space)) > 0
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT cds FROM totals").fetchone()[0]
+
+    def getAll(self) -> List[CD]:
+        return self._query(f"SELECT {CD_COLUMNS} FROM cds ORDER BY id")
+
+    def iterChunks(self, chunk_size: int = 10000, where: Sequence[Condition] = (),
+                   fields: Optional[Sequence[str]] = None) -> Iterator[list]:
+        """
+        Runs where and the projection in SQL and pages through the matches
+        by ID (WHERE id > last), so no cursor or lock is held between
+        chunks and changes made meanwhile never shift the pages.
+        """
+        validate(where, fields)
+        clause, params = where_sql(where)
+        columns = CD_COLUMNS if fields is None else ", ".join(("id",) + tuple(fields))
+        sql = f"SELECT {columns} FROM cds WHERE ({clause}) AND id > ? ORDER BY id LIMIT ?"
+        last = None
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, params + [-2**63 if last is None else last, chunk_size]).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            if fields is None:
+                yield [CD(*row) for row in rows]
+            else:
+                yield records(fields, (row[1:] for row in rows))
+            if len(rows) < chunk_size:
+                return
+
+    def planQuery(self, query: CDQuery) -> Tuple[str, Callable[[], list]]:
+        """
+        Runs the whole query as one SELECT and leaves the access path to
+        SQLite's planner; the description is its EXPLAIN QUERY PLAN.
+        """
+        clause, params = where_sql(query.conditions)
+        columns = CD_COLUMNS if query.fields is None else ", ".join(query.fields)
+        order = "id" if query.order is None else f"{query.order}{' DESC' if query.descending else ''}, id"
+        sql = f"SELECT {columns} FROM cds WHERE {clause} ORDER BY {order} LIMIT ? OFFSET ?"
+        params = params + [-1 if query.count is None else query.count, query.offset]
+        with self._lock:
+            steps = self._conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+
+        def select():
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+            if query.fields is None:
+                return [CD(*row) for row in rows]
+            return records(query.fields, rows)
+        return "sql: " + "; ".join(step[-1] for step in steps), select
+
+    def getSorted(self, field: str, limit: Optional[int] = None, offset: int = 0) -> List[CD]:
+        return self._query(f"SELECT {CD_COLUMNS} FROM cds ORDER BY {ORDER_BY[field]} LIMIT ? OFFSET ?",
+                           (-1 if limit is None else limit, offset))
+
+    def getFreeSpace(self, min_space: float) -> List[CD]:
+        return self._query(f"SELECT {CD_COLUMNS} FROM cds WHERE free_space > ? ORDER BY free_space, id",
+                           (min_space,))
+
+    def getFreeSpaceBetween(self, min_space: float, max_space: float) -> List[CD]:
+        return self._query(f"SELECT {CD_COLUMNS} FROM cds WHERE free_space > ? AND free_space <= ? "
+                           "ORDER BY free_space, id", (min_space, max_space))
+
+    def getMostFreeSpace(self, k: int) -> List[CD]:
+        return self._query(f"SELECT {CD_COLUMNS} FROM cds ORDER BY free_space DESC, id DESC LIMIT ?", (k,))
+
+    def search_by_name(self, query: str, limit: Optional[int] = None) -> List[CD]:
+        query = query.lower()
+        if not query:
+            return []
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params = {"query": query, "prefix": escaped + "%", "word": "% " + escaped + "%",
+                  "anywhere": "%" + escaped + "%", "limit": -1 if limit is None else limit,
+                  "phrase": '"' + query.replace('"', '""') + '"'}
+        if self._nameIndex and len(query) >= 3:
+            match = "id IN (SELECT rowid FROM cds_names WHERE cds_names MATCH :phrase)"
+        else:
+            match = "lower(name) LIKE :anywhere ESCAPE '\\'"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {CD_COLUMNS} FROM cds WHERE {match} "
+                f"ORDER BY {NAME_RANK}, length(name), id LIMIT :limit", params).fetchall()
+        return [CD(*row) for row in rows]
+
+    def getOpenSessions(self) -> List[CD]:
+        return self._query(f"SELECT {CD_COLUMNS} FROM cds WHERE is_open = 1 ORDER BY id")
+
+    def getSummary(self, top_k: int = 5) -> Dict:
+        """Reads the trigger-maintained totals; the top_k fullest CDs come from the occupied index."""
+        with self._lock:
+            count, total_size, total_occupied = self._conn.execute(
+                "SELECT cds, size, occupied FROM totals").fetchone()
+            types = self._conn.execute("SELECT session_type, count FROM type_counts").fetchall()
+        return {
+            "total_cds": count,
+            "total_size": total_size,
+            "total_occupied": total_occupied,
+            "session_types": dict(types),
+            "top_occupied": self._query(
+                f"SELECT {CD_COLUMNS} FROM cds ORDER BY occupied_space DESC, id DESC LIMIT ?", (top_k,)),
+        }
+
+    def iterLoad(self, filepath: str, chunk_size: int = 10000) -> Iterator[Tuple[int, int, int]]:
+        """
+        The database itself needs no loading. A JSON / JSON Lines library is
+        imported, replacing the table contents in a single transaction.
+        Sharded libraries are not supported.
+
+        The import runs on a connection of its own, so the repository lock
+        is not held while the caller handles a chunk and the generator may
+        be resumed or closed from any thread. Until the import commits,
+        reads still see the previous library and writes wait for it (up to
+        BUSY_TIMEOUT seconds). If it fails or is closed early, it is rolled back.
+        """
+        reject_manifest(filepath)
+        reject_pending_journal(filepath)
+        if is_sqlite(filepath) or not os.path.exists(filepath):
+            count = self.getSummary(0)["total_cds"]
+            yield count, 0, 0
+            return
+
+        reader = open_library(filepath)
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        try:
+            with self._lock:
+                # Batched writes still open on this connection would block the import
+                self.commit()
+                conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM cds")
+            loaded = 0
+            for chunk in reader.chunks(chunk_size):
+                cds = [CD(**cd_data) for cd_data in chunk]
+                # rowcount leaves out the duplicate IDs INSERT OR IGNORE skipped
+                loaded += conn.executemany(
+                    f"INSERT OR IGNORE INTO cds ({CD_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(cd.id, cd.name, cd.size, cd.encryption_speed, cd.occupied_space,
+                      cd.session_count, cd.session_type) for cd in cds]).rowcount
+                yield loaded, reader.bytes_read, reader.total_bytes
+            max_id = conn.execute("SELECT MAX(id) FROM cds").fetchone()[0]
+            next_id = reader.next_id if reader.next_id is not None else (max_id or 0) + 1
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('nextId', ?)", (next_id,))
+            conn.execute("COMMIT")
+        finally:
+            # Closing with the transaction still open rolls it back
+            conn.close()
+            reader.close()
+        with self._lock:
+            self._nextId = next_id
+            self._version += 1
+
+    def loadData(self, filepath: str) -> bool:
+        try:
+            for _ in self.iterLoad(filepath):
+                pass
+            return True
+        except (IOError, ValueError, TypeError, sqlite3.Error) as e:
+            logger.error("Failed to load data from %s: %s", filepath, e)
+            return False
+
+    def uploadData(self, filepath: str) -> bool:
+        try:
+            reject_manifest(filepath)
+            self.commit()
+            if is_sqlite(filepath):
+                if os.path.abspath(filepath) != os.path.abspath(self.db_path):
+                    with self._lock:
+                        target = sqlite3.connect(filepath)
+                        self._conn.backup(target)
+                        target.close()
+                return True
+
+            # Export as a snapshot, JSON or JSON Lines, streaming rows out of the database
+            with self._lock:
+                cursor = self._conn.execute(f"SELECT {CD_COLUMNS} FROM cds ORDER BY id")
+                if filepath.lower().endswith(".cdb"):
+                    write_snapshot(filepath, (CD(*row) for row in cursor), self._nextId)
+                    return True
+                write = write_json_lines if is_json_lines(filepath) else write_json
+                with open(filepath, 'w') as f:
+                    write(f, (CD(*row).to_dict() for row in cursor), self._nextId)
+            return True
+        except (IOError, ValueError, sqlite3.Error) as e:
+            logger.error("Failed to save data to %s: %s", filepath, e)
+            return False
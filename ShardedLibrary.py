@@ -0,0 +1,150 @@
+"""
+Sharded library layout: a manifest plus one library file per ID range.
+
+The manifest (cd_library.manifest.json, or any file starting with the
+"cd-shards" format marker) looks like
+    {"format": "cd-shards", "version": 1, "nextId": 250001,
+     "shardSize": 100000,
+     "shards": [{"index": 0, "file": "cd_library.shard-00000.json", "count": 100000}, ...]}
+Shard k holds the CDs with IDs k * shardSize + 1 .. (k + 1) * shardSize as
+an ordinary JSON library, so a shard can also be opened on its own. File
+names are relative to the manifest's directory.
+
+Shards are parsed in parallel worker processes (parse_shards), and a save
+rewrites only the shards that changed, then the manifest (write_shards).
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from CD import CD
+from LibraryStream import open_library, open_text_writer, write_json
+
+MANIFEST_FORMAT = "cd-shards"
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".manifest.json"
+DEFAULT_SHARD_SIZE = 100_000
+
+# Field order of the record tuples workers send back; tuples pickle much
+# faster than dicts or CD objects
+RECORD_FIELDS = ("id", "name", "size", "encryption_speed", "occupied_space", "session_count", "session_type")
+
+def is_manifest(filepath: str) -> bool:
+    """True for a manifest path (by suffix) or an existing file carrying the format marker."""
+    if filepath.lower().endswith(MANIFEST_SUFFIX):
+        return True
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            head = f.read(64)
+    except (IOError, UnicodeDecodeError):
+        return False
+    return f'"format": "{MANIFEST_FORMAT}"' in head
+
+def reject_manifest(filepath: str):
+    """Raises ValueError for a manifest: only the memory backend reads and writes shards."""
+    if is_manifest(filepath):
+        raise ValueError(f"{filepath} is a sharded library manifest, which only the memory backend "
+                         "(CD_BACKEND=memory) can open")
+
+def shard_of(cd_id: int, shard_size: int) -> int:
+    return (cd_id - 1) // shard_size
+
+def shard_ids(index: int, shard_size: int) -> Tuple[int, int]:
+    """First and last ID of shard index."""
+    return index * shard_size + 1, (index + 1) * shard_size
+
+def shard_path(manifest_path: str, index: int) -> str:
+    """cd_library.manifest.json -> cd_library.shard-00003.json, next to the manifest."""
+    manifest_path = os.path.abspath(manifest_path)
+    if manifest_path.lower().endswith(MANIFEST_SUFFIX):
+        base = manifest_path[:-len(MANIFEST_SUFFIX)]
+    else:
+        base = os.path.splitext(manifest_path)[0]
+    return f"{base}.shard-{index:05d}.json"
+
+def read_manifest(filepath: str) -> Dict:
+    with open(filepath, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format") != MANIFEST_FORMAT or manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{filepath} is not a version {MANIFEST_VERSION} shard manifest")
+    return manifest
+
+def _parseShard(path: str) -> List[Tuple]:
+    """Worker: a shard's records as tuples in RECORD_FIELDS order."""
+    reader = open_library(path)
+    try:
+        return [tuple(record[field] for field in RECORD_FIELDS) for record in reader]
+    finally:
+        reader.close()
+
+def shard_files(filepath: str, manifest: Dict) -> List[str]:
+    """Paths of the shards listed in manifest, read from filepath."""
+    directory = os.path.dirname(os.path.abspath(filepath))
+    return [os.path.join(directory, shard["file"]) for shard in manifest["shards"]]
+
+def parse_shards(paths: Sequence[str], workers: Optional[int] = None) -> Iterator[Tuple[str, List[Tuple]]]:
+    """
+    Parses shard files on up to workers processes (default: one per core)
+    and yields (path, records) as each one finishes, in completion order.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        # A pool would only add process start-up and pickling
+        for path in paths:
+            yield path, _parseShard(path)
+        return
+    # Imported here: multiprocessing is slow to import and most callers never get this far
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_parseShard, path): path for path in paths}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def write_shards(filepath: str, shards: Dict[int, Sequence[CD]], next_id: int, shard_size: int,
+                 complete: bool = False, codec: str = "none"):
+    """
+    Writes the given shards (index -> CDs) and then the manifest. Shards
+    not given keep their files and manifest entries, unless complete says
+    shards holds the whole library. A shard with no CDs is dropped from the
+    manifest and its file removed. Every file is written to a temporary
+    name and renamed into place, the manifest last, so a crash leaves the
+    old manifest pointing at complete shard files. Shards are compressed
+    with codec; the manifest stays plain JSON.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    previous: Dict[int, Dict] = {}
+    if os.path.exists(filepath):
+        previous = {shard["index"]: shard for shard in read_manifest(filepath)["shards"]}
+    entries = {} if complete else dict(previous)
+    # Files the new manifest no longer lists
+    stale = {os.path.join(directory, shard["file"]) for shard in previous.values()} if complete else set()
+
+    for index, cds in shards.items():
+        path = shard_path(filepath, index)
+        if not cds:
+            entries.pop(index, None)
+            stale.add(path)
+            continue
+        _writeAtomically(path, lambda f: write_json(f, (cd.to_dict() for cd in cds), next_id), codec)
+        entries[index] = {"index": index, "file": os.path.basename(path), "count": len(cds)}
+        stale.discard(path)
+
+    manifest = {"format": MANIFEST_FORMAT, "version": MANIFEST_VERSION, "nextId": next_id,
+                "shardSize": shard_size, "shards": [entries[index] for index in sorted(entries)]}
+    _writeAtomically(filepath, lambda f: json.dump(manifest, f, indent=4))
+    for path in stale:
+        if os.path.exists(path):
+            os.remove(path)
+
+def group_by_shard(cds: Iterable[CD], shard_size: int) -> Dict[int, List[CD]]:
+    shards: Dict[int, List[CD]] = {}
+    for cd in cds:
+        shards.setdefault(shard_of(cd.id, shard_size), []).append(cd)
+    return shards
+
+def _writeAtomically(path: str, write, codec: str = "none"):
+    tmp_path = path + ".tmp"
+    with open_text_writer(tmp_path, codec) as f:
+        write(f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,170 @@
+"""
+Sharing one repository between threads, e.g. every browser session of a
+Streamlit server process.
+"""
+
+import inspect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Repository methods that change the library (or its files, or the
+# bookkeeping about them) and so need the lock to themselves; every other
+# method only reads.
+WRITE_METHODS = frozenset({
+    "add", "add_batch", "reserve_ids", "delete", "set_finalized", "set_finalized_batch",
+    "set_occupied_space", "loadData", "iterLoad", "uploadData", "captureSave", "commit", "compact", "close",
+})
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. Waiting writers go first, so a steady
+    stream of readers cannot starve them.
+
+    Re-entrant per thread: a reader may read again, and the writer may
+    read or write again. A reader asking to write raises RuntimeError, as
+    two readers doing so at once would deadlock.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0           # threads holding the read side
+        self._writer: Optional[int] = None
+        self._writeDepth = 0
+        self._waitingWriters = 0
+        # Per thread: nested read depth, and whether it counts in _readers
+        self._local = threading.local()
+
+    def acquire_read(self):
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        if depth == 0:
+            if self._writer == threading.get_ident():
+                local.counted = False  # covered by our own write lock
+            else:
+                with self._cond:
+                    while self._writer is not None or self._waitingWriters:
+                        self._cond.wait()
+                    self._readers += 1
+                local.counted = True
+        local.depth = depth + 1
+
+    def release_read(self):
+        local = self._local
+        local.depth -= 1
+        if local.depth == 0 and local.counted:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        if self._writer == threading.get_ident():
+            self._writeDepth += 1
+            return
+        if getattr(self._local, "depth", 0):
+            raise RuntimeError("Cannot take the write lock while holding the read lock")
+        with self._cond:
+            self._waitingWriters += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waitingWriters -= 1
+            self._writer = threading.get_ident()
+            self._writeDepth = 1
+
+    def release_write(self):
+        self._writeDepth -= 1
+        if self._writeDepth == 0:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+class LockedRepository:
+    """
+    Proxy making one repository safe to share between threads.
+
+    Each public method runs under lock: WRITE_METHODS one at a time, other
+    methods alongside each other, so every result is a consistent snapshot
+    of the library. Generators (iterChunks, iterLoad) hold the lock from
+    their first item until exhausted or closed. getAll returns a copy of
+    the list rather than the repository's own.
+
+    Repositories defer some index work to the first read after a change;
+    so readers never write, every write ends by calling prepareReads.
+    Callers needing several calls to see one state use reading() /
+    writing() blocks.
+    """
+
+    def __init__(self, repository, lock: Optional[ReadWriteLock] = None):
+        self._target = repository
+        self.lock = lock if lock is not None else ReadWriteLock()
+        self._wrapped: Dict[str, object] = {}
+
+    @property
+    def target(self):
+        return self._target
+
+    def reading(self):
+        return self.lock.read()
+
+    def writing(self):
+        return self.lock.write()
+
+    def __getattr__(self, attr: str):
+        wrapped = self._wrapped.get(attr)
+        if wrapped is not None:
+            return wrapped
+        value = getattr(self._target, attr)
+        if attr.startswith("_") or not callable(value):
+            return value
+        wrapped = self._wrapped[attr] = self._wrap(attr, value)
+        return wrapped
+
+    def _wrap(self, attr: str, method):
+        locked = self.writing if attr in WRITE_METHODS else self.reading
+        write = attr in WRITE_METHODS
+
+        if inspect.isgeneratorfunction(method):
+            # The lock is taken on the first next(), so an unstarted generator holds nothing
+            def call_generator(*args, **kwargs) -> Iterator:
+                with locked():
+                    yield from method(*args, **kwargs)
+                    if write:
+                        self._prepareReads()
+            call = call_generator
+        else:
+            def call(*args, **kwargs):
+                with locked():
+                    result = method(*args, **kwargs)
+                    if write:
+                        self._prepareReads()
+                    elif attr == "getAll":
+                        result = list(result)
+                    return result
+
+        call.__name__ = method.__name__
+        call.__doc__ = method.__doc__
+        return call
+
+    def _prepareReads(self):
+        prepare = getattr(self._target, "prepareReads", None)
+        if prepare is not None:
+            prepare()
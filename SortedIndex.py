@@ -0,0 +1,121 @@
+from bisect import bisect_left, insort
+from typing import Any, Iterable, Iterator, List, Optional
+
+class SortedIndex:
+    """
+    Ordered collection of comparable items (usually (key, cd_id) tuples).
+
+    Items are kept in a list of short sorted buckets plus a list of each
+    bucket's largest item. bisect locates the bucket and the position inside
+    it, so insert and remove cost O(log n) comparisons and only shift one
+    bucket, never the whole collection.
+    """
+    LOAD = 1000
+
+    def __init__(self, items: Iterable[Any] = ()):
+        self._buckets: List[list] = []
+        self._maxes: List[Any] = []
+        self._len = 0
+        self.rebuild(items)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        for bucket in self._buckets:
+            yield from bucket
+
+    def __reversed__(self) -> Iterator[Any]:
+        for bucket in reversed(self._buckets):
+            yield from reversed(bucket)
+
+    def rebuild(self, items: Iterable[Any]):
+        """Replaces the contents with items in one O(n log n) sort."""
+        ordered = sorted(items)
+        self._buckets = [ordered[i:i + self.LOAD] for i in range(0, len(ordered), self.LOAD)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(ordered)
+
+    def insert(self, item: Any):
+        if not self._buckets:
+            self._buckets.append([item])
+            self._maxes.append(item)
+            self._len = 1
+            return
+
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            # Larger than everything: append to the last bucket
+            pos -= 1
+            self._buckets[pos].append(item)
+            self._maxes[pos] = item
+        else:
+            insort(self._buckets[pos], item)
+        self._len += 1
+
+        bucket = self._buckets[pos]
+        if len(bucket) > 2 * self.LOAD:
+            self._buckets[pos:pos + 1] = [bucket[:self.LOAD], bucket[self.LOAD:]]
+            self._maxes[pos:pos + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+
+    def remove(self, item: Any) -> bool:
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            return False
+        bucket = self._buckets[pos]
+        idx = bisect_left(bucket, item)
+        if idx == len(bucket) or bucket[idx] != item:
+            return False
+
+        del bucket[idx]
+        self._len -= 1
+        if bucket:
+            self._maxes[pos] = bucket[-1]
+        else:
+            del self._buckets[pos]
+            del self._maxes[pos]
+        return True
+
+    def rank(self, item: Any) -> int:
+        """Number of items smaller than item."""
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            return self._len
+        return sum(len(bucket) for bucket in self._buckets[:pos]) + bisect_left(self._buckets[pos], item)
+
+    def islice(self, start: int = 0, stop: Optional[int] = None, reverse: bool = False) -> Iterator[Any]:
+        """Yields items by position, skipping whole buckets to reach start."""
+        stop = self._len if stop is None else min(stop, self._len)
+        if start >= stop:
+            return
+        buckets = reversed(self._buckets) if reverse else self._buckets
+        seen = 0
+        for bucket in buckets:
+            size = len(bucket)
+            if seen + size <= start:
+                seen += size
+                continue
+            ordered = bucket[::-1] if reverse else bucket
+            lo = max(start - seen, 0)
+            hi = min(stop - seen, size)
+            yield from ordered[lo:hi]
+            seen += size
+            if seen >= stop:
+                return
+
+    def irange(self, low: Any = None, high: Any = None) -> Iterator[Any]:
+        """Yields items with low <= item < high in order (None leaves a side open)."""
+        if low is None:
+            pos, idx = 0, 0
+        else:
+            pos = bisect_left(self._maxes, low)
+            if pos == len(self._maxes):
+                return
+            idx = bisect_left(self._buckets[pos], low)
+
+        for bucket in self._buckets[pos:]:
+            end = len(bucket) if high is None else bisect_left(bucket, high)
+            yield from bucket[idx:end]
+            if end < len(bucket):
+                return
+            idx = 0
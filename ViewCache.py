@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class VersionedCache:
+    """
+    Bounded LRU cache for values built from the library, such as the
+    DataFrames the view renders. Entries are keyed by (query, version): a
+    change to the repository moves its version, so stale entries are never
+    hit again and simply age out.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_build(self, query: Hashable, version: Optional[int], build: Callable[[], Any]) -> Any:
+        """Returns the cached value for (query, version), calling build() on a miss.
+
+        A version of None means the repository does not track changes; the
+        value is then built every time and not stored.
+        """
+        if version is None:
+            self.misses += 1
+            return build()
+        key = (query, version)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        value = self._entries[key] = build()
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
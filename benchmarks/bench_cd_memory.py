@@ -0,0 +1,77 @@
+"""
+Measures bytes per CD retained after loading N records, before and after
+the __slots__ / interned session_type change to CD.
+
+Run from the project root:  python benchmarks/bench_cd_memory.py [--count N]
+Records are built the way json.load produces them (a fresh string per
+field), then dropped, so only what the CD objects keep alive is counted.
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CD import CD
+
+DEFAULT_COUNT = 1_000_000
+SESSION_TYPES = ["Data", "Audio", "Mixed", "Finalized"]
+
+
+class DictCD:
+    """The previous CD layout: a per-instance __dict__, no interning."""
+    def __init__(self, id, name, size, encryption_speed, occupied_space, session_count, session_type, **kwargs):
+        self._id = id
+        self._name = name
+        self._size = size
+        self._encryption_speed = encryption_speed
+        self._occupied_space = occupied_space
+        self._session_count = session_count
+        self._session_type = str(session_type).strip()
+        self._is_open = (self._session_type.lower() != 'finalized')
+
+
+def make_records(count: int):
+    # "".join builds a new string object per record, as a JSON parser does
+    return [
+        {"id": i, "name": f"Disc {i}", "size": 700.0, "encryption_speed": 52,
+         "occupied_space": float(i % 700), "session_count": 1,
+         "session_type": "".join(SESSION_TYPES[i % 4])}
+        for i in range(count)
+    ]
+
+
+def bytes_per_cd(cls, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    records = make_records(count)
+    cds = [cls(**record) for record in records]
+    del records
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cds
+    return retained / count
+
+
+def run(count: int):
+    before = bytes_per_cd(DictCD, count)
+    after = bytes_per_cd(CD, count)
+    print(f"CDs:               {count:,}")
+    print(f"Before (__dict__): {before:8.1f} bytes/CD  ({before * count / 2**20:,.1f} MiB)")
+    print(f"After (__slots__): {after:8.1f} bytes/CD  ({after * count / 2**20:,.1f} MiB)")
+    print(f"Saved:             {1 - after / before:8.1%}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT, help="CDs to build per layout")
+    args = parser.parse_args(argv)
+    run(args.count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Measures the cold start of the headless CLI (cdcli.py): the wall time of
+a whole process running a command on an empty library, against the
+budget in cdcli.STARTUP_BUDGET_MS.
+
+Run from the project root:
+    python benchmarks/bench_cli_startup.py              # stats, query and --help, 20 runs each
+    python benchmarks/bench_cli_startup.py --runs 50 --importtime
+
+Reports the median and slowest run per command next to a bare
+interpreter start, and exits with status 1 when a median is over budget.
+With --importtime the slowest imports of the first command are listed.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from cdcli import STARTUP_BUDGET_MS
+
+COMMANDS = {
+    "stats": ["stats"],
+    "query": ["query", "--where", "free_space", ">", "100", "--limit", "10"],
+    "--help": ["--help"],
+}
+
+
+def time_runs(argv: List[str], runs: int, env: Dict[str, str]) -> List[float]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1e3)
+    return times
+
+
+def slowest_imports(argv: List[str], env: Dict[str, str], count: int = 15) -> List[str]:
+    """The modules with the largest cumulative import time, from python -X importtime."""
+    result = subprocess.run(argv[:1] + ["-X", "importtime"] + argv[1:], env=env, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    return [f"{micros / 1e3:8.1f} ms {name}" for micros, name in sorted(rows, reverse=True)[:count]]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="milliseconds per command")
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ, CD_BACKEND="memory", CD_JOURNAL="0",
+                   CD_LIBRARY=os.path.join(tmp_dir, "library.json"))
+        bare = statistics.median(time_runs([sys.executable, "-c", "pass"], args.runs, env))
+        print(f"{'python -c pass':<16}{bare:>9.1f} ms median")
+        over = []
+        for name, command in COMMANDS.items():
+            times = time_runs([sys.executable, "cdcli.py"] + command, args.runs, env)
+            median = statistics.median(times)
+            print(f"{name:<16}{median:>9.1f} ms median{max(times):>9.1f} ms max")
+            if median > args.budget:
+                over.append(name)
+        if args.importtime:
+            print("\nSlowest imports of 'stats':")
+            for line in slowest_imports([sys.executable, "cdcli.py", "stats"], env):
+                print(f"  {line}")
+
+    if over:
+        print(f"\nOver the {args.budget:.0f} ms budget: {', '.join(over)}")
+        return 1
+    print(f"\nAll commands within the {args.budget:.0f} ms budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
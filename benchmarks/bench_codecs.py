@@ -0,0 +1,105 @@
+"""
+Compares the library codecs (none, gzip, bz2, lzma) on synthetic
+libraries: file size, save time and load time, for JSON and JSON Lines.
+
+Run from the project root:
+    python benchmarks/bench_codecs.py                       # 100k and 1M CDs
+    python benchmarks/bench_codecs.py --sizes 100000 --codecs none gzip --output codecs.json
+
+Throughput is uncompressed JSON megabytes per second, so every codec is
+measured against the same amount of library data.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import git_commit, synthetic_records
+from CD import CD
+from CDRepository import CDRepository
+from LibraryStream import CODECS
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+FORMATS = {"json": "library.json", "jsonl": "library.jsonl"}
+
+
+def build_repository(size: int) -> CDRepository:
+    repo = CDRepository()
+    repo.add_batch(CD(i, **record) for i, record in enumerate(synthetic_records(size), 1))
+    return repo
+
+
+def best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_size(size: int, codecs: List[str], repeat: int) -> Dict:
+    repo = build_repository(size)
+    tmp_dir = tempfile.mkdtemp()
+    results: Dict[str, Dict] = {}
+    try:
+        for layout, name in FORMATS.items():
+            path = os.path.join(tmp_dir, name)
+            repo._codec = "none"
+            repo.uploadData(path)
+            raw_bytes = os.path.getsize(path)
+            for codec in codecs:
+                repo._codec = codec
+                save = best_of(lambda: repo.uploadData(path), repeat)
+                load = best_of(lambda: CDRepository().loadData(path), repeat)
+                file_bytes = os.path.getsize(path)
+                results[f"{layout}/{codec}"] = {
+                    "bytes": file_bytes, "ratio": raw_bytes / file_bytes,
+                    "save_seconds": save, "save_mb_s": raw_bytes / save / 2**20,
+                    "load_seconds": load, "load_mb_s": raw_bytes / load / 2**20,
+                }
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def print_table(size: int, results: Dict):
+    print(f"\n{size:,} CDs")
+    print(f"{'format/codec':<14}{'size':>12}{'ratio':>8}{'save':>11}{'MB/s':>8}{'load':>11}{'MB/s':>8}")
+    for key, entry in results.items():
+        print(f"{key:<14}{entry['bytes'] / 2**20:>8.1f} MiB{entry['ratio']:>7.1f}x"
+              f"{entry['save_seconds']:>9.2f} s{entry['save_mb_s']:>8.1f}"
+              f"{entry['load_seconds']:>9.2f} s{entry['load_mb_s']:>8.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--codecs", nargs="+", choices=CODECS, default=list(CODECS))
+    parser.add_argument("--repeat", type=int, default=1, help="runs per save / load; the best is kept")
+    parser.add_argument("--output", default="codec_results.json")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        print(f"Benchmarking codecs on {size:,} CDs...", file=sys.stderr)
+        results[str(size)] = run_size(size, args.codecs, args.repeat)
+        print_table(size, results[str(size)])
+
+    report = {"commit": git_commit(), "repeat": args.repeat, "python": platform.python_version(),
+              "machine": platform.machine(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
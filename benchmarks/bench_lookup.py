@@ -0,0 +1,50 @@
+"""
+Times find_by_id / update_status / delete as the library grows.
+
+Run from the project root:  python benchmarks/bench_lookup.py [sizes...]
+With the id index the per-call cost should stay flat across sizes.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CD import CD
+from CDRepository import CDRepository
+from CDService import CDService
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+LOOKUPS = 10_000
+
+
+def build_repository(size: int) -> CDRepository:
+    repo = CDRepository()
+    for i in range(1, size + 1):
+        repo.add(CD(i, f"Disc {i}", 700.0, 52, float(i % 700), 1, "Data"))
+    return repo
+
+
+def time_per_call(func, ids) -> float:
+    start = time.perf_counter()
+    for cd_id in ids:
+        func(cd_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def run(sizes):
+    print(f"{'CDs':>10} {'find_by_id (us)':>16} {'update_status (us)':>19} {'delete (us)':>12}")
+    for size in sizes:
+        repo = build_repository(size)
+        service = CDService(repo)
+        ids = [random.randint(1, size) for _ in range(LOOKUPS)]
+        find_us = time_per_call(service.find_by_id, ids)
+        update_us = time_per_call(lambda cd_id: service.update_status(cd_id, True), ids)
+        to_delete = random.sample(range(1, size + 1), min(LOOKUPS, size))
+        delete_us = time_per_call(service.delete_cd, to_delete)
+        print(f"{size:>10} {find_us:>16.3f} {update_us:>19.3f} {delete_us:>12.3f}")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
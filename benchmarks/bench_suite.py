@@ -0,0 +1,203 @@
+"""
+Times the main CD Manager operations on synthetic libraries and records
+peak memory, writing the results as JSON so runs can be compared.
+
+Run from the project root:
+    python benchmarks/bench_suite.py                      # 1k, 100k, 1M, 10M
+    python benchmarks/bench_suite.py --sizes 1000 100000 --output after.json
+    python benchmarks/bench_suite.py --sizes 1000 100000 --baseline before.json
+
+With --baseline, every operation that got slower than the baseline by more
+than --threshold (default 20%) is reported and the exit status is 1.
+Each size runs in its own process so the peak RSS belongs to that size.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000, 10_000_000]
+SESSION_TYPES = ["Data", "Audio", "Video", "Finalized"]
+LOOKUPS = 1_000
+# Differences below this many seconds are treated as noise when comparing
+NOISE_FLOOR = 0.0005
+
+
+def synthetic_records(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    for i in range(size):
+        disc_size = rng.choice((650.0, 700.0, 4700.0))
+        yield {
+            "name": f"Disc {rng.randrange(size * 10):08d}",
+            "size": disc_size,
+            "encryption_speed": rng.choice((8, 16, 24, 48, 52)),
+            "occupied_space": round(rng.uniform(0, disc_size), 1),
+            "session_count": rng.randint(1, 5),
+            "session_type": rng.choice(SESSION_TYPES),
+        }
+
+
+def timed(func: Callable, calls: int = 1, repeat: int = 1) -> Dict:
+    """Best of repeat runs; only idempotent operations are repeated."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return {"seconds": best, "calls": calls, "per_call_us": best / calls * 1e6}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def run_size(size: int, backend: str, repeat: int = 3) -> Dict:
+    """Builds one library and times every operation on it (runs in a worker process)."""
+    from CDService import CDService
+
+    tmp_dir = tempfile.mkdtemp()
+    library = os.path.join(tmp_dir, "library.db" if backend == "sqlite" else "library.json")
+    config = {"backend": backend, "library": library, "journal": False}
+    service = CDService.from_config(config)
+    rng = random.Random(7)
+    ops: Dict[str, Dict] = {}
+
+    ops["add_many"] = timed(lambda: service.add_many(synthetic_records(size)), size)
+    ops["uploadData"] = timed(lambda: service.save(library), repeat=repeat)
+    # The in-memory backends rebuild their indexes lazily after a load, so
+    # the rebuild is timed with it instead of landing on the first query
+    ops["loadData"] = timed(lambda: (service.load(library), service.prepare_reads()), repeat=repeat)
+
+    ids = [rng.randint(1, size) for _ in range(LOOKUPS)]
+    ops["find_by_id"] = timed(lambda: [service.find_by_id(cd_id) for cd_id in ids], len(ids), repeat)
+    ops["update_status"] = timed(lambda: [service.update_status(cd_id, True) for cd_id in ids], len(ids), repeat)
+
+    queries = {
+        "filterByFreeSpace": lambda: service.filterByFreeSpace(4000.0),
+        "filterByFreeSpace_range": lambda: service.filterByFreeSpace(100.0, 200.0),
+        "filterByFreeSpace_top": lambda: service.filterByFreeSpace(0.0, top=10),
+        "get_open_sessions": service.get_open_sessions,
+        "sortByName": service.sortByName,
+        "sortBySpeed": service.sortBySpeed,
+        "sortBySize": service.sortBySize,
+        "sortByName_page": lambda: service.sortByName(limit=50, offset=size // 2),
+        "get_summary": service.get_summary,
+    }
+    for op, query in queries.items():
+        ops[op] = timed(query, repeat=repeat)
+
+    to_delete = rng.sample(range(1, size + 1), min(LOOKUPS, size))
+    ops["delete"] = timed(lambda: [service.delete_cd(cd_id) for cd_id in to_delete], len(to_delete))
+
+    service.close()
+    for name in os.listdir(tmp_dir):
+        os.remove(os.path.join(tmp_dir, name))
+    os.rmdir(tmp_dir)
+    return {"ops": ops, "peak_rss_mb": peak_rss_mb()}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Lists operations slower than baseline by more than threshold (a fraction)."""
+    regressions = []
+    for size, result in current["results"].items():
+        before = baseline.get("results", {}).get(size)
+        if before is None:
+            continue
+        for op, timing in result["ops"].items():
+            old = before["ops"].get(op)
+            if old is None:
+                continue
+            new_s, old_s = timing["seconds"], old["seconds"]
+            if new_s > old_s * (1 + threshold) and new_s - old_s > NOISE_FLOOR:
+                regressions.append(f"{op} @ {int(size):,} CDs: {old_s * 1e3:.2f} ms -> {new_s * 1e3:.2f} ms "
+                                   f"(+{new_s / old_s - 1:.0%})")
+        old_rss = before.get("peak_rss_mb")
+        if old_rss and result["peak_rss_mb"] > old_rss * (1 + threshold):
+            regressions.append(f"peak memory @ {int(size):,} CDs: {old_rss:.1f} MiB -> {result['peak_rss_mb']:.1f} MiB")
+    return regressions
+
+
+def print_table(results: Dict):
+    sizes = list(results)
+    ops = list(results[sizes[0]]["ops"])
+    print(f"{'operation':<24}" + "".join(f"{int(size):>14,}" for size in sizes))
+    for op in ops:
+        row = "".join(f"{results[size]['ops'][op]['seconds'] * 1e3:>11.2f} ms" for size in sizes)
+        print(f"{op:<24}{row}")
+    print(f"{'peak RSS':<24}" + "".join(f"{results[size]['peak_rss_mb']:>10.1f} MiB" for size in sizes))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--backend", choices=("memory", "columnar", "sqlite"), default="memory")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.20,
+                        help="slowdown fraction reported as a regression (default 0.20)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per repeatable operation; the best is kept")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        json.dump(run_size(args.worker, args.backend, args.repeat), sys.stdout)
+        return 0
+
+    results = {}
+    for size in args.sizes:
+        print(f"Benchmarking {size:,} CDs ({args.backend})...", file=sys.stderr)
+        worker = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(size),
+                                 "--backend", args.backend, "--repeat", str(args.repeat)],
+                                capture_output=True, text=True)
+        if worker.returncode != 0:
+            print(worker.stderr, file=sys.stderr)
+            return 2
+        results[str(size)] = json.loads(worker.stdout)
+
+    report = {
+        "commit": git_commit(),
+        "backend": args.backend,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print_table(results)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
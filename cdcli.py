@@ -0,0 +1,252 @@
+"""
+Headless command line for the CD library, for cron jobs and batch
+pipelines:
+
+    python cdcli.py import catalogue.jsonl              # JSON, JSON Lines or CSV, compressed or not
+    python cdcli.py export open.csv --where is_open == true
+    python cdcli.py query --where free_space '>' 200 --order encryption_speed --desc --limit 10
+    python cdcli.py finalize 12 13 14                   # --reopen to undo
+    python cdcli.py stats --json
+
+The backend and library come from the CD_* environment variables (see
+CDConfig); --library overrides the library. Commands that change the
+library save it before exiting.
+
+Start-up budget: a command on an empty library finishes within
+STARTUP_BUDGET_MS of process start (checked by
+benchmarks/bench_cli_startup.py). To stay there this module imports only
+small standard modules up front and each command imports what it uses, so
+no command loads Streamlit or pandas, and only the columnar backend loads
+numpy.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+STARTUP_BUDGET_MS = 150
+# Columns shown when a query selects no fields
+DEFAULT_COLUMNS = ("id", "name", "size", "encryption_speed", "occupied_space", "session_count", "session_type")
+CSV_NUMBERS = {"size": float, "encryption_speed": int, "occupied_space": float, "session_count": int}
+
+logger = logging.getLogger(__name__)
+
+class Library:
+    """The configured repository behind a CDService, loaded on entry and closed on exit."""
+
+    def __init__(self, library: Optional[str]):
+        from CDConfig import create_repository, load_config
+        from CDService import CDService
+        self.config = load_config()
+        if library is not None:
+            self.config["library"] = library
+        self.path = self.config["library"]
+        self._repository = create_repository(self.config)
+        self.service = CDService(self._repository)
+
+    def __enter__(self) -> "Library":
+        if not self.service.load(self.path):
+            raise SystemExit(f"Could not load {self.path}")
+        return self
+
+    def __exit__(self, *exc):
+        self.service.close()
+
+    def save(self):
+        if not self.service.save(self.path):
+            raise SystemExit(f"Could not save {self.path}")
+
+def parse_value(text: str):
+    """A --where value: JSON when it parses (numbers, true, "quoted"), else the text itself."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def parse_where(conditions: Optional[List[List[str]]]) -> List:
+    where = []
+    for field, op, text in conditions or ():
+        value = [parse_value(item) for item in text.split(",")] if op == "in" else parse_value(text)
+        where.append((field, op, value))
+    return where
+
+def records(cds: Iterable) -> Iterator[Dict]:
+    """Query results (CDs, or dicts when fields were selected) as dicts."""
+    for cd in cds:
+        yield cd if isinstance(cd, dict) else cd.to_dict()
+
+def read_records(path: str) -> Iterator[Dict]:
+    """CD records from a library file (any format open_library reads) or a CSV file with a header row."""
+    if path.lower().endswith(".csv"):
+        import csv
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    yield {field: CSV_NUMBERS.get(field, str)(value) for field, value in row.items()}
+                except ValueError:
+                    yield row  # rejected by add_many
+        return
+    from LibraryStream import open_library
+    reader = open_library(path)
+    try:
+        yield from reader
+    finally:
+        reader.close()
+
+# --- Commands ---
+def cmd_import(args) -> int:
+    with Library(args.library) as library:
+        added = library.service.add_many(read_records(args.file))
+        rejected = sum(cd_id is None for cd_id in added)
+        library.save()
+    print(f"Added {len(added) - rejected} CDs to {library.path}" + (f", rejected {rejected}" if rejected else ""))
+    return 1 if rejected else 0
+
+def cmd_export(args) -> int:
+    where = parse_where(args.where)
+    with Library(args.library) as library:
+        if args.file.lower().endswith(".csv"):
+            written = library.service.export_csv(args.file, where, args.fields)
+        else:
+            from LibraryStream import codec_for_path, is_json_lines, open_text_writer, write_json, write_json_lines
+            write = write_json_lines if is_json_lines(args.file) else write_json
+            written = 0
+
+            def counted():
+                nonlocal written
+                for record in records(library.service.iter_cds(where, args.fields)):
+                    written += 1
+                    yield record
+            tmp_path = args.file + ".tmp"
+            with open_text_writer(tmp_path, codec_for_path(args.file)) as f:
+                write(f, counted(), library.service.get_next_id())
+            os.replace(tmp_path, args.file)
+    print(f"Exported {written} CDs to {args.file}")
+    return 0
+
+def cmd_query(args) -> int:
+    from CDQuery import CDQuery
+    query = CDQuery(parse_where(args.where), args.order, args.desc, args.offset, args.limit, args.fields)
+    with Library(args.library) as library:
+        if args.explain:
+            print(library.service.explain(query))
+            return 0
+        rows = list(records(library.service.query(query)))
+    columns = list(args.fields or DEFAULT_COLUMNS)
+    if args.format == "json":
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    elif args.format == "csv":
+        import csv
+        writer = csv.DictWriter(sys.stdout, columns, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        print_table(columns, rows)
+    return 0
+
+def cmd_finalize(args) -> int:
+    with Library(args.library) as library:
+        results = library.service.update_statuses({cd_id: not args.reopen for cd_id in args.ids})
+        failed = [cd_id for cd_id in args.ids if not results.get(cd_id)]
+        if len(failed) < len(args.ids):
+            library.save()
+    print(f"{'Reopened' if args.reopen else 'Finalized'} {len(args.ids) - len(failed)} CDs")
+    if failed:
+        print(f"Not found: {', '.join(map(str, failed))}", file=sys.stderr)
+    return 1 if failed else 0
+
+def cmd_stats(args) -> int:
+    with Library(args.library) as library:
+        summary = library.service.get_summary(args.top)
+    summary["top_occupied"] = [cd.to_dict() for cd in summary["top_occupied"]]
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+        return 0
+    print(f"CDs:            {summary['total_cds']}")
+    print(f"Total size:     {summary['total_size']:.1f} MB")
+    print(f"Total occupied: {summary['total_occupied']:.1f} MB")
+    for session_type, count in sorted(summary["session_types"].items()):
+        print(f"  {session_type:<14}{count}")
+    if summary["top_occupied"]:
+        print("Fullest CDs:")
+        print_table(["id", "name", "occupied_space", "size"], summary["top_occupied"])
+    return 0
+
+def print_table(columns: Sequence[str], rows: List[Dict]):
+    cells = [[str(row[column]) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(line[i]) for line in cells]) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)).rstrip())
+    for line in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip())
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cdcli", description=__doc__.strip().split("\n\n")[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--library", help="library file (default: CD_LIBRARY or cd_library.json)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    where = dict(nargs=3, action="append", metavar=("FIELD", "OP", "VALUE"),
+                 help="keep CDs where FIELD OP VALUE (repeatable; see CDFilter for fields and operators)")
+
+    command = commands.add_parser("import", help="add the CDs of a JSON, JSON Lines or CSV file")
+    command.add_argument("file")
+    command.set_defaults(run=cmd_import)
+
+    command = commands.add_parser("export", help="write CDs to a CSV, JSON or JSON Lines file")
+    command.add_argument("file")
+    command.add_argument("--where", **where)
+    command.add_argument("--fields", nargs="+")
+    command.set_defaults(run=cmd_export)
+
+    command = commands.add_parser("query", help="filter, order and page CDs")
+    command.add_argument("--where", **where)
+    command.add_argument("--order")
+    command.add_argument("--desc", action="store_true")
+    command.add_argument("--offset", type=int, default=0)
+    command.add_argument("--limit", type=int)
+    command.add_argument("--fields", nargs="+")
+    command.add_argument("--format", choices=("table", "json", "csv"), default="table")
+    command.add_argument("--explain", action="store_true", help="print the access path instead of results")
+    command.set_defaults(run=cmd_query)
+
+    command = commands.add_parser("finalize", help="mark CDs finalized (or open again with --reopen)")
+    command.add_argument("ids", type=int, nargs="+")
+    command.add_argument("--reopen", action="store_true")
+    command.set_defaults(run=cmd_finalize)
+
+    command = commands.add_parser("stats", help="totals, session types and the fullest CDs")
+    command.add_argument("--top", type=int, default=5)
+    command.add_argument("--json", action="store_true")
+    command.set_defaults(run=cmd_stats)
+    return parser
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(levelname)s %(name)s: %(message)s")
+    try:
+        return args.run(args)
+    except BrokenPipeError:
+        # Output piped into a reader that stopped early, e.g. head
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except ValueError as e:
+        # Unknown fields or operators, bad configuration
+        parser.error(str(e))
+    except Exception as e:
+        # sqlite3 is only imported by the sqlite backend, so its errors can
+        # only have been raised if it is loaded
+        sqlite3 = sys.modules.get("sqlite3")
+        if sqlite3 is None or not isinstance(e, sqlite3.DatabaseError):
+            raise
+        # e.g. CD_BACKEND=sqlite with a library that is not a database
+        parser.error(f"cannot use the SQLite library: {e}")
+
+if __name__ == "__main__":
+    sys.exit(main())
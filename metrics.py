@@ -1,97 +1,259 @@
+import argparse
 import ast
+import hashlib
+import json
 import os
 import csv
+import time
 from collections import Counter
 
-def analyze_project_to_csv(project_path, output_file="metrics_report.csv"):
-    # --- CONFIGURATION ---
-    # Folders to completely ignore
-    IGNORE_DIRS = {
-        'env', 'venv', '.venv', '__pycache__', '.git', '.idea', 
-        'build', 'dist', 'node_modules', 'anaconda3', 'site-packages', 'lib'
-    }
+# Folders to completely ignore
+IGNORE_DIRS = {
+    'env', 'venv', '.venv', '__pycache__', '.git', '.idea',
+    'build', 'dist', 'node_modules', 'anaconda3', 'site-packages', 'lib'
+}
 
-    # DATA STORAGE
-    # Stores where classes are defined: {'ClassName': {'file': '...', 'if_impl': 0, 'dep_out': 0}}
-    class_definitions = {}
-    
-    # Stores how many times a name is CALLED (instantiated/used) globally: {'ClassName': count}
-    global_call_counts = Counter()
+# Bump when the per-file results change shape, so old caches are ignored
+CACHE_VERSION = 1
+DEFAULT_CACHE_FILE = ".metrics_cache.json"
+# Below this many files to parse, starting worker processes costs more than it saves
+MIN_POOL_FILES = 64
 
-    print(f"Scanning project: {project_path} ...")
-    
-    # --- PASS 1: SCAN ALL FILES ---
+HEADER = ['Class Name', 'File Location', 'IFImpl (Parents)', 'Dep_Out (Imports)', 'InstSpec (Usage)']
+
+def analyze_source(source):
+    """
+    Metrics of one file in a single ast.walk: how many import statements it
+    has, its classes with their number of parents, and how often each name
+    is called (instantiated/used).
+    """
+    tree = ast.parse(source)
+    imports = 0
+    classes = []
+    calls = Counter()
+    for node in ast.walk(tree):
+        # We count 'Import' and 'ImportFrom' nodes
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports += 1
+        # Found a Class Definition
+        elif isinstance(node, ast.ClassDef):
+            classes.append([node.name, len(node.bases)])
+        # Found a Function/Class Call (e.g. MyClass())
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            calls[node.func.id] += 1
+    return {'imports': imports, 'classes': classes, 'calls': dict(calls)}
+
+def _analyze_file(task):
+    """
+    Worker: (path, hash of the cached result) -> (hash, result, parsed).
+    A file whose content still has the cached hash is not parsed again;
+    a file that fails to parse gets the result None, and one that can no
+    longer be read (deleted or renamed since it was listed) the hash None.
+    """
+    full_path, cached_hash = task
+    try:
+        with open(full_path, 'rb') as source:
+            data = source.read()
+    except OSError:
+        return None, None, False
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == cached_hash:
+        return digest, None, False
+    try:
+        return digest, analyze_source(data), True
+    except Exception:
+        # Skip files that fail to parse
+        return digest, None, True
+
+def find_python_files(project_path):
+    """rel_path -> full path of every .py file outside IGNORE_DIRS."""
+    found = {}
     for root, dirs, files in os.walk(project_path):
         # Filter directories to avoid scanning libraries
         dirs[:] = [d for d in dirs if d not in IGNORE_DIRS and "anaconda" not in d.lower()]
-        
         for file in files:
             if file.endswith(".py"):
                 full_path = os.path.join(root, file)
-                rel_path = os.path.relpath(full_path, project_path)
-                
-                try:
-                    with open(full_path, "r", encoding="utf-8") as source:
-                        tree = ast.parse(source.read())
-                    
-                    # 1. Calculate Dep_Out (Imports) for this file
-                    # We count 'Import' and 'ImportFrom' nodes
-                    imports = [node for node in ast.walk(tree) if isinstance(node, (ast.Import, ast.ImportFrom))]
-                    file_dep_out = len(imports)
-                    
-                    # 2. Walk the file to find Classes and Function Calls
-                    for node in ast.walk(tree):
-                        
-                        # Found a Class Definition
-                        if isinstance(node, ast.ClassDef):
-                            class_definitions[node.name] = {
-                                'file': rel_path,
-                                'if_impl': len(node.bases), # Parents count
-                                'dep_out': file_dep_out     # Based on file imports
-                            }
-                        
-                        # Found a Function/Class Call (e.g. MyClass())
-                        elif isinstance(node, ast.Call):
-                            if isinstance(node.func, ast.Name):
-                                global_call_counts[node.func.id] += 1
-                                
-                except Exception:
-                    # Skip files that fail to parse
-                    pass
+                found[os.path.relpath(full_path, project_path)] = full_path
+    return found
 
-    # --- PASS 2: WRITE TO CSV ---
+def scan_project(project_path, cache, workers=None):
+    """
+    Brings cache (rel_path -> {"mtime_ns", "size", "sha256", "result"}) up to
+    date with the files under project_path. Returns how many files were
+    parsed or dropped, i.e. whether the merged metrics may have changed.
+
+    A file whose mtime and size match its entry is not even read. Otherwise
+    it is hashed, and parsed only if the content changed; the files to
+    parse are spread over a process pool when there are enough of them.
+    """
+    files = find_python_files(project_path)
+    removed = set(cache) - set(files)
+    for rel_path in removed:
+        del cache[rel_path]
+
+    tasks, stats = [], {}
+    for rel_path, full_path in files.items():
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            continue
+        entry = cache.get(rel_path)
+        stats[rel_path] = stat
+        if entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            continue
+        tasks.append((rel_path, full_path, entry['sha256'] if entry is not None else None))
+
+    workers = workers or os.cpu_count() or 1
+    jobs = [(full_path, cached_hash) for _, full_path, cached_hash in tasks]
+    if workers > 1 and len(jobs) >= MIN_POOL_FILES:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_analyze_file, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        outcomes = [_analyze_file(job) for job in jobs]
+
+    parsed = 0
+    for (rel_path, _, _), (digest, result, was_parsed) in zip(tasks, outcomes):
+        if digest is None:
+            # Gone before it could be read; the next scan picks up any new name
+            if cache.pop(rel_path, None) is not None:
+                removed.add(rel_path)
+            continue
+        stat = stats[rel_path]
+        if was_parsed:
+            parsed += 1
+        else:
+            result = cache[rel_path]['result']  # touched but unchanged
+        cache[rel_path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest, 'result': result}
+    return parsed + len(removed)
+
+def merge_results(cache):
+    """
+    CSV rows from the per-file results. Files are merged in path order, so
+    when two files define a class of the same name the later path wins.
+    """
+    # Stores where classes are defined: {'ClassName': {'file': '...', 'if_impl': 0, 'dep_out': 0}}
+    class_definitions = {}
+    # Stores how many times a name is CALLED (instantiated/used) globally: {'ClassName': count}
+    global_call_counts = Counter()
+    for rel_path in sorted(cache):
+        result = cache[rel_path]['result']
+        if result is None:
+            continue
+        for name, parents in result['classes']:
+            class_definitions[name] = {
+                'file': rel_path,
+                'if_impl': parents,            # Parents count
+                'dep_out': result['imports']   # Based on file imports
+            }
+        global_call_counts.update(result['calls'])
+
+    # Sorted by Class Name
+    return [[class_name, data['file'], data['if_impl'], data['dep_out'], global_call_counts[class_name]]
+            for class_name, data in sorted(class_definitions.items())]
+
+def load_cache(cache_file, project_path):
+    """The cached per-file results for project_path, or an empty cache if there are none to trust."""
+    if cache_file is None or not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if data.get('version') != CACHE_VERSION or data.get('project') != os.path.abspath(project_path):
+        return {}
+    return data.get('files', {})
+
+def save_cache(cache_file, project_path, cache):
+    if cache_file is None:
+        return
+    tmp_path = cache_file + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'project': os.path.abspath(project_path), 'files': cache}, f)
+        os.replace(tmp_path, cache_file)
+    except IOError as e:
+        print(f"Warning: could not write the cache {cache_file}: {e}")
+
+def write_csv(rows, output_file):
     try:
         with open(output_file, mode='w', newline='', encoding='utf-8') as csv_file:
             writer = csv.writer(csv_file)
-            
-            # Write Header
-            writer.writerow(['Class Name', 'File Location', 'IFImpl (Parents)', 'Dep_Out (Imports)', 'InstSpec (Usage)'])
-            
-            # Write Data (Sorted by Class Name)
-            sorted_classes = sorted(class_definitions.keys())
-
-            for class_name in sorted_classes:
-                data = class_definitions[class_name]
-                inst_spec = global_call_counts[class_name]
-                
-                writer.writerow([
-                    class_name, 
-                    data['file'], 
-                    data['if_impl'], 
-                    data['dep_out'], 
-                    inst_spec
-                ])
-                
-        print(f"\nSuccess! Metrics saved to: {os.path.abspath(output_file)}")
-        
+            writer.writerow(HEADER)
+            writer.writerows(rows)
+        return True
     except PermissionError:
         print(f"\nError: Could not write to {output_file}. Is the file open in Excel?")
+        return False
+
+def analyze_project_to_csv(project_path, output_file="metrics_report.csv", workers=None,
+                           cache_file=DEFAULT_CACHE_FILE):
+    """
+    Writes one row per class: where it is defined, its parents, its file's
+    imports and how often it is called across the project. Files unchanged
+    since the cached run are not parsed again; cache_file=None disables
+    the cache.
+    """
+    print(f"Scanning project: {project_path} ...")
+    cache = load_cache(cache_file, project_path)
+
+    # --- PASS 1: PARSE CHANGED FILES ---
+    changed = scan_project(project_path, cache, workers)
+    print(f"{changed} changed file(s), {len(cache)} in total")
+    save_cache(cache_file, project_path, cache)
+
+    # --- PASS 2: WRITE TO CSV ---
+    rows = merge_results(cache)
+    if write_csv(rows, output_file):
+        print(f"\nSuccess! Metrics saved to: {os.path.abspath(output_file)}")
+    return rows
+
+def watch_project(project_path, output_file="metrics_report.csv", interval=2.0, workers=None,
+                  cache_file=DEFAULT_CACHE_FILE, iterations=None):
+    """
+    Keeps output_file up to date: every interval seconds, re-parses only
+    the files that changed and rewrites the CSV if any row changed. Runs
+    until interrupted, or for the given number of checks.
+    """
+    print(f"Watching {project_path} every {interval:g} s (Ctrl+C to stop)")
+    cache = load_cache(cache_file, project_path)
+    rows = None
+    checks = 0
+    try:
+        while True:
+            changed = scan_project(project_path, cache, workers)
+            checks += 1
+            if changed or rows is None:
+                save_cache(cache_file, project_path, cache)
+                new_rows = merge_results(cache)
+                if new_rows != rows and write_csv(new_rows, output_file):
+                    print(f"{time.strftime('%H:%M:%S')} {changed} changed file(s); {output_file} updated")
+                rows = new_rows
+            if iterations is not None and checks >= iterations:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return rows
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Class metrics of a Python project as CSV")
     # --- TARGET PATH ---
-    target_path = r"F:\repo\MSIC_CD-Tracker"
-    
-    if os.path.exists(target_path):
-        analyze_project_to_csv(target_path)
+    parser.add_argument("target_path", nargs="?", default=r"F:\repo\MSIC_CD-Tracker")
+    parser.add_argument("--output", default="metrics_report.csv")
+    parser.add_argument("--workers", type=int, help="parser processes (default: one per core)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE, help="cache file of per-file results")
+    parser.add_argument("--no-cache", action="store_true", help="parse every file, without reading or writing the cache")
+    parser.add_argument("--watch", action="store_true", help="keep the CSV up to date as files change")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between checks in watch mode")
+    args = parser.parse_args()
+    cache_file = None if args.no_cache else args.cache
+
+    if not os.path.exists(args.target_path):
+        print(f"Error: Path not found: {args.target_path}")
+    elif args.watch:
+        watch_project(args.target_path, args.output, args.interval, args.workers, cache_file)
     else:
-        print(f"Error: Path not found: {target_path}")
\ No newline at end of file
+        analyze_project_to_csv(args.target_path, args.output, args.workers, cache_file)
@@ -0,0 +1,47 @@
+"""
+Repository backends for test cases that run against each of them: mix one
+of these into a TestCase ahead of the shared tests, which call
+make_repository() from their setUp.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class MemoryBackend:
+    def make_repository(self):
+        from CDRepository import CDRepository
+        return CDRepository()
+
+class PlainBackend:
+    """The reference repository in ICDRepository.py, which uses the interface's fallbacks."""
+
+    def make_repository(self):
+        from ICDRepository import CDRepository as PlainRepository
+        return PlainRepository()
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class ColumnarBackend:
+    def make_repository(self):
+        from ColumnarCDRepository import ColumnarCDRepository
+        # Starts small so the tests also cover growing the columns
+        return ColumnarCDRepository(capacity=2)
+
+class SQLiteBackend:
+    """A database in a temporary directory, closed and removed after each test."""
+
+    def make_repository(self):
+        from SQLiteCDRepository import SQLiteCDRepository
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        repo = SQLiteCDRepository(os.path.join(tmp_dir, "library.db"))
+        self.addCleanup(repo.close)
+        return repo
@@ -0,0 +1,106 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+from BackgroundSaver import BackgroundSaver
+from CDRepository import CDRepository
+from CDService import CDService
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+class TestBackgroundSaver(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "library.json")
+        self.service = CDService(CDRepository())
+        self.service.add("First", 700, 52, 0, 1, "Data")
+        self.saver = None
+
+    def tearDown(self):
+        if self.saver is not None:
+            self.saver.stop(flush=False)
+        for name in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, name))
+        os.rmdir(self.tmp_dir)
+
+    def make_saver(self, **kwargs):
+        options = dict(delay=0.2, max_delay=5.0, poll=0.01)
+        options.update(kwargs)
+        self.saver = BackgroundSaver(self.service, self.path, **options)
+        return self.saver
+
+    def saved_names(self):
+        with open(self.path) as f:
+            return [cd["name"] for cd in json.load(f)["cds"]]
+
+    def test_save_now_runs_in_background(self):
+        saver = self.make_saver(autosave=False).start()
+        self.assertEqual(saver.status()["state"], "idle")
+        self.service.add("Second", 700, 52, 0, 1, "Data")
+        self.assertEqual(saver.status()["state"], "pending")
+        saver.save_now()
+        wait_for(lambda: saver.status()["saves"] == 1)
+        status = saver.status()
+        self.assertEqual(status["state"], "idle")
+        self.assertIsNotNone(status["last_seconds"])
+        self.assertEqual(self.saved_names(), ["First", "Second"])
+
+    def test_burst_of_changes_is_saved_once(self):
+        saver = self.make_saver()
+        saver.mark_saved()
+        saver.start()
+        for i in range(20):
+            self.service.add(f"Burst {i}", 700, 52, 0, 1, "Data")
+        wait_for(lambda: saver.status()["saves"] == 1)
+        time.sleep(0.3)
+        self.assertEqual(saver.status()["saves"], 1)
+        self.assertEqual(len(self.saved_names()), 21)
+
+    def test_max_delay_bounds_a_long_burst(self):
+        saver = self.make_saver(delay=10.0, max_delay=0.2)
+        saver.mark_saved()
+        saver.start()
+        deadline = time.monotonic() + 5
+        while saver.status()["saves"] == 0 and time.monotonic() < deadline:
+            self.service.add("Busy", 700, 52, 0, 1, "Data")
+            time.sleep(0.01)
+        self.assertEqual(saver.status()["saves"], 1)
+
+    def test_stop_flushes_pending_changes(self):
+        saver = self.make_saver(delay=60.0)
+        saver.mark_saved()
+        saver.start()
+        self.service.add("Late", 700, 52, 0, 1, "Data")
+        saver.stop()
+        self.assertEqual(self.saved_names(), ["First", "Late"])
+
+    def test_failed_save_is_reported(self):
+        self.path = os.path.join(self.tmp_dir, "missing", "library.json")
+        saver = self.make_saver(autosave=False).start()
+        saver.save_now()
+        wait_for(lambda: saver.status()["state"] == "failed")
+        self.assertIn("library.json", saver.status()["last_error"])
+
+    def test_capture_is_unaffected_by_later_changes(self):
+        write = self.service.capture_save(self.path)
+        self.service.add("After", 700, 52, 0, 1, "Data")
+        self.service.delete_cd(1)
+        self.assertTrue(write())
+        self.assertEqual(self.saved_names(), ["First"])
+
+if __name__ == '__main__':
+    unittest.main()
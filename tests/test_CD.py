@@ -29,6 +29,16 @@ class TestCD(unittest.TestCase):
         self.assertEqual(self.cd.session_type, "Data")
         self.assertTrue(self.cd.getOpenSession)  # Should be open since type is Data
 
+    def test_compact_layout(self):
+        self.assertFalse(hasattr(self.cd, "__dict__"))
+        other = CD(2, "Other", 700.0, 52, 0.0, 1, "".join(["Da", "ta "]))
+        self.assertIs(other.session_type, self.cd.session_type)
+
+    def test_accepts_saved_fields(self):
+        # Saved libraries include derived fields, which are ignored
+        cd = CD(**self.cd.to_dict())
+        self.assertEqual(cd.to_dict(), self.cd.to_dict())
+
     def test_get_free_space(self):
         self.assertEqual(self.cd.getFreeSpace, 500.0)
 
@@ -43,6 +53,11 @@ class TestCD(unittest.TestCase):
         self.assertEqual(self.cd.session_type, "Data")
         self.assertTrue(self.cd.getOpenSession)
 
+    def test_set_occupied_space(self):
+        self.cd.set_occupied_space(650.0)
+        self.assertEqual(self.cd.occupied_space, 650.0)
+        self.assertEqual(self.cd.getFreeSpace, 50.0)
+
     def test_to_dict(self):
         expected_dict = {
             "id": 1,
@@ -0,0 +1,103 @@
+import unittest
+import os
+import sys
+import csv
+import tempfile
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+from CD import CD
+from CDInstrumentation import CallStats, Metrics, instrument
+from CDRepository import CDRepository
+from CDService import CDService
+
+class TestCDInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.repo = instrument(CDRepository(), "repository", self.metrics)
+        self.service = instrument(CDService(self.repo), "service", self.metrics)
+
+    def test_records_calls_and_items(self):
+        for i in range(3):
+            self.service.add(f"Disc {i}", 700, 52, 0, 1, "Data")
+        self.assertEqual(len(self.service.sortByName(limit=2)), 2)
+        stats = self.metrics.snapshot()
+        self.assertEqual(stats["service.add"]["calls"], 3)
+        self.assertEqual(stats["repository.add"]["calls"], 3)
+        self.assertEqual(stats["repository.get_next_id"]["calls"], 3)
+        self.assertEqual(stats["service.sortByName"]["items"], 2)
+        self.assertEqual(stats["repository.getSorted"]["items"], 2)
+        self.assertGreater(stats["service.add"]["total_ms"], 0)
+
+    def test_records_items_scanned(self):
+        for i in range(4):
+            self.service.add(f"Disc {i}", 700, 52, 0, 1, "Finalized" if i == 0 else "Data")
+        self.assertEqual(len(self.service.get_open_sessions()), 3)
+        self.service.sortByName()                      # read from an index
+        self.assertEqual(len(list(self.repo.iterChunks(chunk_size=2))), 2)
+        self.assertEqual(self.service.update_statuses({1: True, 2: True}), {1: True, 2: True})
+        stats = self.metrics.snapshot()
+        # The service call includes the scans of the repository calls it makes
+        self.assertEqual(stats["repository.getOpenSessions"]["scanned"], 4)
+        self.assertEqual(stats["service.get_open_sessions"]["scanned"], 4)
+        self.assertEqual(stats["repository.getSorted"]["scanned"], 0)
+        self.assertEqual(stats["repository.iterChunks"]["scanned"], 4)
+        self.assertEqual(stats["service.update_statuses"]["items"], 2)
+        # Scans outside an instrumented call are not recorded anywhere
+        self.repo.target.getOpenSessions()
+        self.assertEqual(self.metrics.snapshot()["repository.getOpenSessions"]["calls"], 1)
+
+    def test_errors_and_generators(self):
+        with self.assertRaises(KeyError):
+            self.repo.getSorted("colour")
+        self.assertEqual(self.metrics.snapshot()["repository.getSorted"]["errors"], 1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            library = os.path.join(tmp_dir, "library.json")
+            self.repo.add(CD(1, "Disc", 700, 52, 0, 1, "Data"))
+            self.repo.uploadData(library)
+            progress = self.service.iter_load(library)
+            # Nothing is recorded until the generator finishes
+            self.assertNotIn("service.iter_load", self.metrics.snapshot())
+            self.assertEqual(len(list(progress)), 1)
+        self.assertEqual(self.metrics.snapshot()["service.iter_load"]["items"], 1)
+
+    def test_attributes_pass_through(self):
+        self.assertIs(self.service.target._repository, self.repo)
+        self.assertEqual(self.repo.get_next_id.__name__, "get_next_id")
+
+    def test_percentiles(self):
+        stats = CallStats()
+        for _ in range(98):
+            stats.record(0.001, 0, False)
+        stats.record(0.1, 0, False)
+        stats.record(0.2, 0, False)
+        self.assertAlmostEqual(stats.percentile(0.50), 0.001, delta=0.0001)
+        self.assertAlmostEqual(stats.percentile(0.99), 0.1, delta=0.01)
+        self.assertEqual(stats.percentile(1.0), 0.2)
+        self.assertEqual(CallStats().percentile(0.5), 0.0)
+
+    def test_export_csv(self):
+        self.service.get_all_cds()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "report.csv")
+            self.metrics.export_csv(path)
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows[0][:5], ['Method', 'Calls', 'Errors', 'Items (Returned)', 'Items (Scanned)'])
+        self.assertEqual([row[0] for row in rows[1:]], ["repository.getAll", "service.get_all_cds"])
+
+    def test_enabled_from_config(self):
+        service = CDService.from_config({"backend": "memory", "library": "unused.json",
+                                         "journal": False, "instrument": True})
+        service.get_all_cds()
+        from CDInstrumentation import METRICS
+        self.assertIn("service.get_all_cds", METRICS.snapshot())
+        METRICS.reset()
+
+if __name__ == '__main__':
+    unittest.main()
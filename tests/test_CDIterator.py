@@ -0,0 +1,106 @@
+import unittest
+import os
+import sys
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+from CD import CD
+from CDIterator import CDIterator
+from SQLiteCDRepository import where_sql
+from tests.backends import ColumnarBackend, MemoryBackend, SQLiteBackend
+
+def sample_cds():
+    return [
+        CD(1, "Blue Train", 700, 48, 650, 1, "Finalized"),   # 50 free
+        CD(2, "Kind of Blue", 700, 52, 100, 2, "Data"),     # 600 free
+        CD(3, "Giant Steps", 650, 24, 400, 1, "Audio"),     # 250 free
+        CD(4, "Mingus Ah Um", 4700, 16, 4000, 3, "Data"),   # 700 free
+        CD(5, "Time Out", 700, 24, 500, 1, "Video"),        # 200 free
+    ]
+
+WHERE = [("free_space", ">", 100), ("session_type", "in", ["Data", "Audio", "Video"])]
+FIELDS = ("id", "name", "free_space", "is_open")
+
+class TestCDIterator(unittest.TestCase):
+    def test_list_source_keeps_old_interface(self):
+        it = CDIterator(sample_cds(), chunk_size=2)
+        ids = []
+        while it.hasNext():
+            ids.append(it.next().id)
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+        self.assertIsNone(it.next())
+
+    def test_list_source_filters_and_projects(self):
+        it = CDIterator(sample_cds(), where=WHERE, fields=("id", "name"), chunk_size=2)
+        self.assertEqual(list(it), [{"id": 2, "name": "Kind of Blue"}, {"id": 3, "name": "Giant Steps"},
+                                    {"id": 4, "name": "Mingus Ah Um"}, {"id": 5, "name": "Time Out"}])
+
+    def test_chunks_resume_after_next(self):
+        it = CDIterator(sample_cds(), chunk_size=2)
+        self.assertEqual(next(it).id, 1)
+        self.assertEqual([[cd.id for cd in chunk] for chunk in it.chunks()], [[2], [3, 4], [5]])
+
+    def test_contains_ignores_case(self):
+        it = CDIterator(sample_cds(), where=[("name", "contains", "BLUE")])
+        self.assertEqual([cd.id for cd in it], [1, 2])
+
+    def test_unknown_field_or_operator(self):
+        with self.assertRaises(ValueError):
+            CDIterator(sample_cds(), where=[("colour", "==", "red")])
+        with self.assertRaises(ValueError):
+            CDIterator(sample_cds(), where=[("size", "~", 1)])
+        with self.assertRaises(ValueError):
+            CDIterator(sample_cds(), fields=("colour",))
+
+    def test_where_sql(self):
+        self.assertEqual(where_sql([]), ("1", []))
+        self.assertEqual(where_sql([("size", "==", 700), ("session_type", "in", [])]), ("size = ? AND 0", [700]))
+        self.assertEqual(where_sql([("name", "contains", "50%")]),
+                         ("lower(name) LIKE ? ESCAPE '\\'", ["%50\\%%"]))
+
+class RepositoryIterationTests:
+    """Every backend streams the same CDs as the list filter, in bounded chunks."""
+
+    def setUp(self):
+        self.repo = self.make_repository()
+        for cd in sample_cds():
+            self.repo.add(cd)
+
+    def test_chunks_are_bounded(self):
+        chunks = list(CDIterator(self.repo, chunk_size=2).chunks())
+        self.assertTrue(all(len(chunk) <= 2 for chunk in chunks))
+        self.assertEqual(sorted(cd.id for chunk in chunks for cd in chunk), [1, 2, 3, 4, 5])
+
+    def test_pushdown_matches_python_filter(self):
+        expected = list(CDIterator(sample_cds(), where=WHERE, fields=FIELDS))
+        pushed = list(CDIterator(self.repo, where=WHERE, fields=FIELDS, chunk_size=2))
+        self.assertEqual(sorted(pushed, key=lambda record: record["id"]), expected)
+
+    def test_name_and_open_conditions(self):
+        where = [("name", "contains", "blue"), ("is_open", "==", True)]
+        self.assertEqual([cd.id for cd in CDIterator(self.repo, where=where)], [2])
+
+class TestCDRepositoryIteration(MemoryBackend, RepositoryIterationTests, unittest.TestCase):
+    def test_change_during_iteration_raises(self):
+        it = CDIterator(self.repo, chunk_size=2)
+        next(it)
+        self.repo.delete(5)
+        with self.assertRaises(RuntimeError):
+            list(it)
+
+class TestColumnarIteration(ColumnarBackend, RepositoryIterationTests, unittest.TestCase):
+    pass
+
+class TestSQLiteIteration(SQLiteBackend, RepositoryIterationTests, unittest.TestCase):
+    def test_changes_between_chunks_do_not_shift_pages(self):
+        it = CDIterator(self.repo, chunk_size=2)
+        first = [next(it).id, next(it).id]
+        self.repo.delete(1)
+        self.assertEqual(first + [cd.id for cd in it], [1, 2, 3, 4, 5])
+
+if __name__ == '__main__':
+    unittest.main()
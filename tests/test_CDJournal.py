@@ -0,0 +1,52 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CDJournal import CDJournal
+
+class TestCDJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.snapshot = os.path.join(self.tmp_dir, "library.json")
+        self.journal = CDJournal(self.snapshot)
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_append_and_read(self):
+        self.journal.append({"op": "delete", "id": 1})
+        self.journal.append({"op": "finalize", "id": 2, "value": True})
+        self.journal.flush()
+        self.assertEqual(list(CDJournal(self.snapshot).read()),
+                         [{"op": "delete", "id": 1}, {"op": "finalize", "id": 2, "value": True}])
+
+    def test_rotate_keeps_both_logs_until_discarded(self):
+        self.journal.append({"op": "delete", "id": 1})
+        self.journal.rotate()
+        self.journal.append({"op": "delete", "id": 2})
+        self.journal.flush()
+        self.assertEqual([op["id"] for op in self.journal.read()], [1, 2])
+
+        # A second rotation before compaction finishes keeps everything
+        self.journal.rotate()
+        self.assertEqual([op["id"] for op in self.journal.read()], [1, 2])
+
+        self.journal.discard_rotated()
+        self.assertEqual(list(self.journal.read()), [])
+
+    def test_skips_torn_write(self):
+        self.journal.close()
+        with open(self.journal.path, 'w') as f:
+            f.write('{"op": "delete", "id": 1}\n{"op": "del')
+        self.journal = CDJournal(self.snapshot)
+        self.journal.append({"op": "delete", "id": 3})
+        self.journal.flush()
+        self.assertEqual([op["id"] for op in self.journal.read()], [1, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import os
+import random
+import sys
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+from CD import CD
+from CDFilter import FIELDS, compile_filter
+from CDQuery import CDQuery, order_key
+from tests.backends import ColumnarBackend, MemoryBackend, PlainBackend, SQLiteBackend
+
+def random_cds(count=200, seed=3):
+    rng = random.Random(seed)
+    cds = []
+    for cd_id in range(1, count + 1):
+        size = rng.choice((650.0, 700.0, 4700.0))
+        cds.append(CD(cd_id, f"{rng.choice(['Blue', 'Red', 'Green'])} {rng.randrange(50)}", size,
+                      rng.choice((8, 16, 24, 48, 52)), float(rng.randrange(int(size))),
+                      rng.randint(1, 3), rng.choice(["Data", "Audio", "Finalized"])))
+    return cds
+
+QUERIES = [
+    CDQuery(),
+    CDQuery().where("is_open", "==", True).where("free_space", ">", 200)
+             .order_by("encryption_speed", descending=True).limit(50),
+    CDQuery().where("free_space", ">=", 100).where("free_space", "<", 300).order_by("free_space"),
+    CDQuery().where("occupied_space", "<=", 100).order_by("name", descending=True).skip(2).limit(5),
+    CDQuery().where("session_type", "in", ["Data", "Audio"]).order_by("session_type").limit(20),
+    CDQuery().where("name", "contains", "blue").order_by("name").skip(10).limit(10),
+    CDQuery().where("id", "in", [5, 7, 999]).order_by("id"),
+    CDQuery().order_by("size", descending=True).skip(20).limit(10),
+    CDQuery().order_by("is_open").limit(15).select("id", "is_open", "free_space"),
+]
+
+def expected(cds, query):
+    keep = compile_filter(query.conditions)
+    result = [cd for cd in cds if keep(cd)]
+    result.sort(key=order_key(query.order or "id", query.descending))
+    result = result[query.offset:query.stop]
+    if query.fields is not None:
+        return [{field: FIELDS[field](cd) for field in query.fields} for cd in result]
+    return [cd.to_dict() for cd in result]
+
+class TestCDQuery(unittest.TestCase):
+    def test_builder_is_immutable_and_hashable(self):
+        base = CDQuery().where("size", ">", 100)
+        limited = base.limit(10)
+        self.assertIsNone(base.count)
+        self.assertEqual(limited.stop, 10)
+        self.assertEqual(hash(base.where("session_type", "in", ["Data"])),
+                         hash(base.where("session_type", "in", ("Data",))))
+        self.assertEqual(base, CDQuery([("size", ">", 100)]))
+
+    def test_invalid_queries(self):
+        with self.assertRaises(ValueError):
+            CDQuery().where("colour", "==", "red")
+        with self.assertRaises(ValueError):
+            CDQuery().order_by("colour")
+        with self.assertRaises(ValueError):
+            CDQuery().limit(-1)
+
+    def test_descending_text_keeps_id_ties_ascending(self):
+        cds = [CD(1, "A", 1, 1, 0, 1, "Data"), CD(2, "B", 1, 1, 0, 1, "Data"), CD(3, "B", 1, 1, 0, 1, "Data")]
+        self.assertEqual([cd.id for cd in sorted(cds, key=order_key("name", True))], [2, 3, 1])
+
+class BackendQueryTests:
+    """Every planner returns what filtering and sorting the whole list would."""
+
+    def setUp(self):
+        self.cds = random_cds()
+        self.repo = self.make_repository()
+        for cd in random_cds():
+            self.repo.add(cd)
+
+    def test_queries_match_brute_force(self):
+        for query in QUERIES:
+            result = self.repo.runQuery(query)
+            if query.fields is None:
+                result = [cd.to_dict() for cd in result]
+            if query.order is None:
+                result.sort(key=lambda record: record["id"])
+            with self.subTest(query=query):
+                self.assertEqual(result, expected(self.cds, query))
+
+    def test_unordered_id_lookup_pages_in_id_order(self):
+        # Without an order, every backend pages through the matches by ID
+        query = CDQuery().where("id", "in", [40, 3, 17, 999, 8, 25]).skip(1).limit(3)
+        self.assertEqual([cd.id for cd in self.repo.runQuery(query)], [8, 17, 25])
+
+class TestCDRepositoryQueries(MemoryBackend, BackendQueryTests, unittest.TestCase):
+    def test_planner_choices(self):
+        explain = lambda query: self.repo.planQuery(query)[0]
+        self.assertEqual(explain(CDQuery().where("id", "==", 4)), "lookup by id")
+        self.assertEqual(explain(CDQuery().order_by("name").limit(10)), "index order on name")
+        self.assertTrue(explain(CDQuery().where("free_space", "<", 10)).startswith("index range on free_space"))
+        self.assertEqual(explain(CDQuery().where("session_type", "==", "Data")), "scan")
+        # Speed is indexed largest first only, so ascending speed needs a sort
+        self.assertEqual(explain(CDQuery().order_by("encryption_speed").limit(10)), "scan")
+
+class TestICDRepositoryFallbackQueries(PlainBackend, BackendQueryTests, unittest.TestCase):
+    pass
+
+class TestColumnarQueries(ColumnarBackend, BackendQueryTests, unittest.TestCase):
+    pass
+
+class TestSQLiteQueries(SQLiteBackend, BackendQueryTests, unittest.TestCase):
+    def test_explain_uses_sqlite_plan(self):
+        description = self.repo.planQuery(CDQuery().where("free_space", ">", 600).order_by("free_space"))[0]
+        self.assertIn("idx_cds_free_space", description)
+
+if __name__ == '__main__':
+    unittest.main()
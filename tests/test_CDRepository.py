@@ -2,7 +2,10 @@ import unittest
 import os
 import sys
 import json
-from unittest.mock import MagicMock
+import shutil
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -39,6 +42,112 @@ class TestCDRepository(unittest.TestCase):
         result = self.repo.delete(999)
         self.assertFalse(result)
 
+    def test_find_by_id(self):
+        cd1 = CD(1, "One", 700, 52, 0, 1, "Data")
+        cd2 = CD(2, "Two", 700, 52, 0, 1, "Data")
+        self.repo.add(cd1)
+        self.repo.add(cd2)
+        self.assertIs(self.repo.find_by_id(2), cd2)
+        self.assertIsNone(self.repo.find_by_id(3))
+
+    def test_add_duplicate_id(self):
+        self.repo.add(CD(1, "Test", 700, 52, 0, 1, "Data"))
+        self.assertFalse(self.repo.add(CD(1, "Other", 700, 52, 0, 1, "Data")))
+        self.assertEqual(len(self.repo.getAll()), 1)
+        self.assertEqual(self.repo.find_by_id(1).name, "Test")
+
+    def test_add_batch(self):
+        self.repo.add(CD(1, "Existing", 700, 52, 0, 1, "Data"))
+        first = self.repo.reserve_ids(3)
+        self.assertEqual(first, 2)
+        self.assertEqual(self.repo.get_next_id(), 5)
+        batch = [CD(2, "Zulu", 700, 52, 600, 1, "Data"),
+                 CD(1, "Clash", 700, 52, 0, 1, "Data"),
+                 CD(4, "Alpha", 700, 52, 100, 1, "Data")]
+        self.assertEqual(self.repo.add_batch(batch), [True, False, True])
+        self.assertEqual(self.repo.find_by_id(1).name, "Existing")
+        self.assertEqual(self.repo.get_next_id(), 5)
+        self.assertEqual([cd.id for cd in self.repo.getSorted("name")], [4, 1, 2])
+        self.assertEqual([cd.id for cd in self.repo.getMostFreeSpace(1)], [1])
+
+    def test_delete_keeps_index_consistent(self):
+        for i in range(1, 6):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, 0, 1, "Data"))
+        self.assertTrue(self.repo.delete(2))
+        self.assertIsNone(self.repo.find_by_id(2))
+        # Every remaining CD can still be found and deleted
+        remaining = sorted(cd.id for cd in self.repo.getAll())
+        self.assertEqual(remaining, [1, 3, 4, 5])
+        for cd_id in remaining:
+            self.assertEqual(self.repo.find_by_id(cd_id).id, cd_id)
+        self.assertTrue(self.repo.delete(5))
+        self.assertTrue(self.repo.delete(1))
+        self.assertEqual([cd.id for cd in self.repo.getAll()], [3, 4])
+
+    def test_delete_keeps_insertion_order(self):
+        from ICDRepository import CDRepository as PlainRepository
+        for repo in (self.repo, PlainRepository()):
+            with self.subTest(repo=type(repo).__module__):
+                for cd_id in (3, 1, 6, 2, 5, 4):
+                    repo.add(CD(cd_id, f"CD {cd_id}", 700, 52, 0, 1, "Finalized" if cd_id == 5 else "Data"))
+                self.assertTrue(repo.delete(1))
+                self.assertEqual([cd.id for cd in repo.getAll()], [3, 6, 2, 5, 4])
+                repo.add(CD(7, "CD 7", 700, 52, 0, 1, "Data"))
+                self.assertTrue(repo.delete(3))
+                self.assertEqual([cd.id for cd in repo.getOpenSessions()], [6, 2, 4, 7])
+                self.assertEqual([cd.id for cd in repo.getAll()], [6, 2, 5, 4, 7])
+
+    def test_set_finalized(self):
+        self.repo.add(CD(1, "Test", 700, 52, 0, 1, "Data"))
+        self.assertTrue(self.repo.set_finalized(1, True))
+        self.assertFalse(self.repo.find_by_id(1).getOpenSession)
+        self.assertFalse(self.repo.set_finalized(999, True))
+
+    def test_set_finalized_batch(self):
+        self.repo.add(CD(1, "One", 700, 52, 0, 1, "Data"))
+        self.repo.add(CD(2, "Two", 700, 52, 0, 1, "Finalized"))
+        self.assertEqual(self.repo.set_finalized_batch({1: True, 2: False, 3: True}), {1: True, 2: True, 3: False})
+        self.assertEqual([cd.id for cd in self.repo.getOpenSessions()], [2])
+
+    def test_version_moves_on_every_change(self):
+        versions = [self.repo.get_version()]
+        self.repo.add(CD(1, "One", 700, 52, 0, 1, "Data"))
+        versions.append(self.repo.get_version())
+        self.repo.find_by_id(1)
+        self.repo.getSorted("name")
+        self.assertEqual(self.repo.get_version(), versions[-1])
+        self.repo.set_finalized(1, True)
+        versions.append(self.repo.get_version())
+        self.repo.set_occupied_space(1, 10)
+        versions.append(self.repo.get_version())
+        self.assertFalse(self.repo.delete(2))
+        self.assertEqual(self.repo.get_version(), versions[-1])
+        self.repo.delete(1)
+        versions.append(self.repo.get_version())
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_search_by_name_follows_changes(self):
+        self.repo.add(CD(1, "Kind of Blue", 700, 52, 0, 1, "Data"))
+        self.repo.add(CD(2, "Blue Train", 700, 52, 0, 1, "Data"))
+        self.assertEqual([cd.id for cd in self.repo.search_by_name("BLUE")], [2, 1])
+        self.repo.delete(2)
+        self.repo.add(CD(3, "Blue", 700, 52, 0, 1, "Data"))
+        self.assertEqual([cd.id for cd in self.repo.search_by_name("blue")], [3, 1])
+        self.assertEqual([cd.id for cd in self.repo.search_by_name("blue", limit=1)], [3])
+
+    def test_sorted_orderings_follow_add_and_delete(self):
+        self.repo.add(CD(1, "Beta", 650, 24, 0, 1, "Data"))
+        self.repo.add(CD(2, "Alpha", 700, 52, 0, 1, "Data"))
+        self.repo.add(CD(3, "Gamma", 700, 48, 0, 1, "Data"))
+        self.assertEqual([cd.id for cd in self.repo.getSorted("name")], [2, 1, 3])
+        self.assertEqual([cd.id for cd in self.repo.getSorted("size")], [2, 3, 1])
+        self.assertEqual([cd.id for cd in self.repo.getSorted("encryption_speed")], [2, 3, 1])
+
+        self.repo.delete(2)
+        self.assertEqual([cd.id for cd in self.repo.getSorted("name")], [1, 3])
+        self.assertEqual([cd.id for cd in self.repo.getSorted("size", limit=1)], [3])
+        self.assertEqual([cd.id for cd in self.repo.getSorted("encryption_speed", offset=1)], [1])
+
     def test_get_free_space(self):
         cd1 = CD(1, "Full", 700, 52, 700, 1, "Data") # 0 free
         cd2 = CD(2, "Empty", 700, 52, 0, 1, "Data")  # 700 free
@@ -49,6 +158,66 @@ class TestCDRepository(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0].name, "Empty")
 
+    def test_get_free_space_boundaries(self):
+        for i, occupied in enumerate([700, 500, 400, 200, 0], start=1):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, occupied, 1, "Data"))  # free: 0, 200, 300, 500, 700
+
+        self.assertEqual([cd.id for cd in self.repo.getFreeSpace(200)], [3, 4, 5])
+        self.assertEqual([cd.id for cd in self.repo.getFreeSpaceBetween(200, 500)], [3, 4])
+        self.assertEqual([cd.id for cd in self.repo.getFreeSpaceBetween(0, 300)], [2, 3])
+        self.assertEqual([cd.id for cd in self.repo.getMostFreeSpace(2)], [5, 4])
+
+    def test_free_space_index_follows_changes(self):
+        self.repo.add(CD(1, "A", 700, 52, 600, 1, "Data"))  # 100 free
+        self.repo.add(CD(2, "B", 700, 52, 100, 1, "Data"))  # 600 free
+
+        self.assertTrue(self.repo.set_occupied_space(2, 700))
+        self.assertEqual(self.repo.find_by_id(2).getFreeSpace, 0)
+        self.assertEqual([cd.id for cd in self.repo.getMostFreeSpace(1)], [1])
+        self.assertFalse(self.repo.set_occupied_space(1, 800))
+        self.assertFalse(self.repo.set_occupied_space(99, 10))
+
+        self.repo.delete(1)
+        self.assertEqual(self.repo.getFreeSpace(-1), [self.repo.find_by_id(2)])
+
+    def test_get_summary(self):
+        self.repo.add(CD(1, "A", 700, 52, 600, 1, "Data"))
+        self.repo.add(CD(2, "B", 650, 52, 100, 1, "Audio"))
+        self.repo.add(CD(3, "C", 700, 52, 300, 1, "Data"))
+
+        summary = self.repo.getSummary(top_k=2)
+        self.assertEqual(summary["total_cds"], 3)
+        self.assertEqual(summary["total_size"], 2050)
+        self.assertEqual(summary["total_occupied"], 1000)
+        self.assertEqual(summary["session_types"], {"Data": 2, "Audio": 1})
+        self.assertEqual([cd.id for cd in summary["top_occupied"]], [1, 3])
+
+    def test_summary_follows_changes(self):
+        from ICDRepository import ICDRepository
+        for i in range(1, 8):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, 50 * i, 1, "Data" if i % 2 else "Audio"))
+        self.repo.delete(7)
+        self.repo.set_finalized(1, True)
+        self.repo.set_occupied_space(2, 650)
+        self.repo.add_batch([CD(8, "CD 8", 650, 52, 325.5, 1, "Mixed")])
+
+        def summary(repo):
+            result = repo.getSummary(3)
+            result["top_occupied"] = [cd.id for cd in result["top_occupied"]]
+            return result
+
+        # Same figures as a full recomputation
+        expected = summary(type("Scan", (), {"getAll": lambda _: self.repo.getAll(),
+                                             "getSummary": ICDRepository.getSummary})())
+        self.assertEqual(summary(self.repo), expected)
+        self.assertEqual(expected["top_occupied"], [2, 8, 6])
+        self.assertEqual(expected["session_types"], {"Finalized": 1, "Audio": 3, "Data": 2, "Mixed": 1})
+
+        self.repo.uploadData(self.test_file)
+        loaded = CDRepository()
+        loaded.loadData(self.test_file)
+        self.assertEqual(summary(loaded), expected)
+
     def test_get_open_sessions(self):
         cd1 = CD(1, "Open", 700, 52, 100, 1, "Data")
         cd2 = CD(2, "Closed", 700, 52, 100, 1, "Finalized")
@@ -78,6 +247,233 @@ class TestCDRepository(unittest.TestCase):
         self.assertEqual(len(loaded_cds), 1)
         self.assertEqual(loaded_cds[0].name, "Saved CD")
         self.assertEqual(loaded_cds[0].occupied_space, 123)
+        self.assertIs(new_repo.find_by_id(1), loaded_cds[0])
+        self.assertEqual(new_repo.getSorted("name"), loaded_cds)
+
+    def test_save_and_load_json_lines(self):
+        path = "test_library.jsonl"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        for i in range(1, 4):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, 100 * i, 1, "Data"))
+        self.assertTrue(self.repo.uploadData(path))
+
+        new_repo = CDRepository()
+        self.assertTrue(new_repo.loadData(path))
+        self.assertEqual([cd.to_dict() for cd in new_repo.getAll()],
+                         [cd.to_dict() for cd in self.repo.getAll()])
+        self.assertEqual(new_repo.get_next_id(), 4)
+
+    def test_iter_load_reports_progress(self):
+        for i in range(1, 26):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, i, 1, "Data"))
+        self.repo.uploadData(self.test_file)
+
+        new_repo = CDRepository()
+        progress = list(new_repo.iterLoad(self.test_file, chunk_size=10))
+        self.assertEqual([loaded for loaded, _, _ in progress], [10, 20, 25])
+        _, bytes_read, total_bytes = progress[-1]
+        self.assertEqual(bytes_read, total_bytes)
+        # Indexes are rebuilt after a streaming load
+        self.assertEqual([cd.id for cd in new_repo.getMostFreeSpace(2)], [1, 2])
+        self.assertTrue(new_repo.add(CD(26, "New", 700, 52, 0, 1, "Data")))
+        self.assertEqual(new_repo.getMostFreeSpace(1)[0].id, 26)
+
+    def test_save_and_load_compressed(self):
+        for i in range(1, 30):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, i, 1, "Data"))
+        plain_size = None
+        for codec in ("none", "gzip", "bz2", "lzma"):
+            for path in (self.test_file, "test_library.jsonl"):
+                with self.subTest(codec=codec, path=path):
+                    self.addCleanup(lambda path=path: os.path.exists(path) and os.remove(path))
+                    repo = CDRepository(codec=codec)
+                    repo.add_batch(self.repo.getAll())
+                    self.assertTrue(repo.uploadData(path))
+                    if path == self.test_file:
+                        if codec == "none":
+                            plain_size = os.path.getsize(path)
+                        else:
+                            self.assertLess(os.path.getsize(path), plain_size / 2)
+
+                    # The codec is detected from the file, whatever its name
+                    loaded = CDRepository()
+                    progress = list(loaded.iterLoad(path, chunk_size=10))
+                    self.assertEqual(progress[-1][1], progress[-1][2])
+                    self.assertEqual([cd.to_dict() for cd in loaded.getAll()],
+                                     [cd.to_dict() for cd in self.repo.getAll()])
+                    self.assertEqual(loaded.get_next_id(), 30)
+
+    def test_codec_from_extension(self):
+        path = "test_library.jsonl.gz"
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        self.repo.add(CD(1, "Zipped", 700, 52, 0, 1, "Data"))
+        self.assertTrue(self.repo.uploadData(path))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(2), b"\x1f\x8b")
+        loaded = CDRepository()
+        self.assertTrue(loaded.loadData(path))
+        self.assertEqual(loaded.find_by_id(1).name, "Zipped")
+        with self.assertRaises(ValueError):
+            CDRepository(codec="zip")
+
+    def test_search_by_name_after_load(self):
+        self.repo.add(CD(1, "Kind of Blue", 700, 52, 0, 1, "Data"))
+        self.repo.uploadData(self.test_file)
+        loaded = CDRepository()
+        loaded.loadData(self.test_file)
+        self.assertEqual([cd.id for cd in loaded.search_by_name("kind")], [1])
+
+    def test_failed_load_keeps_library(self):
+        self.repo.add(CD(1, "Kept", 700, 52, 0, 1, "Data"))
+        with open(self.test_file, 'w') as f:
+            f.write('{"cds": [{"id": 5, "name": "Broken"')
+        self.assertFalse(self.repo.loadData(self.test_file))
+        self.assertEqual([cd.name for cd in self.repo.getAll()], ["Kept"])
+        self.assertEqual(self.repo.getSorted("name")[0].name, "Kept")
+
+    def test_failed_streaming_load_puts_library_back(self):
+        source = CDRepository()
+        for i in range(1, 26):
+            source.add(CD(i, f"CD {i}", 700, 52, 0, 1, "Data"))
+        source.uploadData(self.test_file)
+        with open(self.test_file, 'r+') as f:
+            f.truncate(os.path.getsize(self.test_file) - 200)  # cut into the last chunk
+
+        self.repo.add(CD(1, "Kept", 700, 52, 0, 1, "Data"))
+        progress = self.repo.iterLoad(self.test_file, chunk_size=10)
+        self.assertEqual(next(progress)[0], 10)
+        self.assertEqual(self.repo.count(), 10)  # partly loaded while streaming
+        with self.assertRaises(ValueError):
+            list(progress)
+        self.assertEqual([cd.name for cd in self.repo.getAll()], ["Kept"])
+        self.assertEqual(self.repo.get_next_id(), 2)
+
+        # Stopping early also keeps the previous library
+        progress = self.repo.iterLoad(self.test_file, chunk_size=10)
+        next(progress)
+        progress.close()
+        self.assertEqual([cd.name for cd in self.repo.getAll()], ["Kept"])
+
+class TestJournaledCDRepository(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "library.json")
+        # Removed last, after the repositories opened by a test are closed
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.repo = CDRepository(journaled=True, compact_every=3)
+        self.repo.loadData(self.path)
+
+    def tearDown(self):
+        self.repo.close()
+
+    def reopen(self):
+        """Loads the library again as after a crash: the journal was never folded in."""
+        self.repo._journal.close()
+        self.repo._journal = None
+        repo = CDRepository(journaled=True)
+        self.addCleanup(repo.close)
+        self.assertTrue(repo.loadData(self.path))
+        return repo
+
+    def test_changes_survive_without_snapshot(self):
+        self.repo.add(CD(1, "A", 700, 52, 100, 1, "Data"))
+        self.repo.add(CD(2, "B", 700, 52, 100, 1, "Data"))
+        self.repo.set_finalized(1, True)
+        self.repo.set_occupied_space(2, 650)
+        self.repo.delete(1)
+        self.assertTrue(self.repo.uploadData(self.path))
+
+        repo = self.reopen()
+        self.assertEqual([cd.to_dict() for cd in repo.getAll()],
+                         [cd.to_dict() for cd in self.repo.getAll()])
+        self.assertEqual(repo.get_next_id(), 3)
+
+    def test_save_only_flushes_the_journal(self):
+        self.repo.add(CD(1, "A", 700, 52, 100, 1, "Data"))
+        self.repo.uploadData(self.path)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(os.path.exists(self.path + ".journal"))
+
+    def test_compaction_writes_snapshot(self):
+        for i in range(1, 5):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, 100, 1, "Data"))
+        self.assertTrue(self.repo.compact(wait=True))
+        with open(self.path) as f:
+            self.assertEqual(len(json.load(f)["cds"]), 4)
+        self.assertFalse(os.path.exists(self.path + ".journal.1"))
+
+        self.repo.set_finalized(2, True)
+        self.repo.uploadData(self.path)
+        repo = self.reopen()
+        self.assertEqual(len(repo.getAll()), 4)
+        self.assertFalse(repo.find_by_id(2).getOpenSession)
+
+    def test_replay_after_interrupted_compaction(self):
+        self.repo.add(CD(1, "A", 700, 52, 100, 1, "Data"))
+        self.repo.uploadData(self.path)
+        self.repo._journal.rotate()
+        # Snapshot already contains the rotated operations, but the rotated
+        # log was never removed: replaying it again must be harmless
+        self.repo._writeLibrary(self.path, self.repo.getAll(), self.repo.get_next_id())
+        self.repo.delete(1)
+        self.repo.add(CD(2, "B", 700, 52, 100, 1, "Data"))
+        self.repo.uploadData(self.path)
+
+        repo = self.reopen()
+        self.assertEqual([cd.id for cd in repo.getAll()], [2])
+        self.assertEqual(repo.get_next_id(), 3)
+
+    def test_close_folds_journal_into_library(self):
+        from CDJournal import has_pending
+        self.repo.add(CD(1, "A", 700, 52, 100, 1, "Data"))
+        self.repo.set_finalized(1, True)
+        self.repo.uploadData(self.path)
+        self.assertTrue(has_pending(self.path))
+        self.repo.close()
+        self.assertFalse(has_pending(self.path))
+
+        plain = CDRepository()
+        self.assertTrue(plain.loadData(self.path))
+        self.assertFalse(plain.find_by_id(1).getOpenSession)
+
+    def test_other_backends_reject_pending_journal(self):
+        from CDConfig import create_repository
+        from SQLiteCDRepository import SQLiteCDRepository
+        self.repo.add(CD(1, "A", 700, 52, 100, 1, "Data"))
+        self.repo.uploadData(self.path)
+        with self.assertRaisesRegex(ValueError, "journaled changes"):
+            create_repository({"backend": "sqlite", "library": self.path})
+        repo = SQLiteCDRepository(os.path.join(self.tmp_dir, "library.db"))
+        self.addCleanup(repo.close)
+        with self.assertRaisesRegex(ValueError, "journaled changes"):
+            list(repo.iterLoad(self.path))
+
+    def test_reload_waits_for_running_compaction(self):
+        for i in range(1, 6):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, 100, 1, "Data"))
+        self.assertTrue(self.repo.compact(wait=True))
+        self.repo.add(CD(6, "CD 6", 700, 52, 100, 1, "Data"))
+        self.repo.set_finalized(1, True)
+        self.repo.uploadData(self.path)
+
+        write_library, open_journal = self.repo._writeLibrary, self.repo._openJournal
+
+        def slow_write(*args):
+            time.sleep(0.2)
+            write_library(*args)
+
+        def compaction_finishes_first(filepath):
+            # Without waiting, the load has read the old snapshot by now and
+            # the compaction then discards the rotated journal it still needs
+            if self.repo._compactor is not None:
+                self.repo._compactor.join()
+            open_journal(filepath)
+        with patch.object(self.repo, "_writeLibrary", side_effect=slow_write), \
+                patch.object(self.repo, "_openJournal", side_effect=compaction_finishes_first):
+            self.assertTrue(self.repo.compact())
+            self.assertTrue(self.repo.loadData(self.path))
+        self.assertEqual(len(self.repo.getAll()), 6)
+        self.assertFalse(self.repo.find_by_id(1).getOpenSession)
 
 if __name__ == '__main__':
     unittest.main()
@@ -9,6 +9,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.modules['streamlit'] = MagicMock()
 
 from CDService import CDService
+from CDRepository import CDRepository
 from CD import CD
 
 class TestCDService(unittest.TestCase):
@@ -36,50 +37,184 @@ class TestCDService(unittest.TestCase):
         self.assertIsInstance(args[0], CD)
         self.assertEqual(args[0].name, "New CD")
 
+    def test_add_many_streams_batches(self):
+        service = CDService(CDRepository())
+        service.add("Existing", 700.0, 48, 0.0, 1, "Data")
+        records = ({"name": f"Disc {i}", "size": 700.0, "encryption_speed": 48,
+                    "occupied_space": 100.0 * i, "session_count": 1, "session_type": "Data"}
+                   for i in range(9))
+        results = service.add_many(records, batch_size=4)
+        # 800 MB on a 700 MB disc is rejected without using up an ID
+        self.assertEqual(results, [2, 3, 4, 5, 6, 7, 8, 9, None])
+        self.assertEqual(service.add_many([{"name": "No size"}]), [None])
+        self.assertEqual(len(service.get_all_cds()), 9)
+        self.assertEqual(service.find_by_id(9).name, "Disc 7")
+        self.assertEqual(service._repository.get_next_id(), 10)
+
     def test_update_status(self):
-        # Mock finding a CD
-        mock_cd = MagicMock()
-        self.mock_repo.getAll.return_value = [mock_cd]
-        mock_cd.id = 1
-        
+        self.mock_repo.set_finalized.return_value = True
+
         # Call update_status
         result = self.service.update_status(1, True)
 
-        # Verify
+        # Verify the repository does the update (it keeps its indexes in sync)
         self.assertTrue(result)
-        mock_cd.set_finalized.assert_called_once_with(True)
+        self.mock_repo.set_finalized.assert_called_once_with(1, True)
 
     def test_update_status_not_found(self):
-        self.mock_repo.getAll.return_value = []
+        self.mock_repo.set_finalized.return_value = False
         result = self.service.update_status(999, True)
         self.assertFalse(result)
 
+    def test_update_statuses(self):
+        self.mock_repo.set_finalized_batch.return_value = {1: True, 2: False}
+        self.assertEqual(self.service.update_statuses({1: True, 2: False}), {1: True, 2: False})
+        self.mock_repo.set_finalized_batch.assert_called_once_with({1: True, 2: False})
+        self.assertEqual(self.service.update_statuses({}), {})
+        self.mock_repo.set_finalized_batch.assert_called_once()
+
+    def test_find_by_id(self):
+        cd = CD(1, "Found", 700, 52, 100, 1, "Data")
+        self.mock_repo.find_by_id.return_value = cd
+        self.assertIs(self.service.find_by_id(1), cd)
+        self.mock_repo.find_by_id.assert_called_once_with(1)
+        self.mock_repo.getAll.assert_not_called()
+
+    def _real_service(self, *cds):
+        repo = CDRepository()
+        for cd in cds:
+            repo.add(cd)
+        return CDService(repo)
+
     def test_sort_by_name(self):
         cd1 = CD(1, "B Album", 700, 52, 100, 1, "Data")
         cd2 = CD(2, "A Album", 700, 52, 100, 1, "Data")
-        self.mock_repo.getAll.return_value = [cd1, cd2]
+        service = self._real_service(cd1, cd2)
 
-        result = self.service.sortByName()
+        result = service.sortByName()
         self.assertEqual(result, [cd2, cd1])
 
     def test_sort_by_size(self):
         cd1 = CD(1, "Small", 100, 52, 50, 1, "Data")
         cd2 = CD(2, "Big", 700, 52, 50, 1, "Data")
-        self.mock_repo.getAll.return_value = [cd1, cd2]
+        service = self._real_service(cd1, cd2)
 
-        result = self.service.sortBySize()
+        result = service.sortBySize()
         self.assertEqual(result, [cd2, cd1]) # Reverse order (descending)
 
+    def test_sort_by_speed(self):
+        cd1 = CD(1, "Slow", 700, 16, 50, 1, "Data")
+        cd2 = CD(2, "Fast", 700, 52, 50, 1, "Data")
+        service = self._real_service(cd1, cd2)
+
+        self.assertEqual(service.sortBySpeed(), [cd2, cd1])
+
+    def test_sort_with_limit_and_offset(self):
+        cds = [CD(i, f"Album {i:02d}", 700, 52, 50, 1, "Data") for i in range(1, 11)]
+        service = self._real_service(*cds)
+
+        self.assertEqual(service.sortByName(limit=3), cds[:3])
+        self.assertEqual(service.sortByName(limit=3, offset=8), cds[8:])
+
+    def test_sort_uses_repository_ordering(self):
+        self.mock_repo.getSorted.return_value = ["some_cd"]
+        self.assertEqual(self.service.sortByName(5, 10), ["some_cd"])
+        self.mock_repo.getSorted.assert_called_once_with("name", 5, 10)
+        self.mock_repo.getAll.assert_not_called()
+
     def test_filter_by_free_space(self):
         self.mock_repo.getFreeSpace.return_value = ["some_cd"]
         result = self.service.filterByFreeSpace(200.0)
         self.mock_repo.getFreeSpace.assert_called_with(200.0)
         self.assertEqual(result, ["some_cd"])
 
+    def test_filter_by_free_space_range(self):
+        self.mock_repo.getFreeSpaceBetween.return_value = ["less_free", "more_free"]
+        result = self.service.filterByFreeSpace(100.0, 300.0)
+        self.mock_repo.getFreeSpaceBetween.assert_called_with(100.0, 300.0)
+        self.assertEqual(result, ["less_free", "more_free"])
+        self.assertEqual(self.service.filterByFreeSpace(100.0, 300.0, top=1), ["more_free"])
+
+    def test_filter_by_free_space_top(self):
+        cd1 = CD(1, "Roomy", 700, 52, 0, 1, "Data")
+        cd2 = CD(2, "Tight", 700, 52, 650, 1, "Data")
+        self.mock_repo.getMostFreeSpace.return_value = [cd1, cd2]
+        result = self.service.filterByFreeSpace(100.0, top=2)
+        self.mock_repo.getMostFreeSpace.assert_called_with(2)
+        self.assertEqual(result, [cd1])
+
+    def test_update_occupied_space(self):
+        self.mock_repo.set_occupied_space.return_value = True
+        self.assertTrue(self.service.update_occupied_space(1, 250.0))
+        self.mock_repo.set_occupied_space.assert_called_once_with(1, 250.0)
+
+    def test_get_summary(self):
+        self.mock_repo.getSummary.return_value = {"total_cds": 0}
+        self.assertEqual(self.service.get_summary(top_k=3), {"total_cds": 0})
+        self.mock_repo.getSummary.assert_called_once_with(3)
+
     def test_delete_cd(self):
         self.mock_repo.delete.return_value = True
         self.assertTrue(self.service.delete_cd(1))
         self.mock_repo.delete.assert_called_with(1)
 
+class TestCDServicePaging(unittest.TestCase):
+    def setUp(self):
+        self.service = CDService(CDRepository())
+        for name in ["Delta", "alpha", "Charlie", "Bravo", "alphabet"]:
+            self.service.add(name, 700, 52, 0, 1, "Data")
+
+    def names(self, cds):
+        return [cd.name for cd in cds]
+
+    def test_pages_follow_sort(self):
+        self.assertEqual(self.service.count_cds(), 5)
+        self.assertEqual(self.names(self.service.get_page("id", 0, 2)), ["Delta", "alpha"])
+        self.assertEqual(self.names(self.service.get_page("id", 4, 2)), ["alphabet"])
+        self.assertEqual(self.names(self.service.get_page("name", 1, 2)), ["Charlie", "Delta"])
+        self.assertEqual(self.service.get_page("name", 10, 2), [])
+
+    def test_pages_with_search(self):
+        self.assertEqual(self.service.count_cds("ALPHA"), 2)
+        self.assertEqual(self.names(self.service.get_page("name", 0, 1, search="alpha")), ["alpha"])
+        self.assertEqual(self.names(self.service.get_page("id", 0, 10, search="3")), ["Charlie"])
+        self.assertEqual(self.service.count_cds("99"), 0)
+
+    def test_export_csv_streams_matches(self):
+        path = "test_export.csv"
+        try:
+            written = self.service.export_csv(path, where=[("name", "contains", "alpha")], fields=("id", "name"))
+            with open(path) as f:
+                self.assertEqual(f.read().splitlines(), ["id,name", "2,alpha", "5,alphabet"])
+            self.assertEqual(written, 2)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+class TestCDServiceConfig(unittest.TestCase):
+    def test_default_backend(self):
+        from CDConfig import load_config
+        config = load_config({})
+        self.assertEqual(config, {"backend": "memory", "library": "cd_library.json", "journal": True,
+                                  "snapshot": False, "instrument": False, "autosave": 2.0,
+                                  "shard_size": 100000, "codec": None})
+        service = CDService.from_config(dict(config, journal=False))
+        self.assertIsInstance(service._repository, CDRepository)
+
+    def test_sqlite_backend(self):
+        from CDConfig import load_config
+        from SQLiteCDRepository import SQLiteCDRepository
+        config = load_config({"CD_BACKEND": "SQLite", "CD_LIBRARY": ":memory:"})
+        self.assertEqual(config["backend"], "sqlite")
+        service = CDService.from_config(config)
+        self.assertIsInstance(service._repository, SQLiteCDRepository)
+        self.assertTrue(service.add("Disc", 700, 52, 0, 1, "Data"))
+        self.assertEqual(service.find_by_id(1).name, "Disc")
+
+    def test_unknown_backend(self):
+        from CDConfig import load_config
+        with self.assertRaises(ValueError):
+            load_config({"CD_BACKEND": "floppy"})
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+from CD import CD
+from CDRepository import CDRepository
+from CDSnapshot import SnapshotReader, is_snapshot, snapshot_path_for, write_snapshot
+from LibraryStream import LibraryReader, open_library
+
+class TestCDSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "library.cdb")
+        self.cds = [CD(i, f"Disc é {i}", 700.0, 52, 1.5 * i, 1, "Finalized" if i % 3 else "Data")
+                    for i in (5, 1, 9, 3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        write_snapshot(self.path, self.cds, 10)
+        self.assertTrue(is_snapshot(self.path))
+        with SnapshotReader(self.path) as reader:
+            self.assertEqual(len(reader), 4)
+            self.assertEqual(reader.next_id, 10)
+            records = list(reader)
+        self.assertEqual([r["id"] for r in records], [1, 3, 5, 9])
+        self.assertEqual(CD(**records[0]).to_dict(), CD(1, "Disc é 1", 700.0, 52, 1.5, 1, "Finalized").to_dict())
+        self.assertEqual([r["session_type"] for r in records], ["Finalized", "Data", "Finalized", "Data"])
+
+    def test_lazy_access(self):
+        write_snapshot(self.path, self.cds, 10)
+        with SnapshotReader(self.path) as reader:
+            self.assertEqual(reader[-1].id, 9)
+            self.assertEqual(reader.find(3).name, "Disc é 3")
+            self.assertEqual(reader.find(3).session_type, "Data")
+            self.assertIsNone(reader.find(4))
+            self.assertIsNone(reader.find(100))
+            with self.assertRaises(IndexError):
+                reader[4]
+
+    def test_empty_snapshot(self):
+        write_snapshot(self.path, [], 1)
+        with SnapshotReader(self.path) as reader:
+            self.assertEqual(list(reader), [])
+            self.assertEqual(reader.next_id, 1)
+            self.assertIsNone(reader.find(1))
+
+    def test_open_library_prefers_fresh_sidecar(self):
+        library = os.path.join(self.tmp_dir, "library.json")
+        repo = CDRepository(snapshot=True)
+        for cd in self.cds:
+            repo.add(cd)
+        self.assertTrue(repo.uploadData(library))
+        self.assertEqual(snapshot_path_for(library), self.path)
+
+        reader = open_library(library)
+        self.assertIsInstance(reader, SnapshotReader)
+        reader.close()
+
+        # A JSON file saved after the snapshot wins
+        os.utime(self.path, (0, 0))
+        self.assertIsInstance(open_library(library), LibraryReader)
+
+        loaded = CDRepository()
+        self.assertTrue(loaded.loadData(library))
+        self.assertEqual(sorted(cd.id for cd in loaded.getAll()), [1, 3, 5, 9])
+        self.assertEqual(loaded.get_next_id(), repo.get_next_id())
+
+    def test_repository_saves_and_loads_snapshot(self):
+        repo = CDRepository()
+        for cd in self.cds:
+            repo.add(cd)
+        self.assertTrue(repo.uploadData(self.path))
+        loaded = CDRepository()
+        self.assertTrue(loaded.loadData(self.path))
+        self.assertEqual(loaded.find_by_id(9).occupied_space, 13.5)
+        self.assertEqual(loaded.get_next_id(), repo.get_next_id())
+
+    def test_repository_loads_snapshot_lazily(self):
+        write_snapshot(self.path, self.cds, 10)
+        loaded = CDRepository()
+        self.assertTrue(loaded.loadData(self.path))
+        # Only the records asked for are decoded
+        self.assertEqual(loaded.count(), 4)
+        self.assertEqual([cd.id for cd in loaded.getSorted("id", 2, 1)], [3, 5])
+        self.assertIs(loaded.find_by_id(3), loaded.getSorted("id", 1, 1)[0])
+        self.assertIsNone(loaded.find_by_id(4))
+        self.assertTrue(loaded.set_finalized(9, False))
+        self.assertTrue(loaded.set_occupied_space(1, 20.0))
+        self.assertEqual(sorted(loaded._byId), [1, 3, 5, 9])
+        self.assertIsNotNone(loaded._lazy)
+
+        # Reads needing every CD decode the rest, keeping the edits
+        self.assertEqual(loaded.getSummary()["session_types"], {"Data": 2, "Finalized": 2})
+        self.assertIsNone(loaded._lazy)
+        self.assertEqual([cd.id for cd in loaded.getAll()], [1, 3, 5, 9])
+        self.assertEqual(loaded.find_by_id(1).occupied_space, 20.0)
+        self.assertTrue(loaded.add(CD(10, "New", 700.0, 52, 0, 1, "Data")))
+        self.assertEqual(loaded.getSorted("name")[0].id, 1)
+
+    def test_shared_repository_stays_lazy_after_load(self):
+        from SharedRepository import LockedRepository
+        write_snapshot(self.path, self.cds, 10)
+        shared = LockedRepository(CDRepository())
+        self.assertTrue(shared.loadData(self.path))
+        self.assertEqual(shared.count(), 4)
+        self.assertEqual([cd.id for cd in shared.getSorted("id", 2)], [1, 3])
+        self.assertIsNotNone(shared.target._lazy)
+        self.assertEqual([cd.id for cd in shared.search_by_name("é 9")], [9])
+        shared.close()
+
+if __name__ == '__main__':
+    unittest.main()
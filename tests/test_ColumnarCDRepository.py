@@ -0,0 +1,158 @@
+import unittest
+import os
+import sys
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from CD import CD
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestColumnarCDRepository(unittest.TestCase):
+    def setUp(self):
+        from ColumnarCDRepository import ColumnarCDRepository
+        self.repo = ColumnarCDRepository(capacity=2)
+        self.test_file = "test_columnar_library.json"
+        self.repo.add(CD(1, "Beta", 650, 24, 600, 1, "Data"))      # 50 free
+        self.repo.add(CD(2, "Alpha", 700, 52, 100, 2, "Finalized"))  # 600 free
+        self.repo.add(CD(3, "Gamma", 700, 48, 400, 1, "Audio"))     # 300 free
+
+    def tearDown(self):
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+
+    def ids(self, cds):
+        return [cd.id for cd in cds]
+
+    def test_add_and_find(self):
+        cd = self.repo.find_by_id(2)
+        self.assertEqual(cd.to_dict(), CD(2, "Alpha", 700, 52, 100, 2, "Finalized").to_dict())
+        self.assertIsNone(self.repo.find_by_id(4))
+        self.assertFalse(self.repo.add(CD(2, "Duplicate", 700, 52, 0, 1, "Data")))
+        self.assertEqual(len(self.repo.getAll()), 3)
+
+    def test_out_of_order_add(self):
+        self.repo.delete(2)
+        self.assertTrue(self.repo.add(CD(0, "Zero", 700, 52, 0, 1, "Data")))
+        self.assertTrue(self.repo.add(CD(2, "Again", 700, 52, 0, 1, "Data")))
+        self.assertEqual(self.ids(self.repo.getAll()), [0, 1, 2, 3])
+        self.assertEqual(self.repo.find_by_id(2).name, "Again")
+
+    def test_add_batch(self):
+        first = self.repo.reserve_ids(2)
+        self.assertEqual(first, 4)
+        batch = [CD(4, "Delta", 700, 52, 0, 1, "Data"), CD(5, "Echo", 700, 52, 0, 1, "Finalized")]
+        self.assertEqual(self.repo.add_batch(batch), [True, True])
+        # Out of order or clashing IDs take the one-by-one path
+        self.assertEqual(self.repo.add_batch([CD(0, "Zero", 700, 52, 0, 1, "Data"),
+                                              CD(2, "Clash", 700, 52, 0, 1, "Data")]), [True, False])
+        self.assertEqual(self.ids(self.repo.getAll()), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(self.repo.get_next_id(), 6)
+        self.assertEqual(self.repo.find_by_id(5).session_type, "Finalized")
+
+    def test_version(self):
+        version = self.repo.get_version()
+        self.repo.find_by_id(1)
+        self.assertEqual(self.repo.get_version(), version)
+        self.repo.set_finalized(1, True)
+        self.assertGreater(self.repo.get_version(), version)
+
+    def test_search_by_name(self):
+        self.repo.add(CD(4, "Alphabet", 700, 52, 0, 1, "Data"))
+        self.repo.add(CD(5, "Alpha", 700, 52, 0, 1, "Data"))
+        self.assertEqual(self.ids(self.repo.search_by_name("ALPHA")), [2, 5, 4])
+        self.repo.delete(2)
+        self.assertEqual(self.ids(self.repo.search_by_name("alpha", limit=1)), [5])
+        self.assertEqual(self.ids(self.repo.search_by_name("mm")), [3])
+        self.assertEqual(self.repo.search_by_name("omega"), [])
+
+    def test_delete(self):
+        self.assertTrue(self.repo.delete(1))
+        self.assertFalse(self.repo.delete(1))
+        self.assertIsNone(self.repo.find_by_id(1))
+        self.assertEqual(self.ids(self.repo.getAll()), [2, 3])
+
+    def test_sorted(self):
+        self.assertEqual(self.ids(self.repo.getSorted("name")), [2, 1, 3])
+        self.assertEqual(self.ids(self.repo.getSorted("size")), [2, 3, 1])
+        self.assertEqual(self.ids(self.repo.getSorted("encryption_speed", limit=2)), [2, 3])
+        self.assertEqual(self.ids(self.repo.getSorted("name", offset=2)), [3])
+
+    def test_sorted_pages_follow_changes(self):
+        self.assertEqual(self.ids(self.repo.getSorted("id", 2, 1)), [2, 3])
+        self.assertEqual(self.ids(self.repo.getSorted("name", 2)), [2, 1])
+        self.repo.add(CD(4, "Aardvark", 700, 52, 0, 1, "Data"))
+        self.assertEqual(self.ids(self.repo.getSorted("name", 2)), [4, 2])
+        self.assertEqual(self.repo.count(), 4)
+
+    def test_free_space_queries(self):
+        self.assertEqual(self.ids(self.repo.getFreeSpace(50)), [3, 2])
+        self.assertEqual(self.ids(self.repo.getFreeSpaceBetween(50, 300)), [3])
+        self.assertEqual(self.ids(self.repo.getFreeSpaceBetween(0, 300)), [1, 3])
+        self.assertEqual(self.ids(self.repo.getMostFreeSpace(2)), [2, 3])
+        self.assertTrue(self.repo.set_occupied_space(2, 700))
+        self.assertEqual(self.ids(self.repo.getMostFreeSpace(1)), [3])
+
+    def test_open_sessions_and_finalize(self):
+        self.assertEqual(self.ids(self.repo.getOpenSessions()), [1, 3])
+        self.assertTrue(self.repo.set_finalized(1, True))
+        self.assertTrue(self.repo.set_finalized(2, False))
+        self.assertEqual(self.ids(self.repo.getOpenSessions()), [2, 3])
+        self.assertEqual(self.repo.find_by_id(2).session_type, "Data")
+        self.assertFalse(self.repo.set_finalized(99, True))
+
+    def test_summary(self):
+        summary = self.repo.getSummary(top_k=2)
+        self.assertEqual(summary["total_cds"], 3)
+        self.assertEqual(summary["total_size"], 2050)
+        self.assertEqual(summary["total_occupied"], 1100)
+        self.assertEqual(summary["session_types"], {"Data": 1, "Finalized": 1, "Audio": 1})
+        self.assertEqual(self.ids(summary["top_occupied"]), [1, 3])
+
+    def test_compaction(self):
+        for i in range(4, 3000):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, 0, 1, "Data"))
+        for i in range(4, 2900):
+            self.repo.delete(i)
+        self.assertEqual(len(self.repo.getAll()), 3 + 100)
+        self.assertEqual(self.repo.find_by_id(2950).name, "CD 2950")
+
+    def test_save_and_load(self):
+        from ColumnarCDRepository import ColumnarCDRepository
+        self.assertTrue(self.repo.uploadData(self.test_file))
+        loaded = ColumnarCDRepository()
+        self.assertTrue(loaded.loadData(self.test_file))
+        self.assertEqual([cd.to_dict() for cd in loaded.getAll()],
+                         [cd.to_dict() for cd in self.repo.getAll()])
+        self.assertEqual(loaded.get_next_id(), self.repo.get_next_id())
+
+    def test_failed_load_keeps_library(self):
+        expected = [cd.to_dict() for cd in self.repo.getAll()]
+        with open(self.test_file, 'w') as f:
+            f.write('{"nextId": 9, "cds": [{"id": 7, "name": "Cut')
+        self.assertFalse(self.repo.loadData(self.test_file))
+        self.assertEqual([cd.to_dict() for cd in self.repo.getAll()], expected)
+        self.assertEqual(self.repo.get_next_id(), 4)
+
+    def test_capture_save_ignores_later_changes(self):
+        from ColumnarCDRepository import ColumnarCDRepository
+        expected = [cd.to_dict() for cd in self.repo.getAll()]
+        write = self.repo.captureSave(self.test_file)
+        self.repo.set_finalized(1, True)
+        self.repo.delete(2)
+        self.repo.add(CD(4, "Later", 700, 52, 0, 1, "Data"))
+        self.assertEqual(write(), (True, None))
+        loaded = ColumnarCDRepository()
+        self.assertTrue(loaded.loadData(self.test_file))
+        self.assertEqual([cd.to_dict() for cd in loaded.getAll()], expected)
+
+if __name__ == '__main__':
+    unittest.main()
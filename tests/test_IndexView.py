@@ -0,0 +1,53 @@
+import unittest
+import os
+import sys
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class TestFinalizedChanges(unittest.TestCase):
+    def setUp(self):
+        from IndexView import finalized_changes
+        self.finalized_changes = finalized_changes
+        self.df = pd.DataFrame({"id": [4, 7, 9], "Name": ["A", "B", "C"], "Finalized": [False, True, False]})
+
+    def test_edited_rows(self):
+        state = {"edited_rows": {"0": {"Finalized": True}, 1: {"Finalized": False}, "2": {"Name": "Renamed"}},
+                 "added_rows": [], "deleted_rows": []}
+        self.assertEqual(self.finalized_changes(self.df, self.df, state), {4: True, 7: False})
+
+    def test_edited_rows_set_back_or_out_of_range(self):
+        # Toggled and toggled back, and a position past the end of the page
+        state = {"edited_rows": {"1": {"Finalized": True}, "5": {"Finalized": True}}}
+        self.assertEqual(self.finalized_changes(self.df, self.df, state), {})
+
+    def test_edited_rows_follow_the_shown_frame(self):
+        # The library changed after the edit: the page now starts with CD 2,
+        # but position 0 is still CD 4, as the editor showed it
+        refetched = pd.DataFrame({"id": [2, 4, 7], "Name": ["New", "A", "B"], "Finalized": [False, False, True]})
+        state = {"edited_rows": {"0": {"Finalized": True}}}
+        self.assertEqual(self.finalized_changes(refetched, refetched, state, self.df), {4: True})
+
+    def test_frame_diff_without_editor_state(self):
+        edited = self.df.copy()
+        edited.loc[2, "Finalized"] = True
+        edited.loc[1, "Finalized"] = False
+        self.assertEqual(self.finalized_changes(self.df, edited, None), {7: False, 9: True})
+
+    def test_unchanged(self):
+        self.assertEqual(self.finalized_changes(self.df, self.df.copy(), None), {})
+        self.assertEqual(self.finalized_changes(self.df, self.df, {"edited_rows": {}}), {})
+        empty = self.df.iloc[0:0]
+        self.assertEqual(self.finalized_changes(empty, empty, None), {})
+
+if __name__ == '__main__':
+    unittest.main()
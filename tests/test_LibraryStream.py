@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import json
+import lzma
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LibraryStream import LibraryReader, detect_codec, is_json_lines, open_text_writer, write_json, write_json_lines
+
+class TestLibraryStream(unittest.TestCase):
+    def setUp(self):
+        self.test_file = "test_stream_library.json"
+        self.records = [
+            {"id": i, "name": f"Disc é {i}", "size": 700.0, "encryption_speed": 52,
+             "occupied_space": 1.5 * i, "session_count": 1, "session_type": "Data"}
+            for i in range(1, 40)
+        ]
+
+    def tearDown(self):
+        for path in (self.test_file, self.test_file + "l"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_reads_json_in_small_blocks(self):
+        with open(self.test_file, 'w') as f:
+            json.dump({"cds": self.records, "nextId": 12345}, f, indent=4)
+
+        # A tiny read size splits values, keys and multi-byte characters
+        reader = LibraryReader(self.test_file, read_size=5)
+        self.assertEqual(list(reader), self.records)
+        self.assertEqual(reader.next_id, 12345)
+        self.assertEqual(reader.bytes_read, reader.total_bytes)
+
+    def test_reads_compressed_in_small_blocks(self):
+        for codec in ("gzip", "bz2", "lzma"):
+            with self.subTest(codec=codec):
+                with open_text_writer(self.test_file, codec) as f:
+                    write_json(f, self.records, 40)
+                self.assertEqual(detect_codec(self.test_file), codec)
+                reader = LibraryReader(self.test_file, read_size=7)
+                self.assertEqual(list(reader), self.records)
+                self.assertEqual(reader.next_id, 40)
+                self.assertEqual(reader.bytes_read, reader.total_bytes)
+        with open(self.test_file, 'r+b') as f:
+            f.truncate(os.path.getsize(self.test_file) // 2)
+        with self.assertRaises(ValueError):
+            list(LibraryReader(self.test_file))
+        # Written by another tool
+        with lzma.open(self.test_file, 'wt', encoding='utf-8') as f:
+            json.dump({"cds": self.records, "nextId": 40}, f)
+        self.assertEqual(list(LibraryReader(self.test_file)), self.records)
+
+    def test_next_id_before_cds_and_extra_keys(self):
+        with open(self.test_file, 'w') as f:
+            json.dump({"nextId": 7, "owner": {"name": "me"}, "cds": self.records[:2]}, f)
+        reader = LibraryReader(self.test_file, read_size=3)
+        self.assertEqual(list(reader), self.records[:2])
+        self.assertEqual(reader.next_id, 7)
+
+    def test_chunks(self):
+        with open(self.test_file, 'w') as f:
+            json.dump({"cds": self.records}, f)
+        sizes = [len(chunk) for chunk in LibraryReader(self.test_file).chunks(10)]
+        self.assertEqual(sizes, [10, 10, 10, 9])
+
+    def test_malformed_json(self):
+        with open(self.test_file, 'w') as f:
+            f.write('{"cds": [{"id": 1}, {"id": 2')
+        with self.assertRaises(ValueError):
+            list(LibraryReader(self.test_file))
+
+    def test_json_lines_round_trip(self):
+        path = self.test_file + "l"
+        self.assertTrue(is_json_lines(path))
+        self.assertTrue(is_json_lines(path + ".gz"))
+        self.assertFalse(is_json_lines(self.test_file + ".gz"))
+        with open(path, 'w') as f:
+            write_json_lines(f, self.records, 40)
+        reader = LibraryReader(path)
+        self.assertEqual(list(reader), self.records)
+        self.assertEqual(reader.next_id, 40)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from NameIndex import NameIndex, match_rank
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = NameIndex([(1, "Best of Jazz"), (2, "Jazz"), (3, "Jazzy Nights"),
+                                (4, "Ambient Works"), (5, "Acid Jazz Classics")])
+
+    def test_ranking(self):
+        # Exact, then prefix, then word start (shorter names first)
+        self.assertEqual(self.index.search("JAZZ"), [2, 3, 1, 5])
+        self.assertEqual(self.index.search("jazz", limit=2), [2, 3])
+
+    def test_substring_and_short_queries(self):
+        self.assertEqual(self.index.search("bien"), [4])
+        self.assertEqual(self.index.search("zz"), [2, 1, 3, 5])
+        self.assertEqual(self.index.search("a"), [4, 5, 2, 1, 3])
+        self.assertEqual(self.index.search(""), [])
+        # Every trigram occurs somewhere, but not the whole query
+        self.assertEqual(self.index.search("jazz works"), [])
+
+    def test_add_and_remove(self):
+        self.index.remove(2)
+        self.assertFalse(self.index.remove(2))
+        self.index.add(6, "Jazz")
+        self.index.add(3, "Quiet Nights")
+        self.assertEqual(self.index.search("jazz"), [6, 1, 5])
+        self.assertEqual(self.index.search("nights"), [3])
+        self.assertEqual(len(self.index), 5)
+
+    def test_match_rank(self):
+        self.assertEqual(match_rank("jazz", "jazz"), 0)
+        self.assertEqual(match_rank("jazzy", "jazz"), 1)
+        self.assertEqual(match_rank("ajazz jazz", "jazz"), 2)
+        self.assertEqual(match_rank("ajazz", "jazz"), 3)
+        self.assertIsNone(match_rank("blues", "jazz"))
+
+if __name__ == '__main__':
+    unittest.main()
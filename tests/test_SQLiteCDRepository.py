@@ -0,0 +1,197 @@
+import unittest
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+from SQLiteCDRepository import SQLiteCDRepository
+from CD import CD
+
+class TestSQLiteCDRepository(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "library.db")
+        self.repo = SQLiteCDRepository(self.db_path, batch_size=2)
+        self.repo.add(CD(1, "Beta", 650, 24, 600, 1, "Data"))      # 50 free
+        self.repo.add(CD(2, "Alpha", 700, 52, 100, 2, "Finalized"))  # 600 free
+        self.repo.add(CD(3, "Gamma", 700, 48, 400, 1, "Audio"))     # 300 free
+
+    def tearDown(self):
+        self.repo.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def ids(self, cds):
+        return [cd.id for cd in cds]
+
+    def test_add_and_find(self):
+        cd = self.repo.find_by_id(2)
+        self.assertEqual(cd.to_dict(), CD(2, "Alpha", 700, 52, 100, 2, "Finalized").to_dict())
+        self.assertIsNone(self.repo.find_by_id(4))
+        self.assertFalse(self.repo.add(CD(2, "Duplicate", 700, 52, 0, 1, "Data")))
+        self.assertEqual(self.repo.get_next_id(), 4)
+
+    def test_add_batch(self):
+        first = self.repo.reserve_ids(2)
+        self.assertEqual(first, 4)
+        batch = [CD(4, "Delta", 700, 52, 0, 1, "Data"), CD(2, "Clash", 700, 52, 0, 1, "Data"),
+                 CD(5, "Echo", 700, 52, 0, 1, "Data")]
+        self.assertEqual(self.repo.add_batch(batch), [True, False, True])
+        self.assertEqual(self.ids(self.repo.getAll()), [1, 2, 3, 4, 5])
+        self.assertEqual(self.repo.get_next_id(), 6)
+
+    def test_version(self):
+        version = self.repo.get_version()
+        self.repo.getAll()
+        self.assertEqual(self.repo.get_version(), version)
+        self.repo.set_occupied_space(1, 10)
+        self.assertGreater(self.repo.get_version(), version)
+
+    def test_search_by_name(self):
+        self.repo.add(CD(4, "Alpha Beta", 700, 52, 0, 1, "Data"))
+        self.assertEqual(self.ids(self.repo.search_by_name("BETA")), [1, 4])
+        self.assertEqual(self.ids(self.repo.search_by_name("eta")), [1, 4])
+        self.assertEqual(self.ids(self.repo.search_by_name("mm")), [3])
+        self.repo.delete(1)
+        self.assertEqual(self.ids(self.repo.search_by_name("beta")), [4])
+        self.assertEqual(self.ids(self.repo.search_by_name("alpha", limit=1)), [2])
+        self.assertEqual(self.repo.search_by_name("100%"), [])
+
+    def test_delete(self):
+        self.assertTrue(self.repo.delete(1))
+        self.assertFalse(self.repo.delete(1))
+        self.assertEqual(self.ids(self.repo.getAll()), [2, 3])
+
+    def test_sorted(self):
+        self.assertEqual(self.ids(self.repo.getSorted("name")), [2, 1, 3])
+        self.assertEqual(self.ids(self.repo.getSorted("size")), [2, 3, 1])
+        self.assertEqual(self.ids(self.repo.getSorted("encryption_speed", limit=2)), [2, 3])
+        self.assertEqual(self.ids(self.repo.getSorted("name", offset=2)), [3])
+
+    def test_free_space_queries(self):
+        self.assertEqual(self.ids(self.repo.getFreeSpace(50)), [3, 2])
+        self.assertEqual(self.ids(self.repo.getFreeSpaceBetween(50, 300)), [3])
+        self.assertEqual(self.ids(self.repo.getFreeSpaceBetween(0, 300)), [1, 3])
+        self.assertEqual(self.ids(self.repo.getMostFreeSpace(2)), [2, 3])
+        self.assertTrue(self.repo.set_occupied_space(2, 700))
+        self.assertFalse(self.repo.set_occupied_space(2, 701))
+        self.assertEqual(self.ids(self.repo.getMostFreeSpace(1)), [3])
+
+    def test_open_sessions_and_finalize(self):
+        self.assertEqual(self.ids(self.repo.getOpenSessions()), [1, 3])
+        self.assertTrue(self.repo.set_finalized(1, True))
+        self.assertTrue(self.repo.set_finalized(2, False))
+        self.assertEqual(self.ids(self.repo.getOpenSessions()), [2, 3])
+        self.assertEqual(self.repo.find_by_id(2).session_type, "Data")
+        self.assertFalse(self.repo.set_finalized(99, True))
+
+    def test_set_finalized_batch(self):
+        self.assertEqual(self.repo.set_finalized_batch({1: True, 2: False, 9: True}), {1: True, 2: True, 9: False})
+        self.assertEqual(self.ids(self.repo.getOpenSessions()), [2, 3])
+
+    def test_summary(self):
+        summary = self.repo.getSummary(top_k=2)
+        self.assertEqual(summary["total_cds"], 3)
+        self.assertEqual(summary["total_size"], 2050)
+        self.assertEqual(summary["total_occupied"], 1100)
+        self.assertEqual(summary["session_types"], {"Data": 1, "Finalized": 1, "Audio": 1})
+        self.assertEqual(self.ids(summary["top_occupied"]), [1, 3])
+
+    def test_summary_follows_changes(self):
+        self.repo.set_occupied_space(3, 700)
+        self.repo.set_finalized(1, True)
+        self.repo.delete(2)
+        summary = self.repo.getSummary(top_k=1)
+        self.assertEqual((summary["total_cds"], summary["total_size"], summary["total_occupied"]), (2, 1350, 1300))
+        self.assertEqual(summary["session_types"], {"Audio": 1, "Finalized": 1})
+        self.assertEqual(self.ids(summary["top_occupied"]), [3])
+        self.assertEqual(self.repo.count(), 2)
+
+    def test_persists_across_connections(self):
+        self.repo.set_finalized(3, True)
+        self.assertTrue(self.repo.uploadData(self.db_path))
+        reopened = SQLiteCDRepository(self.db_path)
+        self.addCleanup(reopened.close)
+        self.assertTrue(reopened.loadData(self.db_path))
+        self.assertEqual([cd.to_dict() for cd in reopened.getAll()],
+                         [cd.to_dict() for cd in self.repo.getAll()])
+        self.assertEqual(reopened.get_next_id(), 4)
+
+    def test_transaction_rolls_back(self):
+        with self.assertRaises(RuntimeError):
+            with self.repo.transaction():
+                self.repo.delete(1)
+                raise RuntimeError("abort")
+        self.assertIsNotNone(self.repo.find_by_id(1))
+
+    def test_json_import_and_export(self):
+        json_path = os.path.join(self.tmp_dir, "library.json")
+        self.assertTrue(self.repo.uploadData(json_path))
+        with open(json_path) as f:
+            self.assertEqual(len(json.load(f)["cds"]), 3)
+
+        imported = SQLiteCDRepository(os.path.join(self.tmp_dir, "imported.db"))
+        self.addCleanup(imported.close)
+        self.assertTrue(imported.loadData(json_path))
+        self.assertEqual([cd.to_dict() for cd in imported.getAll()],
+                         [cd.to_dict() for cd in self.repo.getAll()])
+        self.assertEqual(imported.get_next_id(), 4)
+
+    def test_import_releases_lock_between_chunks(self):
+        json_path = os.path.join(self.tmp_dir, "library.json")
+        with open(json_path, 'w') as f:
+            # ID 2 twice: the duplicate is skipped and not counted
+            json.dump({"nextId": 30, "cds": [CD(i, f"CD {i}", 700, 52, 0, 1, "Data").to_dict()
+                                             for i in [1, 2, 2] + list(range(3, 21))]}, f)
+        loading = self.repo.iterLoad(json_path, chunk_size=3)
+        self.assertEqual(next(loading)[0], 2)
+        # Another thread can read (the previous library) while the import is paused
+        seen = []
+        reader = threading.Thread(target=lambda: seen.append(len(self.repo.getAll())))
+        reader.start()
+        reader.join(5)
+        self.assertEqual(seen, [3])
+        self.assertEqual([count for count, _, _ in loading][-1], 20)
+        self.assertEqual(len(self.repo.getAll()), 20)
+        self.assertEqual(self.repo.get_next_id(), 30)
+
+    def test_write_waits_for_import(self):
+        from SQLiteCDRepository import BUSY_TIMEOUT
+        self.assertEqual(self.repo._conn.execute("PRAGMA busy_timeout").fetchone()[0], BUSY_TIMEOUT * 1000)
+        json_path = os.path.join(self.tmp_dir, "library.json")
+        with open(json_path, 'w') as f:
+            json.dump({"cds": [CD(i, f"CD {i}", 700, 52, 0, 1, "Data").to_dict() for i in range(1, 11)]}, f)
+        loading = self.repo.iterLoad(json_path, chunk_size=4)
+        next(loading)
+        added = []
+        writer = threading.Thread(target=lambda: added.append(self.repo.add(CD(99, "After", 700, 52, 0, 1, "Data"))))
+        writer.start()
+        writer.join(0.5)
+        self.assertTrue(writer.is_alive())  # waiting for the import to commit
+        list(loading)
+        writer.join(5)
+        self.assertEqual(added, [True])
+        self.assertEqual(self.repo.find_by_id(99).name, "After")
+        self.assertEqual(len(self.repo.getAll()), 11)
+
+    def test_import_closed_on_another_thread_rolls_back(self):
+        json_path = os.path.join(self.tmp_dir, "library.json")
+        with open(json_path, 'w') as f:
+            json.dump({"cds": [CD(i, f"CD {i}", 700, 52, 0, 1, "Data").to_dict() for i in range(1, 11)]}, f)
+        loading = self.repo.iterLoad(json_path, chunk_size=4)
+        next(loading)
+        closer = threading.Thread(target=loading.close)
+        closer.start()
+        closer.join(5)
+        self.assertEqual([cd.id for cd in self.repo.getAll()], [1, 2, 3])
+        self.assertTrue(self.repo.add(CD(4, "After", 700, 52, 0, 1, "Data")))
+
+if __name__ == '__main__':
+    unittest.main()
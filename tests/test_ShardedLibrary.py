@@ -0,0 +1,158 @@
+import unittest
+import os
+import sys
+import json
+import shutil
+import tempfile
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+from CD import CD
+from CDRepository import CDRepository
+from ShardedLibrary import is_manifest, parse_shards, read_manifest, shard_files, shard_path
+
+class TestShardedLibrary(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "library.manifest.json")
+        self.repo = CDRepository(shard_size=10)
+        for i in range(1, 36):
+            self.repo.add(CD(i, f"CD {i}", 700, 52, i, 1, "Data" if i % 2 else "Finalized"))
+        self.assertTrue(self.repo.uploadData(self.path))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def inodes(self):
+        return {index: os.stat(shard_path(self.path, index)).st_ino for index in range(4)}
+
+    def test_layout(self):
+        manifest = read_manifest(self.path)
+        self.assertEqual(manifest["nextId"], 36)
+        self.assertEqual([(shard["index"], shard["count"]) for shard in manifest["shards"]],
+                         [(0, 10), (1, 10), (2, 10), (3, 5)])
+        # Each shard is an ordinary library
+        shard = CDRepository()
+        self.assertTrue(shard.loadData(shard_path(self.path, 1)))
+        self.assertEqual([cd.id for cd in shard.getAll()], list(range(11, 21)))
+        self.assertTrue(is_manifest(self.path))
+        self.assertFalse(is_manifest(shard_path(self.path, 1)))
+
+    def test_round_trip(self):
+        loaded = CDRepository()
+        progress = list(loaded.iterLoad(self.path))
+        self.assertEqual([count for count, _, _ in progress], [10, 20, 30, 35])
+        self.assertEqual(progress[-1][1], progress[-1][2])
+        self.assertEqual(sorted(cd.to_dict()["id"] for cd in loaded.getAll()), list(range(1, 36)))
+        self.assertEqual([cd.to_dict() for cd in loaded.getSorted("id")],
+                         [cd.to_dict() for cd in self.repo.getAll()])
+        self.assertEqual(loaded.get_next_id(), 36)
+        # The library's shard size is kept for later saves
+        self.assertEqual(loaded._shardSize, 10)
+
+    def test_save_rewrites_only_changed_shards(self):
+        before = self.inodes()
+        self.repo.set_occupied_space(12, 300)
+        self.repo.add(CD(36, "New", 700, 52, 0, 1, "Data"))
+        self.assertTrue(self.repo.uploadData(self.path))
+        after = self.inodes()
+        self.assertEqual([index for index in range(4) if before[index] != after[index]], [1, 3])
+
+        # A loaded library tracks its own changes
+        loaded = CDRepository()
+        loaded.loadData(self.path)
+        self.assertEqual(loaded.find_by_id(12).occupied_space, 300)
+        loaded.delete(3)
+        before = self.inodes()
+        self.assertTrue(loaded.uploadData(self.path))
+        after = self.inodes()
+        self.assertEqual([index for index in range(4) if before[index] != after[index]], [0])
+        self.assertEqual(read_manifest(self.path)["shards"][0]["count"], 9)
+
+    def test_empty_shard_is_removed(self):
+        for i in range(31, 36):
+            self.repo.delete(i)
+        self.assertTrue(self.repo.uploadData(self.path))
+        self.assertFalse(os.path.exists(shard_path(self.path, 3)))
+        self.assertEqual(len(read_manifest(self.path)["shards"]), 3)
+        loaded = CDRepository()
+        loaded.loadData(self.path)
+        self.assertEqual(loaded.count(), 30)
+
+    def test_failed_save_is_retried(self):
+        self.repo.set_occupied_space(25, 1)
+        with patch("ShardedLibrary.write_json", side_effect=IOError("disk full")):
+            self.assertFalse(self.repo.uploadData(self.path))
+        self.assertTrue(self.repo.uploadData(self.path))
+        loaded = CDRepository()
+        loaded.loadData(self.path)
+        self.assertEqual(loaded.find_by_id(25).occupied_space, 1)
+
+    def test_other_path_gets_every_shard(self):
+        other = os.path.join(self.tmp_dir, "copy.manifest.json")
+        self.repo.set_occupied_space(1, 5)
+        self.assertTrue(self.repo.uploadData(other))
+        self.assertEqual(len(read_manifest(other)["shards"]), 4)
+
+    def test_parallel_parse_matches_sequential(self):
+        paths = shard_files(self.path, read_manifest(self.path))
+        sequential = dict(parse_shards(paths, workers=1))
+        parallel = dict(parse_shards(paths, workers=2))
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(sum(len(records) for records in parallel.values()), 35)
+
+    def test_capture_save_writes_changed_shards_later(self):
+        before = self.inodes()
+        self.repo.set_finalized(5, True)
+        write = self.repo.captureSave(self.path)
+        self.repo.set_occupied_space(33, 2)
+        saved, finish = write()
+        self.assertTrue(saved)
+        finish()
+        after = self.inodes()
+        self.assertEqual([index for index in range(4) if before[index] != after[index]], [0])
+        # The change made after the capture goes with the next save
+        self.assertTrue(self.repo.uploadData(self.path))
+        self.assertNotEqual(self.inodes()[3], after[3])
+        with open(shard_path(self.path, 3)) as f:
+            self.assertIn(2, [cd["occupied_space"] for cd in json.load(f)["cds"]])
+
+    def test_failed_capture_save_marks_shards_when_finished(self):
+        self.repo.set_finalized(5, True)
+        write = self.repo.captureSave(self.path)
+        with patch("CDRepository.write_shards", side_effect=IOError("disk full")):
+            saved, finish = write()
+        self.assertFalse(saved)
+        # The writer leaves the repository alone; the finish step, run under
+        # the write lock, puts the shard back for the next save
+        self.assertEqual(self.repo._dirtyShards, set())
+        finish()
+        self.assertEqual(self.repo._dirtyShards, {0})
+
+    def test_other_backends_reject_manifests(self):
+        from CDConfig import create_repository
+        from SQLiteCDRepository import SQLiteCDRepository
+        for backend in ("columnar", "sqlite"):
+            with self.subTest(backend=backend), self.assertRaisesRegex(ValueError, "only the memory backend"):
+                create_repository({"backend": backend, "library": self.path})
+        repo = SQLiteCDRepository(os.path.join(self.tmp_dir, "library.db"))
+        self.addCleanup(repo.close)
+        with self.assertRaisesRegex(ValueError, "manifest"):
+            list(repo.iterLoad(self.path))
+        self.assertFalse(repo.uploadData(self.path))
+        try:
+            from ColumnarCDRepository import ColumnarCDRepository
+        except ImportError:
+            return
+        columnar = ColumnarCDRepository()
+        self.assertFalse(columnar.loadData(self.path))
+        self.assertFalse(columnar.uploadData(self.path))
+        # The shards are still all there
+        self.assertTrue(all(os.path.exists(path) for path in shard_files(self.path, read_manifest(self.path))))
+
+if __name__ == '__main__':
+    unittest.main()
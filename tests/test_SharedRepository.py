@@ -0,0 +1,142 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mock streamlit before imports
+sys.modules['streamlit'] = MagicMock()
+
+from CD import CD
+from CDRepository import CDRepository
+from CDService import CDService
+from SharedRepository import LockedRepository, ReadWriteLock
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+class TestReadWriteLock(unittest.TestCase):
+    def setUp(self):
+        self.lock = ReadWriteLock()
+
+    def test_readers_share(self):
+        inside = threading.Barrier(3, timeout=2)
+
+        def reader():
+            with self.lock.read():
+                inside.wait()  # breaks unless all three readers hold the lock together
+
+        run_threads(reader, 3)
+        self.assertFalse(inside.broken)
+
+    def test_writer_excludes_readers_and_writers(self):
+        active = []
+        overlaps = []
+
+        def writer():
+            for _ in range(50):
+                with self.lock.write():
+                    active.append(1)
+                    if len(active) > 1:
+                        overlaps.append(1)
+                    active.pop()
+
+        def reader():
+            for _ in range(50):
+                with self.lock.read():
+                    if active:
+                        overlaps.append(1)
+
+        threads = [threading.Thread(target=fn) for fn in (writer, writer, reader, reader)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(overlaps, [])
+
+    def test_waiting_writer_blocks_new_readers(self):
+        order = []
+        self.lock.acquire_read()
+        writer = threading.Thread(target=lambda: (self.lock.acquire_write(), order.append("writer"),
+                                                  self.lock.release_write()))
+        writer.start()
+        while not self.lock._waitingWriters:
+            time.sleep(0.001)
+        reader = threading.Thread(target=lambda: (self.lock.acquire_read(), order.append("reader"),
+                                                  self.lock.release_read()))
+        reader.start()
+        time.sleep(0.05)
+        self.assertEqual(order, [])
+        self.lock.release_read()
+        writer.join(2)
+        reader.join(2)
+        self.assertEqual(order, ["writer", "reader"])
+
+    def test_reentrant(self):
+        with self.lock.write():
+            with self.lock.read():
+                with self.lock.write():
+                    pass
+        with self.lock.read():
+            with self.lock.read():
+                with self.assertRaises(RuntimeError):
+                    self.lock.acquire_write()
+        # Fully released: another thread can write
+        run_threads(self.lock.acquire_write, 1)
+        self.assertIsNotNone(self.lock._writer)
+
+class TestLockedRepository(unittest.TestCase):
+    def setUp(self):
+        self.repo = LockedRepository(CDRepository())
+        for cd_id in range(1, 6):
+            self.repo.add(CD(cd_id, f"CD {cd_id}", 700, 52, 100, 1, "Data"))
+
+    def test_get_all_is_a_snapshot(self):
+        cds = self.repo.getAll()
+        self.repo.delete(1)
+        self.assertEqual(len(cds), 5)
+        self.assertEqual(self.repo.count(), 4)
+
+    def test_generators_hold_the_lock_until_done(self):
+        chunks = self.repo.iterChunks(2)
+        self.assertIsNone(self.repo.lock._writer)  # not started: nothing held
+        next(chunks)
+        writer = threading.Thread(target=lambda: self.repo.delete(1))
+        writer.start()
+        writer.join(0.05)
+        self.assertTrue(writer.is_alive())
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 3)  # no RuntimeError: the delete waited
+        writer.join(2)
+        self.assertIsNone(self.repo.find_by_id(1))
+
+    def test_writes_leave_no_deferred_index_work(self):
+        self.repo.add_batch([CD(cd_id, f"Bulk {cd_id}", 700, 52, 0, 1, "Data") for cd_id in range(6, 106)])
+        self.assertFalse(self.repo.target._indexesStale)
+        self.assertFalse(self.repo.target._namesStale)
+
+    def test_concurrent_adds_get_unique_ids(self):
+        service = CDService(self.repo)
+
+        def add_many():
+            for _ in range(50):
+                self.assertTrue(service.add("Concurrent", 700, 52, 0, 1, "Data"))
+
+        run_threads(add_many, 4)
+        ids = [cd.id for cd in self.repo.getAll()]
+        self.assertEqual(len(ids), 5 + 200)
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_from_config_shares(self):
+        service = CDService.from_config({"backend": "memory", "library": "unused.json",
+                                         "journal": False, "shared": True})
+        self.assertIsInstance(service._repository, LockedRepository)
+
+if __name__ == '__main__':
+    unittest.main()
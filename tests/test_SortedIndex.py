@@ -0,0 +1,62 @@
+import unittest
+import os
+import sys
+import random
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SortedIndex import SortedIndex
+
+class TestSortedIndex(unittest.TestCase):
+    def setUp(self):
+        # Small buckets so the tests exercise splitting and bucket removal
+        self.index = SortedIndex()
+        self.index.LOAD = 4
+
+    def test_insert_keeps_order(self):
+        values = list(range(100))
+        random.shuffle(values)
+        for value in values:
+            self.index.insert(value)
+        self.assertEqual(list(self.index), list(range(100)))
+        self.assertEqual(list(reversed(self.index)), list(range(99, -1, -1)))
+        self.assertEqual(len(self.index), 100)
+
+    def test_remove(self):
+        for value in range(50):
+            self.index.insert(value)
+        for value in range(0, 50, 2):
+            self.assertTrue(self.index.remove(value))
+        self.assertFalse(self.index.remove(2))
+        self.assertFalse(self.index.remove(1000))
+        self.assertEqual(list(self.index), list(range(1, 50, 2)))
+        self.assertEqual(len(self.index), 25)
+
+    def test_islice(self):
+        self.index.rebuild(range(30))
+        self.assertEqual(list(self.index.islice(5, 12)), list(range(5, 12)))
+        self.assertEqual(list(self.index.islice(25)), list(range(25, 30)))
+        self.assertEqual(list(self.index.islice(0, 3, reverse=True)), [29, 28, 27])
+        self.assertEqual(list(self.index.islice(40, 50)), [])
+
+    def test_irange(self):
+        self.index.rebuild(range(0, 40, 2))
+        self.assertEqual(list(self.index.irange(5, 13)), [6, 8, 10, 12])
+        self.assertEqual(list(self.index.irange(34)), [34, 36, 38])
+        self.assertEqual(list(self.index.irange(high=3)), [0, 2])
+        self.assertEqual(list(self.index.irange(100)), [])
+
+    def test_rank(self):
+        self.index.rebuild(range(0, 40, 2))
+        self.assertEqual(self.index.rank(-1), 0)
+        self.assertEqual(self.index.rank(13), 7)
+        self.assertEqual(self.index.rank(14), 7)
+        self.assertEqual(self.index.rank(100), 20)
+
+    def test_tuple_keys(self):
+        self.index.rebuild([("b", 2), ("a", 3), ("b", 1)])
+        self.index.insert(("a", 1))
+        self.assertEqual(list(self.index), [("a", 1), ("a", 3), ("b", 1), ("b", 2)])
+
+if __name__ == '__main__':
+    unittest.main()
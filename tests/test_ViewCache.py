@@ -0,0 +1,40 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ViewCache import VersionedCache
+
+class TestVersionedCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = VersionedCache(maxsize=2)
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def test_hit_until_version_changes(self):
+        self.assertEqual(self.cache.get_or_build("library", 1, self.build), 1)
+        self.assertEqual(self.cache.get_or_build("library", 1, self.build), 1)
+        self.assertEqual(self.cache.get_or_build("library", 2, self.build), 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.get_or_build("a", 1, self.build)
+        self.cache.get_or_build("b", 1, self.build)
+        self.cache.get_or_build("a", 1, self.build)   # "b" is now the oldest
+        self.cache.get_or_build("c", 1, self.build)
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get_or_build("a", 1, self.build), 1)
+        self.assertEqual(self.cache.get_or_build("b", 1, self.build), 4)
+
+    def test_untracked_version_is_not_cached(self):
+        self.cache.get_or_build("a", None, self.build)
+        self.cache.get_or_build("a", None, self.build)
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(len(self.cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import os
+import sys
+import io
+import json
+import shutil
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import cdcli
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.library = os.path.join(self.tmp_dir, "library.json")
+        env = patch.dict(os.environ, {"CD_BACKEND": "memory", "CD_JOURNAL": "0", "CD_LIBRARY": self.library})
+        env.start()
+        self.addCleanup(env.stop)
+        self.catalogue = os.path.join(self.tmp_dir, "catalogue.csv")
+        with open(self.catalogue, 'w') as f:
+            f.write("name,size,encryption_speed,occupied_space,session_count,session_type\n")
+            for i in range(1, 7):
+                f.write(f"Disc {i},700,{8 * i},{100 * i},1,{'Finalized' if i % 3 == 0 else 'Data'}\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            status = cdcli.main(list(argv))
+        return status, out.getvalue()
+
+    def test_import_and_stats(self):
+        status, out = self.run_cli("import", self.catalogue)
+        self.assertEqual(status, 0)
+        self.assertIn("Added 6 CDs", out)
+        status, out = self.run_cli("stats", "--json", "--top", "2")
+        summary = json.loads(out)
+        self.assertEqual(summary["total_cds"], 6)
+        self.assertEqual(summary["session_types"], {"Data": 4, "Finalized": 2})
+        self.assertEqual([cd["id"] for cd in summary["top_occupied"]], [6, 5])
+
+    def test_query(self):
+        self.run_cli("import", self.catalogue)
+        status, out = self.run_cli("query", "--where", "free_space", ">", "250", "--where", "is_open", "==", "true",
+                                   "--order", "encryption_speed", "--desc", "--fields", "id", "name",
+                                   "--format", "json")
+        self.assertEqual(json.loads(out), [{"id": 4, "name": "Disc 4"}, {"id": 2, "name": "Disc 2"},
+                                           {"id": 1, "name": "Disc 1"}])
+        status, out = self.run_cli("query", "--where", "id", "in", "1,3", "--format", "csv")
+        self.assertEqual(out.splitlines()[0], ",".join(cdcli.DEFAULT_COLUMNS))
+        self.assertEqual(len(out.splitlines()), 3)
+        status, out = self.run_cli("query", "--where", "id", "==", "2", "--explain")
+        self.assertEqual(out.strip(), "lookup by id")
+        with self.assertRaises(SystemExit), patch("sys.stderr", io.StringIO()):
+            self.run_cli("query", "--where", "colour", "==", "red")
+
+    def test_finalize_saves(self):
+        self.run_cli("import", self.catalogue)
+        with patch("sys.stderr", io.StringIO()) as err:
+            status, out = self.run_cli("finalize", "1", "2", "99")
+        self.assertEqual(status, 1)
+        self.assertIn("Finalized 2 CDs", out)
+        self.assertIn("99", err.getvalue())
+        status, out = self.run_cli("query", "--where", "is_open", "==", "false", "--fields", "id", "--format", "json")
+        self.assertEqual([row["id"] for row in json.loads(out)], [1, 2, 3, 6])
+
+    def test_export_round_trip(self):
+        self.run_cli("import", self.catalogue)
+        exported = os.path.join(self.tmp_dir, "open.jsonl.gz")
+        status, out = self.run_cli("export", exported, "--where", "is_open", "==", "true")
+        self.assertIn("Exported 4 CDs", out)
+        status, out = self.run_cli("--library", exported, "stats", "--json")
+        self.assertEqual(json.loads(out)["total_cds"], 4)
+        csv_path = os.path.join(self.tmp_dir, "all.csv")
+        self.run_cli("export", csv_path, "--fields", "id", "free_space")
+        with open(csv_path) as f:
+            self.assertEqual(f.readline().strip(), "id,free_space")
+
+    def test_library_that_is_not_a_database(self):
+        not_a_database = os.path.join(self.tmp_dir, "library.db")
+        with open(not_a_database, 'w') as f:
+            f.write("this is not a database\n" * 100)
+        with patch.dict(os.environ, {"CD_BACKEND": "sqlite"}), patch("sys.stderr", io.StringIO()) as err:
+            with self.assertRaises(SystemExit) as exit_:
+                self.run_cli("--library", not_a_database, "stats")
+        self.assertEqual(exit_.exception.code, 2)
+        self.assertIn("not a database", err.getvalue())
+        self.assertNotIn("Traceback", err.getvalue())
+
+    def test_commands_stay_headless(self):
+        # A fresh interpreter, so modules imported by other tests do not count
+        code = ("import sys, cdcli; cdcli.main(['stats']); cdcli.main(['query', '--limit', '1']); "
+                "print(sorted({'streamlit', 'pandas', 'numpy', 'xmlrpc.client', 'multiprocessing'} & set(sys.modules)))")
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                                env=dict(os.environ))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "[]")
+
+if __name__ == '__main__':
+    unittest.main()
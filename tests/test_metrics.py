@@ -0,0 +1,116 @@
+import unittest
+import os
+import sys
+import csv
+import shutil
+import tempfile
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.project = os.path.join(self.tmp_dir, "project")
+        os.makedirs(os.path.join(self.project, "pkg"))
+        os.makedirs(os.path.join(self.project, "venv"))
+        self.write("base.py", "import os\nclass Base:\n    pass\n")
+        self.write("pkg/child.py", "import os\nfrom base import Base\nclass Child(Base):\n    def f(self):\n"
+                                   "        return Base()\nChild()\nChild()\n")
+        self.write("broken.py", "class (:\n")
+        self.write("venv/ignored.py", "class Ignored: pass\n")
+        self.output = os.path.join(self.tmp_dir, "report.csv")
+        self.cache_file = os.path.join(self.tmp_dir, "cache.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, rel_path, source):
+        path = os.path.join(self.project, rel_path)
+        with open(path, 'w') as f:
+            f.write(source)
+        # Move the mtime on even within the filesystem's time resolution
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def analyze(self, **kwargs):
+        with patch("builtins.print"):
+            return metrics.analyze_project_to_csv(self.project, self.output, workers=1,
+                                                  cache_file=self.cache_file, **kwargs)
+
+    def read_report(self):
+        with open(self.output, newline='') as f:
+            return list(csv.reader(f))
+
+    def test_report(self):
+        self.analyze()
+        self.assertEqual(self.read_report(), [
+            metrics.HEADER,
+            ["Base", "base.py", "0", "1", "1"],
+            ["Child", os.path.join("pkg", "child.py"), "1", "2", "2"],
+        ])
+
+    def test_single_traversal(self):
+        result = metrics.analyze_source("import a\nclass A(B, C):\n    class Inner: pass\nA()\nx.y()\n")
+        self.assertEqual(result, {"imports": 1, "classes": [["A", 2], ["Inner", 0]], "calls": {"A": 1}})
+
+    def test_cache_skips_unchanged_files(self):
+        self.analyze()
+        with patch("metrics.analyze_source", wraps=metrics.analyze_source) as parse:
+            self.analyze()
+            self.assertEqual(parse.call_count, 0)
+            # Touched but not changed: hashed, not parsed
+            self.write("base.py", "import os\nclass Base:\n    pass\n")
+            self.analyze()
+            self.assertEqual(parse.call_count, 0)
+            self.write("base.py", "class Base:\n    pass\nclass Extra(Base): pass\n")
+            self.analyze()
+            self.assertEqual(parse.call_count, 1)
+        self.assertEqual([row[:4] for row in self.read_report()[1:]],
+                         [["Base", "base.py", "0", "0"], ["Child", os.path.join("pkg", "child.py"), "1", "2"],
+                          ["Extra", "base.py", "1", "0"]])
+
+    def test_cache_of_another_project_is_ignored(self):
+        self.analyze()
+        other = os.path.join(self.tmp_dir, "other")
+        os.makedirs(other)
+        with patch("builtins.print"):
+            rows = metrics.analyze_project_to_csv(other, self.output, workers=1, cache_file=self.cache_file)
+        self.assertEqual(rows, [])
+
+    def test_parallel_matches_serial(self):
+        for i in range(5):
+            self.write(f"pkg/m{i}.py", f"class M{i}(Base):\n    pass\nM{i}()\n")
+        with patch.object(metrics, "MIN_POOL_FILES", 2):
+            with patch("builtins.print"):
+                parallel = metrics.analyze_project_to_csv(self.project, self.output, workers=2, cache_file=None)
+        self.assertEqual(parallel, self.analyze())
+
+    def test_file_removed_while_scanning(self):
+        self.analyze()
+        self.write("base.py", "class Base: pass\n")
+        analyze_file = metrics._analyze_file
+
+        def removed_first(task):
+            os.remove(task[0])
+            return analyze_file(task)
+        # base.py changed, so it is read again, but is deleted after it was listed
+        with patch("metrics._analyze_file", side_effect=removed_first):
+            rows = self.analyze()
+        self.assertEqual([row[0] for row in rows], ["Child"])
+        with open(self.cache_file) as f:
+            self.assertNotIn("base.py", f.read())
+
+    def test_watch_updates_report(self):
+        def edit(_):
+            self.write("pkg/new.py", "class New: pass\nNew()\n")
+        with patch("builtins.print"), patch("metrics.time.sleep", side_effect=edit):
+            rows = metrics.watch_project(self.project, self.output, workers=1, cache_file=self.cache_file,
+                                         iterations=2)
+        self.assertIn(["New", os.path.join("pkg", "new.py"), 0, 0, 1], rows)
+        self.assertEqual(len(self.read_report()), 4)
+
+if __name__ == '__main__':
+    unittest.main()